@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 import aws_cdk as cdk
-from src.config.load import load_config
+from src.config.load import load_config, metrics_config, rate_limits_json, target_configs
 from src.stacks.infra_stack import InfraStack
 from src.stacks.target_stack import TargetStack
 
@@ -21,17 +21,17 @@ InfraStack(
     env=source_env,
 )
 
-# -------- Target env (S3 bucket + Lambda) --------
-target_cfg = cfg.get("target")
-if target_cfg:
+# -------- Target envs (S3 bucket + Lambda), one stack per target --------
+for target_cfg in target_configs(cfg):
     target_env = cdk.Environment(
         account=target_cfg.get("awsAccount"),
         region=target_cfg.get("awsRegion"),
     )
+    stack_suffix = f'-{target_cfg["name"]}' if target_cfg.get("name") else ""
 
     TargetStack(
         app,
-        f'{cfg["stackName"]}-target',
+        f'{cfg["stackName"]}-target{stack_suffix}',
         env=target_env,
         bucket_name=target_cfg["bucket"]["name"],
         versioned=target_cfg["bucket"].get("versioned", True),
@@ -39,9 +39,14 @@ if target_cfg:
         target_prefix=cfg.get("lambda", {}).get("targetPrefix", "bundles/"),
         allow_put_object_acl=bool(target_cfg.get("allowPutObjectAcl", False)),
         target_account=target_cfg["awsAccount"],
-        qs_region=cfg["awsRegion"],
+        qs_region=target_cfg.get("qsRegion", target_cfg.get("awsRegion", cfg["awsRegion"])),
         lambda_timeout=target_cfg.get("lambda", {}).get("timeout", 60),
         lambda_memory=target_cfg.get("lambda", {}).get("memory", 128),
+        lambda_cfg=target_cfg.get("lambda"),
+        rate_limits=rate_limits_json(cfg, target_cfg),
+        stage=cfg["stage"],
+        target_name=target_cfg.get("name") or "default",
+        metrics_cfg=metrics_config(cfg, target_cfg),
     )
 
 app.synth()
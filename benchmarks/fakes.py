@@ -0,0 +1,444 @@
+"""
+In-process stand-ins for QuickSight and S3 used by the benchmark harness.
+
+``FakeQuickSight`` simulates asset bundle export and import jobs: every API
+call pays a sampled latency and may be throttled, jobs run for a sampled
+duration and may fail, and export jobs produce a real QUICKSIGHT_JSON zip of
+the configured size, served over HTTP with ``Range`` support by
+``BundleServer`` as the job's presigned DownloadUrl. ``FakeS3`` keeps objects
+on disk, so the fakes' own storage stays out of the measured memory.
+
+Durations and latencies are distribution specs, sampled in seconds:
+``0.05`` or ``{"fixed": 0.05}``, ``{"uniform": [a, b]}``,
+``{"lognormal": {"median": m, "sigma": s}}``, ``{"exponential": {"mean": m}}``.
+Every fake counts its calls in a shared ``Metrics``.
+"""
+import base64
+import hashlib
+import http.server
+import io
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+def sample(spec, rng):
+    """Seconds drawn from a distribution spec (see the module docstring)."""
+    if spec is None:
+        return 0.0
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    (kind, args), = spec.items()
+    if kind == "fixed":
+        return float(args)
+    if kind == "uniform":
+        return rng.uniform(*args)
+    if kind == "lognormal":
+        return rng.lognormvariate(math.log(args["median"]), args.get("sigma", 0.5))
+    if kind == "exponential":
+        return rng.expovariate(1 / args["mean"])
+    raise ValueError(f"Unknown distribution {kind!r}")
+
+
+def client_error(code, op, message=None, status=400):
+    return ClientError(
+        {"Error": {"Code": code, "Message": message or code},
+         "ResponseMetadata": {"HTTPStatusCode": status}},
+        op,
+    )
+
+
+class Metrics:
+    """Thread-safe counters and latency samples of one scenario run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.samples = {}
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counts[name] += n
+
+    def observe(self, name, value):
+        with self.lock:
+            self.samples.setdefault(name, []).append(value)
+
+
+class _Service:
+    """Per-call latency and throttling shared by the fakes."""
+
+    def __init__(self, name, metrics, rng, latency=None, throttle_rate=0.0):
+        self.name = name
+        self.metrics = metrics
+        self.rng = rng
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.rng_lock = threading.Lock()
+
+    def draw(self, spec):
+        with self.rng_lock:
+            return sample(spec, self.rng)
+
+    def chance(self, rate):
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def call(self, op, throttle=True):
+        self.metrics.count(f"{self.name}.{op}")
+        time.sleep(self.draw(self.latency))
+        if throttle and self.throttle_rate and self.chance(self.throttle_rate):
+            self.metrics.count(f"{self.name}.throttled")
+            raise client_error("ThrottlingException", op, "Rate exceeded", 429)
+
+
+class BundleServer:
+    """Serves bundle files over local HTTP, optionally at a capped bandwidth."""
+
+    def __init__(self, root, metrics, rng, first_byte=None, mbps=None):
+        self.root = root
+        self.metrics = metrics
+        self.rng = rng
+        self.first_byte = first_byte
+        self.mbps = mbps
+        self.rng_lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, name):
+        signature = uuid.uuid4().hex
+        return f"http://127.0.0.1:{self.httpd.server_port}/{name}?X-Amz-Signature={signature}"
+
+    def _serve(self, req):
+        self.metrics.count("download.requests")
+        path = os.path.join(self.root, req.path.split("?")[0].lstrip("/"))
+        if not os.path.isfile(path):
+            req.send_response(403)
+            req.send_header("Content-Length", "0")
+            req.end_headers()
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = _RANGE_RE.match(req.headers.get("Range") or "")
+        with self.rng_lock:
+            time.sleep(sample(self.first_byte, self.rng))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or size - 1), size - 1)
+            req.send_response(206)
+            req.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            req.send_response(200)
+        req.send_header("Content-Length", str(end - start + 1))
+        req.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            left = end - start + 1
+            while left:
+                chunk = f.read(min(left, 256 * 1024))
+                req.wfile.write(chunk)
+                left -= len(chunk)
+                self.metrics.count("download.bytes", len(chunk))
+                if self.mbps:
+                    time.sleep(len(chunk) / (self.mbps * 1024 * 1024 / 8))
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def build_bundle(path, arns, size, padding, revision):
+    """
+    Write a QUICKSIGHT_JSON zip with one member per ARN, padded with stored
+    (incompressible) text to about ``size`` bytes. Every asset carries
+    ``revision``, so each export looks changed to the ledger and asset
+    diffing. Members are streamed so the fake never holds a bundle in memory.
+    """
+    per_member = max(size // max(len(arns), 1) - 256, 0)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as bundle:
+        for i, arn in enumerate(arns):
+            rtype, _, rid = arn.split(":")[-1].partition("/")
+            folder = {"dataset": "dataSet", "datasource": "dataSource"}.get(rtype, rtype)
+            head = json.dumps({"arn": arn, f"{rtype}Id": rid, "name": rid, "revision": revision})[:-1]
+            with bundle.open(f"{folder}/{rid}.json", "w", force_zip64=True) as member:
+                member.write(f'{head}, "padding": "'.encode())
+                left, offset = per_member, (i * 7919) % len(padding)
+                while left > 0:
+                    piece = padding[offset:offset + left]
+                    member.write(piece)
+                    left -= len(piece)
+                    offset = 0
+                member.write(b'"}')
+
+
+def make_padding(rng, size=1 << 20):
+    """Base64 text repeated through every bundle of a run."""
+    raw = bytes(rng.getrandbits(8) for _ in range(1 << 16))
+    text = base64.b64encode(raw)
+    return (text * (size // len(text) + 1))[:size]
+
+
+class FakeQuickSight(_Service):
+    """
+    The asset bundle subset of the QuickSight API the handlers call.
+
+    ``catalog`` maps folder ids to member ARNs. ``export`` / ``import_`` are
+    ``{"duration": spec, "failureRate": p, "maxConcurrentJobs": n}``. A
+    throttled call stands for throttling that outlasted the SDK's retries, so
+    it reaches the handler code as a ThrottlingException.
+    """
+
+    def __init__(self, name, metrics, rng, server=None, catalog=None, api=None,
+                 export=None, import_=None, bundle_bytes=0):
+        api = api or {}
+        super().__init__(name, metrics, rng, api.get("latency"), api.get("throttleRate", 0.0))
+        self.server = server
+        self.catalog = catalog or {}
+        self.settings = {"export": export or {}, "import": import_ or {}}
+        self.bundle_bytes = bundle_bytes
+        self.padding = make_padding(rng) if bundle_bytes else b""
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        self.builder = ThreadPoolExecutor(max_workers=4) if server else None
+
+    # ----- Folders -----
+
+    def list_folder_members(self, AwsAccountId, FolderId, MaxResults=100, NextToken=None):
+        self.call("ListFolderMembers")
+        members = self.catalog.get(FolderId, [])
+        start = int(NextToken or 0)
+        page = members[start:start + MaxResults]
+        resp = {"FolderMemberList": [{"MemberArn": arn, "MemberId": arn.rsplit("/", 1)[-1]} for arn in page]}
+        if start + MaxResults < len(members):
+            resp["NextToken"] = str(start + MaxResults)
+        return resp
+
+    # ----- Jobs -----
+
+    def _start(self, kind, op, job_id, ready=None):
+        self.call(op)
+        settings = self.settings[kind]
+        with self.jobs_lock:
+            running = sum(1 for j in self.jobs.values()
+                          if j["kind"] == kind and j["finishAt"] > time.time())
+            limit = settings.get("maxConcurrentJobs")
+            if limit and running >= limit:
+                self.metrics.count(f"{self.name}.limitExceeded")
+                raise client_error("LimitExceededException", op, "Too many concurrent jobs")
+            now = time.time()
+            job = {
+                "kind": kind,
+                "startedAt": now,
+                "finishAt": now + self.draw(settings.get("duration")),
+                "failed": self.chance(settings.get("failureRate", 0.0)),
+                "ready": ready,
+                "observed": False,
+            }
+            self.jobs[job_id] = job
+        self.metrics.count(f"{kind}.jobs")
+        return job
+
+    def _describe(self, kind, op, job_id):
+        self.call(op)
+        job = self.jobs[job_id]
+        now = time.time()
+        done = now >= job["finishAt"] and (job["ready"] is None or job["ready"].done())
+        if not done:
+            return {"JobStatus": "IN_PROGRESS", "Status": 200}, job
+        if not job["observed"]:
+            job["observed"] = True
+            # How long the job sat finished before a Describe noticed: polling overhead.
+            self.metrics.observe(f"{kind}.detectLagSeconds", now - job["finishAt"])
+            self.metrics.observe(f"{kind}.jobSeconds", job["finishAt"] - job["startedAt"])
+            self.metrics.count(f"{kind}.failed" if job["failed"] else f"{kind}.succeeded")
+        if job["failed"]:
+            status = "FAILED" if kind == "export" else "FAILED_ROLLBACK_COMPLETED"
+            return {"JobStatus": status, "Status": 200,
+                    "Errors": [{"Type": "SimulatedFailure", "Message": "Injected by the benchmark"}]}, job
+        return {"JobStatus": "SUCCESSFUL", "Status": 200}, job
+
+    def start_asset_bundle_export_job(self, AwsAccountId, AssetBundleExportJobId, ResourceArns, **kwargs):
+        path = os.path.join(self.server.root, f"{AssetBundleExportJobId}.qs")
+        # QuickSight builds the bundle while the job runs; so does the fake.
+        ready = self.builder.submit(build_bundle, path, ResourceArns, self.bundle_bytes, self.padding,
+                                    AssetBundleExportJobId)
+        self._start("export", "StartAssetBundleExportJob", AssetBundleExportJobId, ready)
+        return {"Status": 202, "AssetBundleExportJobId": AssetBundleExportJobId}
+
+    def describe_asset_bundle_export_job(self, AwsAccountId, AssetBundleExportJobId):
+        resp, job = self._describe("export", "DescribeAssetBundleExportJob", AssetBundleExportJobId)
+        if resp["JobStatus"] == "SUCCESSFUL":
+            resp["DownloadUrl"] = self.server.url(f"{AssetBundleExportJobId}.qs")
+        return dict(resp, AssetBundleExportJobId=AssetBundleExportJobId)
+
+    def start_asset_bundle_import_job(self, AwsAccountId, AssetBundleImportJobId, AssetBundleImportSource, **kwargs):
+        self._start("import", "StartAssetBundleImportJob", AssetBundleImportJobId)
+        return {"Status": 202, "AssetBundleImportJobId": AssetBundleImportJobId}
+
+    def describe_asset_bundle_import_job(self, AwsAccountId, AssetBundleImportJobId):
+        resp, _ = self._describe("import", "DescribeAssetBundleImportJob", AssetBundleImportJobId)
+        return dict(resp, AssetBundleImportJobId=AssetBundleImportJobId)
+
+    def close(self):
+        if self.builder:
+            self.builder.shutdown(wait=True)
+
+
+class _Body(io.RawIOBase):
+    """``StreamingBody`` stand-in over an object file; counts the bytes read."""
+
+    def __init__(self, path, metrics):
+        super().__init__()
+        self._file = open(path, "rb")
+        self._metrics = metrics
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._file.readinto(b)
+        self._metrics.count("s3.bytesRead", n or 0)
+        return n
+
+    def read(self, amt=-1):
+        data = self._file.read() if amt is None or amt < 0 else self._file.read(amt)
+        self._metrics.count("s3.bytesRead", len(data))
+        return data
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class FakeS3(_Service):
+    """Object calls the handlers make, against files under ``root``; unversioned buckets."""
+
+    def __init__(self, root, metrics, rng, latency=None):
+        super().__init__("s3", metrics, rng, latency)
+        self.root = root
+        self.lock = threading.Lock()
+        self.written = []  # (bucket, key) in write order
+        self.uploads = {}
+
+    def _path(self, bucket, key):
+        digest = hashlib.sha1(f"{bucket}/{key}".encode()).hexdigest()
+        return os.path.join(self.root, digest)
+
+    def _store(self, bucket, key, fill):
+        path = self._path(bucket, key)
+        tmp = f"{path}.{uuid.uuid4().hex}"
+        md5 = hashlib.md5()
+        size = 0
+        with open(tmp, "wb") as f:
+            for chunk in fill():
+                f.write(chunk)
+                md5.update(chunk)
+                size += len(chunk)
+        os.replace(tmp, path)
+        etag = f'"{md5.hexdigest()}"'
+        with self.lock:
+            self.written.append((bucket, key, etag, size))
+        self.metrics.count("s3.bytesWritten", size)
+        return etag
+
+    @staticmethod
+    def _chunks(body):
+        if isinstance(body, str):
+            body = body.encode()
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            yield bytes(body)
+            return
+        while True:
+            chunk = body.read(1024 * 1024)
+            if not chunk:
+                return
+            yield chunk
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self.call("PutObject", throttle=False)
+        return {"ETag": self._store(Bucket, Key, lambda: self._chunks(Body))}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        self.call("PutObject", throttle=False)
+        self._store(Bucket, Key, lambda: self._chunks(Fileobj))
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        self.call("GetObject", throttle=False)
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise client_error("NoSuchKey", "GetObject", "The specified key does not exist.", 404)
+        etag = next((e for b, k, e, _ in reversed(self.written) if (b, k) == (Bucket, Key)), None)
+        if IfNoneMatch and IfNoneMatch == etag:
+            raise client_error("304", "GetObject", "Not Modified", 304)
+        return {"Body": _Body(path, self.metrics), "ContentLength": os.path.getsize(path), "ETag": etag}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.call("CreateMultipartUpload", throttle=False)
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, upload_id))
+        self.uploads[upload_id] = (Bucket, Key)
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.call("UploadPart", throttle=False)
+        size = 0
+        md5 = hashlib.md5()
+        with open(os.path.join(self.root, UploadId, f"{PartNumber:05d}"), "wb") as f:
+            for chunk in self._chunks(Body):
+                f.write(chunk)
+                md5.update(chunk)
+                size += len(chunk)
+        self.metrics.count("s3.bytesWritten", size)
+        return {"ETag": f'"{md5.hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self.call("CompleteMultipartUpload", throttle=False)
+        part_dir = os.path.join(self.root, UploadId)
+
+        def parts():
+            for part in MultipartUpload["Parts"]:
+                with open(os.path.join(part_dir, f"{part['PartNumber']:05d}"), "rb") as f:
+                    yield from iter(lambda: f.read(1024 * 1024), b"")
+        # Parts were counted as written already; don't count the assembly again.
+        self.metrics.count("s3.bytesWritten", -sum(
+            os.path.getsize(os.path.join(part_dir, f"{p['PartNumber']:05d}")) for p in MultipartUpload["Parts"]
+        ))
+        etag = self._store(Bucket, Key, parts)
+        shutil.rmtree(part_dir)
+        self.uploads.pop(UploadId, None)
+        return {"ETag": etag, "Bucket": Bucket, "Key": Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.call("AbortMultipartUpload", throttle=False)
+        shutil.rmtree(os.path.join(self.root, UploadId), ignore_errors=True)
+        self.uploads.pop(UploadId, None)
+        return {}
+
+    def written_since(self, mark):
+        """``[(bucket, key)]`` written after ``mark`` (a previous ``len(written)``)."""
+        with self.lock:
+            return [(b, k) for b, k, _, _ in self.written[mark:]]
@@ -0,0 +1,233 @@
+"""
+Runs one benchmark scenario end to end inside the current process.
+
+Both Lambda handlers are imported from ``lambda_src`` (each with its own
+sibling modules) and their ``qs`` / ``s3`` clients replaced by the fakes. One
+iteration sends the export handler a multi-folder event, then delivers every
+object it wrote under the target prefix to the worker in SQS-style batches,
+as the bundle queue would. Handlers run synchronously (ASYNC_MODE=false),
+with the environment ``run.py`` prepared for the scenario.
+"""
+import contextlib
+import gc
+import importlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from fakes import BundleServer, FakeQuickSight, FakeS3, Metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXPORT_DIR = os.path.join(ROOT, "lambda_src", "handler")
+WORKER_DIR = os.path.join(ROOT, "lambda_src", "target_worker")
+COMMON_DIR = os.path.join(ROOT, "lambda_src", "common", "python")
+
+SOURCE_ACCOUNT = "111111111111"
+TARGET_ACCOUNT = "222222222222"
+# Keys the target bucket notifies the worker about; keep in sync with
+# src/cdk_construct/bundle_queue_construct.py.
+NOTIFY_SUFFIXES = (".qs", ".chunks.json", ".deletions.json", ".layers.json")
+
+
+def load_handler(code_dir):
+    """Import ``code_dir``/index.py with its sibling modules, isolated from the other handler's."""
+    before = set(sys.modules)
+    sys.path.insert(0, code_dir)
+    try:
+        module = importlib.import_module("index")
+    finally:
+        sys.path.remove(code_dir)
+        for name in set(sys.modules) - before:
+            if os.path.dirname(getattr(sys.modules[name], "__file__", None) or "") == code_dir:
+                del sys.modules[name]
+    return module
+
+
+def catalog(scenario, region):
+    """``{folderId: [member ARNs]}``: datasets and dashboards per folder."""
+    folders = {}
+    for f in range(scenario.get("folders", 1)):
+        arns = []
+        for a in range(scenario.get("assetsPerFolder", 4)):
+            rtype = "dataset" if a % 2 else "dashboard"
+            arns.append(f"arn:aws:quicksight:{region}:{SOURCE_ACCOUNT}:{rtype}/bench-f{f}-{rtype}-{a}")
+        folders[f"bench-folder-{f}"] = arns
+    return folders
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        "n": len(values),
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "max": round(max(values), 4),
+        "mean": round(statistics.fmean(values), 4),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextlib.contextmanager
+def quiet(verbose):
+    if verbose:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def state_table(scenario):
+    """A moto DynamoDB state table for scenarios that enable state-backed features."""
+    if not scenario.get("stateTable"):
+        yield
+        return
+    try:
+        from moto import mock_aws
+    except ImportError:
+        sys.exit("stateTable scenarios need moto (pip install 'moto[dynamodb]')")
+    import boto3
+    with mock_aws():
+        boto3.client("dynamodb").create_table(
+            TableName=os.environ["STATE_TABLE"],
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield
+
+
+def run_iteration(export, worker, s3, scenario, folders, verbose):
+    batch_size = scenario.get("importBatchSize", 10)
+    mark = len(s3.written)
+
+    started = time.perf_counter()
+    with quiet(verbose):
+        try:
+            export_result = export.lambda_handler(
+                {"account": SOURCE_ACCOUNT, "detail": {"folderIds": folders}}, None,
+            )
+        except Exception as e:
+            # A single folder is exported inline and its failure raises.
+            export_result = {"status": "FAILED", "error": str(e)}
+    export_seconds = time.perf_counter() - started
+
+    keys = [
+        (bucket, key) for bucket, key in s3.written_since(mark)
+        if bucket == export.TARGET_BUCKET and key.startswith(export.TARGET_PREFIX)
+        and key.endswith(NOTIFY_SUFFIXES)
+    ]
+    import_started = time.perf_counter()
+    import_results = []
+    for i in range(0, len(keys), batch_size):
+        records = [
+            {"messageId": f"m{i + n}", "eventSource": "aws:sqs", "body": json.dumps(
+                {"Records": [{"s3": {"bucket": {"name": b}, "object": {"key": k}}}]}
+            )}
+            for n, (b, k) in enumerate(keys[i:i + batch_size])
+        ]
+        with quiet(verbose):
+            import_results.extend(worker.lambda_handler({"Records": records}, None)["results"])
+    import_seconds = time.perf_counter() - import_started
+
+    exported = list(export_result["folders"].values()) if "folders" in export_result else [export_result]
+    errors = sorted({str(r["error"])[:200] for r in exported + import_results if r.get("error")})
+    return {
+        "exportSeconds": export_seconds,
+        "importSeconds": import_seconds,
+        "totalSeconds": export_seconds + import_seconds,
+        "bundles": len(keys),
+        "exports": dict(sorted(_tally(r.get("status") for r in exported).items())),
+        "imports": dict(sorted(_tally(r.get("status") for r in import_results).items())),
+        "errors": errors[:5],
+    }
+
+
+def _tally(statuses):
+    counts = {}
+    for status in statuses:
+        counts[status or "NONE"] = counts.get(status or "NONE", 0) + 1
+    return counts
+
+
+def run(scenario, repeat, seed, verbose=False):
+    """Run ``scenario`` ``repeat`` times; returns its result document."""
+    sys.path.insert(0, COMMON_DIR)
+    random.seed(seed)  # the handlers' own jitter (polling, backoff)
+    rng = random.Random(seed)
+    metrics = Metrics()
+    region = os.environ["QS_REGION"]
+    folders = catalog(scenario, region)
+    workdir = tempfile.mkdtemp(prefix="qs-bench-")
+    bundle_dir, s3_dir = os.path.join(workdir, "bundles"), os.path.join(workdir, "s3")
+    os.makedirs(bundle_dir)
+    os.makedirs(s3_dir)
+
+    download = scenario.get("download") or {}
+    server = BundleServer(bundle_dir, metrics, random.Random(rng.random()),
+                          download.get("firstByte"), download.get("mbps"))
+    bundle_bytes = int(scenario.get("bundleMb", 1) * 1024 * 1024)
+    src_qs = FakeQuickSight("source", metrics, random.Random(rng.random()), server, folders,
+                            scenario.get("api"), export=scenario.get("export"), bundle_bytes=bundle_bytes)
+    tgt_qs = FakeQuickSight("target", metrics, random.Random(rng.random()),
+                            api=scenario.get("api"), import_=scenario.get("import"))
+    s3 = FakeS3(s3_dir, metrics, random.Random(rng.random()), (scenario.get("s3") or {}).get("latency"))
+
+    iterations = []
+    try:
+        with state_table(scenario):
+            import_started = time.perf_counter()
+            export = load_handler(EXPORT_DIR)
+            worker = load_handler(WORKER_DIR)
+            import_ms = (time.perf_counter() - import_started) * 1000
+            export.qs, export.s3 = src_qs, s3
+            worker.qs, worker.s3 = tgt_qs, s3
+            gc.collect()
+            rss_before = peak_rss_mb()
+            for _ in range(repeat):
+                iterations.append(run_iteration(export, worker, s3, scenario, sorted(folders), verbose))
+            rss_peak = peak_rss_mb()
+    finally:
+        src_qs.close()
+        server.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    counts = dict(sorted(metrics.counts.items()))
+    return {
+        "description": scenario.get("description", ""),
+        "repeat": repeat,
+        "seed": seed,
+        "wall": {k: summarize([it[k] for it in iterations])
+                 for k in ("totalSeconds", "exportSeconds", "importSeconds")},
+        "jobs": {name: summarize(values) for name, values in sorted(metrics.samples.items())},
+        "apiCalls": {k: v for k, v in counts.items() if k.split(".")[0] in ("source", "target", "s3")
+                     and not k.endswith(("bytesRead", "bytesWritten"))},
+        "bytes": {
+            "downloaded": counts.get("download.bytes", 0),
+            "writtenToS3": counts.get("s3.bytesWritten", 0),
+            "readFromS3": counts.get("s3.bytesRead", 0),
+            "downloadRequests": counts.get("download.requests", 0),
+        },
+        "memory": {"peakRssMb": round(rss_peak, 1), "growthMb": round(rss_peak - rss_before, 1)},
+        "handlerImportMs": round(import_ms, 1),
+        "iterations": iterations,
+    }
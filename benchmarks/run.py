@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""
+Offline end-to-end benchmarks of the export and import Lambdas.
+
+    python benchmarks/run.py [--scenario NAME ...] [--repeat 3] [--compare FILE]
+
+Every scenario of ``benchmarks/scenarios.yaml`` runs in a fresh interpreter
+with its own environment: the export handler exports the scenario's folders
+from a fake QuickSight, downloads the bundles from a local HTTP server into a
+fake S3, and the target worker imports them (see ``harness.py``). No AWS
+account or network is used.
+
+Reported per scenario: wall-clock latency (export, import, total), simulated
+job durations and how long finished jobs went unnoticed by polling, API call
+and throttle counts, bytes downloaded / written / read, and peak RSS. Results
+are written to ``--results-dir`` as ``<timestamp>-<commit>.json``; with
+``--compare`` a previous results file is the baseline, and the run exits 1
+when a scenario's median total latency or peak memory grew by more than
+``--threshold``.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import yaml
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULT_MARKER = "@@result "
+# Environment of every scenario; a scenario's ``env`` overrides it.
+BASE_ENV = {
+    "QS_REGION": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    # Nothing may reach AWS: fake credentials, no instance metadata lookups.
+    "AWS_ACCESS_KEY_ID": "benchmark",
+    "AWS_SECRET_ACCESS_KEY": "benchmark",
+    "AWS_EC2_METADATA_DISABLED": "true",
+    "TARGET_BUCKET": "bench-target",
+    "TARGET_PREFIX": "bundles/",
+    "BUCKET_NAME": "bench-source",
+    "TARGET_ACCOUNT": "222222222222",
+    "ASYNC_MODE": "false",
+}
+PASSTHROUGH = ("PATH", "HOME", "LANG", "TMPDIR", "SYSTEMROOT", "VIRTUAL_ENV")
+
+
+# Distribution specs are replaced whole, never merged.
+DISTRIBUTION_KEYS = {"duration", "latency", "firstByte"}
+
+
+def _merge(base, override):
+    merged = dict(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict) and key not in DISTRIBUTION_KEYS:
+            value = _merge(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+def load_scenarios(path):
+    """``{name: scenario}``, each merged key by key over ``defaults``."""
+    with open(path) as f:
+        doc = yaml.safe_load(f)
+    return {name: _merge(doc.get("defaults") or {}, spec) for name, spec in doc["scenarios"].items()}
+
+
+def scenario_env(scenario):
+    env = {k: os.environ[k] for k in PASSTHROUGH if k in os.environ}
+    env.update(BASE_ENV)
+    if scenario.get("stateTable"):
+        env["STATE_TABLE"] = "bench-state"
+    env.update({k: str(v) for k, v in (scenario.get("env") or {}).items()})
+    env["PYTHONPATH"] = HERE
+    return env
+
+
+def run_child(name, args):
+    """Run one scenario in a fresh interpreter; returns its result document."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", name, "--scenarios", args.scenarios,
+           "--repeat", str(args.repeat), "--seed", str(args.seed)]
+    if args.verbose:
+        cmd.append("--verbose")
+    scenario = load_scenarios(args.scenarios)[name]
+    proc = subprocess.run(cmd, env=scenario_env(scenario), cwd=ROOT, capture_output=True, text=True)
+    if args.verbose:
+        sys.stderr.write(proc.stdout)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+    if proc.returncode or not lines:
+        sys.stderr.write(proc.stderr)
+        return {"error": f"exit {proc.returncode}: {proc.stderr.strip().splitlines()[-1:] or 'no result'}"}
+    return json.loads(lines[-1][len(RESULT_MARKER):])
+
+
+def git_revision():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{sha}-dirty" if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def headline(result):
+    """The numbers compared between runs."""
+    return {
+        "totalSeconds": result["wall"]["totalSeconds"]["p50"],
+        "peakRssMb": result["memory"]["peakRssMb"],
+        "apiCalls": sum(v for k, v in result["apiCalls"].items() if k.startswith(("source.", "target."))),
+    }
+
+
+def print_summary(results):
+    print(f"{'scenario':<18} {'total p50':>10} {'export p50':>11} {'import p50':>11} "
+          f"{'QS calls':>9} {'throttled':>9} {'MB down':>8} {'peak MB':>8}  outcomes")
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<18} ERROR {r['error']}")
+            continue
+        wall, calls = r["wall"], r["apiCalls"]
+        throttled = calls.get("source.throttled", 0) + calls.get("target.throttled", 0)
+        last = r["iterations"][-1]
+        print(f"{name:<18} {wall['totalSeconds']['p50']:>9.2f}s {wall['exportSeconds']['p50']:>10.2f}s "
+              f"{wall['importSeconds']['p50']:>10.2f}s {headline(r)['apiCalls']:>9} {throttled:>9} "
+              f"{r['bytes']['downloaded'] / 1048576:>8.1f} {r['memory']['peakRssMb']:>8.1f}  "
+              f"export {last['exports']} import {last['imports']}")
+
+
+def compare(results, baseline, threshold):
+    """Print changes against ``baseline``; returns the regressed scenario names."""
+    regressed = []
+    print(f"\nAgainst {baseline['revision']} ({baseline['createdAt']}):")
+    for name, r in results.items():
+        before = baseline["scenarios"].get(name)
+        if "error" in r or not before or "error" in before:
+            continue
+        now, then = headline(r), headline(before)
+        changes = []
+        for metric in ("totalSeconds", "peakRssMb", "apiCalls"):
+            delta = (now[metric] - then[metric]) / then[metric] if then[metric] else 0.0
+            flag = " !" if delta > threshold and metric != "apiCalls" else ""
+            changes.append(f"{metric} {then[metric]:g} -> {now[metric]:g} ({delta:+.0%}){flag}")
+            if flag:
+                regressed.append(name)
+        print(f"  {name:<18} " + ", ".join(changes))
+    return sorted(set(regressed))
+
+
+def child_main(args):
+    import harness
+    scenario = load_scenarios(args.scenarios)[args.child]
+    result = harness.run(scenario, args.repeat, args.seed, verbose=args.verbose)
+    print(RESULT_MARKER + json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", help="run only this scenario (repeatable)")
+    parser.add_argument("--scenarios", default=os.path.join(HERE, "scenarios.yaml"))
+    parser.add_argument("--repeat", type=int, default=3, help="iterations per scenario")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--results-dir", default=os.path.join(HERE, "results"))
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="relative growth of latency or memory counted as a regression")
+    parser.add_argument("--list", action="store_true", help="list the scenarios and exit")
+    parser.add_argument("--verbose", action="store_true", help="show the handlers' logs")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child_main(args)
+    scenarios = load_scenarios(args.scenarios)
+    if args.list:
+        for name, spec in scenarios.items():
+            print(f"{name:<18} {spec.get('description', '')}")
+        return
+    unknown = set(args.scenario or ()) - set(scenarios)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.scenario or scenarios:
+        started = time.time()
+        print(f"[INFO] Running {name} x{args.repeat}...", file=sys.stderr)
+        results[name] = run_child(name, args)
+        print(f"[INFO] {name} done in {time.time() - started:.0f}s", file=sys.stderr)
+
+    revision = git_revision()
+    doc = {
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "scenarios": results,
+    }
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{revision}.json")
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=1)
+    print_summary(results)
+    print(f"\nResults: {os.path.relpath(path)}")
+
+    failed = [name for name, r in results.items() if "error" in r]
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            print(f"[WARN] Regressed beyond {args.threshold:.0%}: {', '.join(regressed)}")
+            failed += regressed
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
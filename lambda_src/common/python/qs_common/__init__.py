@@ -0,0 +1 @@
+"""Helpers shared by the source export and target import Lambda functions (deployed as a layer)."""
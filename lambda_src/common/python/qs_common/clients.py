@@ -0,0 +1,91 @@
+"""
+Lazily created, container-wide boto3 clients.
+
+Building a client loads its service model and resolves the endpoint, which is
+a good part of a cold start when done at import for clients an invocation may
+never touch. Handlers therefore declare their clients as ``lazy(...)`` proxies:
+the real client is built on first use and then kept for the life of the
+container, so warm invocations reuse it and its open connections.
+
+Every client shares one Config: a connection pool large enough for the
+transfer and scheduler thread pools (botocore's default of 10 makes threads
+queue for a connection), TCP keep-alive so pooled connections survive idle
+stretches between invocations, and adaptive retries, whose client-side rate
+limiting backs off on throttling before the error reaches our own handling.
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+MAX_POOL_CONNECTIONS = int(os.environ.get("CLIENT_MAX_POOL_CONNECTIONS", "32"))
+RETRY_MODE = os.environ.get("CLIENT_RETRY_MODE", "adaptive")
+MAX_ATTEMPTS = int(os.environ.get("CLIENT_MAX_ATTEMPTS", "5"))
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+
+_cache = {}
+# boto3's default session isn't safe to build clients from concurrently.
+_lock = threading.Lock()
+
+
+def config():
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        retries={"mode": RETRY_MODE, "total_max_attempts": MAX_ATTEMPTS},
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+    )
+
+
+def _get(kind, service, region, setup):
+    key = (kind, service, region)
+    found = _cache.get(key)
+    if found is None:
+        with _lock:
+            found = _cache.get(key)
+            if found is None:
+                factory = boto3.resource if kind == "resource" else boto3.client
+                found = factory(service, region_name=region, config=config())
+                if setup:
+                    setup(found)
+                _cache[key] = found
+    return found
+
+
+def client(service, region=None, setup=None):
+    """
+    The container's ``service`` client for ``region``, built on first call.
+    ``setup(client)`` runs once, before the client is handed out (e.g. to
+    register event hooks).
+    """
+    return _get("client", service, region, setup)
+
+
+def resource(service, region=None):
+    return _get("resource", service, region, None)
+
+
+class _Lazy:
+    """Stands in for a client at module level and builds it on first attribute access."""
+
+    def __init__(self, service, region, setup):
+        self._args = (service, region, setup)
+
+    def __getattr__(self, name):
+        return getattr(client(*self._args), name)
+
+    def __repr__(self):
+        return f"<lazy {self._args[0]} client ({self._args[1] or 'default region'})>"
+
+
+def lazy(service, region=None, setup=None):
+    return _Lazy(service, region, setup)
+
+
+def reset():
+    """Forget every client (new credentials, or a test that mocks AWS afresh)."""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,216 @@
+"""
+Asynchronous job tracking: start a QuickSight job, persist its record, return.
+
+A record (``job#<jobId>`` in the state table) is checked later by a delayed
+message on the job-check SQS queue that re-invokes the same function. Each
+check claims the record with a fresh token, so duplicate SQS deliveries can't
+fork the check chain or finish a job twice. A claim is leased for
+JOB_CHECK_LEASE seconds: when the invocation holding it dies (timeout, crash)
+SQS redelivers its message, which still carries the previous token, and that
+redelivery takes the job over once the lease has run out.
+"""
+import json
+import os
+import time
+import uuid
+
+from qs_common import clients, metrics, poller, state
+
+ASYNC_MODE = os.environ.get("ASYNC_MODE", "false").lower() == "true"
+JOB_CHECK_QUEUE_URL = os.environ.get("JOB_CHECK_QUEUE_URL")
+ASYNC_MAX_WAIT = int(os.environ.get("ASYNC_MAX_WAIT", "7200"))
+ASYNC_MAX_DELAY = float(os.environ.get("ASYNC_MAX_DELAY", "120"))
+# Longer than one invocation of the function (set from its timeout by the stack).
+CHECK_LEASE = int(os.environ.get("JOB_CHECK_LEASE", "960"))
+JOB_TTL = 7 * 24 * 3600
+MAX_SQS_DELAY = 900
+MAX_CHECK_ERRORS = 5
+
+CHECK_ACTION = "check_job"
+
+_sqs = None
+
+
+def _queue():
+    global _sqs
+    if _sqs is None:
+        _sqs = clients.client("sqs")
+    return _sqs
+
+
+def is_check_event(event):
+    """True for SQS batches from the job-check queue."""
+    records = event.get("Records") or []
+    return bool(records) and all(
+        r.get("eventSource") == "aws:sqs" and _is_check_body(r.get("body")) for r in records
+    )
+
+
+def _is_check_body(body):
+    try:
+        msg = json.loads(body or "{}")
+    except ValueError:
+        return False
+    return isinstance(msg, dict) and msg.get("action") == CHECK_ACTION
+
+
+def submit(kind, job_id, account_id, context, first_delay=None):
+    """Persist a freshly started job and schedule its first check."""
+    if not JOB_CHECK_QUEUE_URL:
+        raise RuntimeError("ASYNC_MODE requires JOB_CHECK_QUEUE_URL")
+    token = uuid.uuid4().hex
+    job = {
+        "kind": kind,
+        "jobId": job_id,
+        "accountId": account_id,
+        "startedAt": time.time(),
+        "status": "RUNNING",
+        "checkToken": token,
+        "progress": {"polls": 0, "overdue": 0, "throttles": 0},
+        "context": context,
+    }
+    state.put(f"job#{job_id}", job, ttl=JOB_TTL)
+    if first_delay is None:
+        first_delay = poller.next_delay(kind, 0, 0, max_delay=ASYNC_MAX_DELAY)
+    _schedule(job_id, token, first_delay)
+    return job
+
+
+def _schedule(job_id, token, delay):
+    _queue().send_message(
+        QueueUrl=JOB_CHECK_QUEUE_URL,
+        MessageBody=json.dumps({"action": CHECK_ACTION, "jobId": job_id, "token": token}),
+        DelaySeconds=max(0, min(int(round(delay)), MAX_SQS_DELAY)),
+    )
+
+
+def _claim(message_body):
+    """Load the job named by a check message and take ownership of this check."""
+    msg = json.loads(message_body)
+    job = state.get(f"job#{msg['jobId']}")
+    if not job or job.get("status") != "RUNNING":
+        print(f"[INFO] Dropping stale check for job {msg['jobId']}")
+        return None
+    current = job.get("checkToken")
+    if msg.get("token") != current:
+        # Redelivery of a message whose check claimed the job and then died?
+        orphaned = msg.get("token") == job.get("previousToken") and job.get("claimedUntil", 0) <= time.time()
+        if not orphaned:
+            print(f"[INFO] Dropping stale check for job {msg['jobId']}")
+            return None
+        print(f"[WARN] Check lease of job {job['jobId']} expired; taking it over")
+    new_token = uuid.uuid4().hex
+    if not state.update(f"job#{job['jobId']}", {
+        "checkToken": new_token,
+        "previousToken": msg["token"],
+        "claimedUntil": time.time() + CHECK_LEASE,
+    }, expect={"checkToken": current, "status": "RUNNING"}):
+        print(f"[INFO] Check for job {job['jobId']} already claimed")
+        return None
+    job["checkToken"] = new_token
+    return job
+
+
+def _check(job, describe, terminal, on_terminal, on_failed):
+    try:
+        resp, delay = poller.check_once(
+            lambda: describe(job),
+            terminal,
+            job["kind"],
+            job["jobId"],
+            job["startedAt"],
+            job["progress"],
+            max_wait=ASYNC_MAX_WAIT,
+            max_delay=ASYNC_MAX_DELAY,
+        )
+    except TimeoutError as e:
+        print(f"[ERROR] {e}")
+        _record(job, "TIMED_OUT")
+        _give_up(job, "TIMED_OUT", {"error": str(e)}, on_failed)
+        return
+
+    if delay is not None:
+        _schedule(job["jobId"], job["checkToken"], delay)
+        _release(job, {"progress": job["progress"]})
+        return
+
+    job["progress"]["elapsedSeconds"] = round(time.time() - job["startedAt"], 3)
+    _record(job, resp.get("JobStatus"))
+    result = on_terminal(job, resp)
+    finish(job, resp.get("JobStatus"), result)
+
+
+def _record(job, status):
+    """Job metrics for a job the check chain saw end (see qs_common.metrics)."""
+    progress = job["progress"]
+    metrics.job(job["kind"], time.time() - job["startedAt"], progress.get("polls", 0),
+                progress.get("throttles", 0), (job.get("context") or {}).get("folderId"), status,
+                jobId=job["jobId"])
+
+
+def _retry(job, error, on_failed):
+    """Re-arm the check chain after a failure; give up after MAX_CHECK_ERRORS."""
+    errors = job.get("errors", 0) + 1
+    if errors >= MAX_CHECK_ERRORS:
+        _give_up(job, "FAILED", {"error": str(error)}, on_failed)
+        return
+    _schedule(job["jobId"], job["checkToken"], poller.throttle_delay(errors, max_delay=ASYNC_MAX_DELAY))
+    _release(job, {"errors": errors, "progress": job["progress"]})
+
+
+def _release(job, updates):
+    """
+    End this check's claim once the chain is handed to a new message: the
+    message being processed (and its previous token) can no longer take over.
+    """
+    state.update(f"job#{job['jobId']}", dict(updates, previousToken=None, claimedUntil=0))
+
+
+def _give_up(job, status, result, on_failed):
+    """Finish a job the chain could not see through; ``on_failed`` cleans up after it."""
+    finish(job, status, result)
+    if on_failed:
+        try:
+            on_failed(job, result)
+        except Exception as e:
+            print(f"[ERROR] Cleanup after job {job['jobId']} failed: {e}")
+
+
+def finish(job, status, result=None):
+    """Record the job's terminal state; later checks for it are dropped."""
+    job["status"] = status
+    state.update(f"job#{job['jobId']}", {
+        "status": status,
+        "finishedAt": time.time(),
+        "result": result or {},
+        "progress": job["progress"],
+    })
+
+
+def handle_checks(event, describe, terminal, on_terminal, on_failed=None):
+    """
+    Process a job-check SQS batch.
+
+    ``describe(job)`` is called once per job; when the job is terminal
+    ``on_terminal(job, response)`` runs and its return value is stored as the
+    job result. Errors before a check is claimed are reported back to SQS as
+    batch item failures; errors after it re-arm the job's own check chain.
+    When the chain gives up (the job timed out, or the check kept failing)
+    ``on_failed(job, result)`` runs once the job is marked finished.
+    """
+    failures = []
+    for record in event["Records"]:
+        try:
+            job = _claim(record["body"])
+        except Exception as e:
+            print(f"[ERROR] Job check {record.get('messageId')} failed: {e}")
+            failures.append({"itemIdentifier": record["messageId"]})
+            continue
+        if job is None:
+            continue
+        try:
+            _check(job, describe, terminal, on_terminal, on_failed)
+        except Exception as e:
+            print(f"[ERROR] Job {job['jobId']} check failed: {e}")
+            _retry(job, e, on_failed)
+    return {"batchItemFailures": failures}
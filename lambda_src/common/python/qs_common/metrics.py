@@ -0,0 +1,113 @@
+"""
+Per-phase latency and throughput metrics in CloudWatch Embedded Metric Format.
+
+Each metric record is one JSON log line with an ``_aws`` block; CloudWatch
+Logs turns it into metrics under METRICS_NAMESPACE, so recording a metric is a
+write to stdout and never an API call on the request path.
+
+Every record carries the Stage and Target dimensions (the deployment stage and
+the target it runs for) and, for phases, Phase. When the phase belongs to a
+folder, a second dimension set adds FolderId: per-folder breakdowns exist
+without splitting the per-phase series the dashboard and alarms are built on.
+
+    with metrics.phase("Transfer", folder=folder_id) as m:
+        m["BundleBytes"] = copy_bundle()
+
+emits the phase's Duration (milliseconds, also on failure, with Errors=1)
+plus whatever the block added. Disabled (METRICS_ENABLED=false), nothing is
+printed; phases still time their block, which costs two clock reads.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "QuickSightMigrations")
+STAGE = os.environ.get("METRICS_STAGE", "dev")
+TARGET = os.environ.get("METRICS_TARGET", "default")
+
+# Unit of every metric name we emit; anything else is a Count.
+UNITS = {
+    "Duration": "Milliseconds",
+    "BundleBytes": "Bytes",
+    "Throughput": "Bytes/Second",
+}
+
+# One line per record even when threads emit concurrently.
+_lock = threading.Lock()
+
+
+def enabled():
+    return ENABLED
+
+
+def emit(values, phase=None, folder=None, properties=None):
+    """
+    Write one EMF record of ``values`` (``{metric name: number}``).
+    ``properties`` are logged with it for Logs Insights but are not dimensions.
+    """
+    if not ENABLED or not values:
+        return
+    dimensions = {"Stage": STAGE, "Target": TARGET}
+    if phase:
+        dimensions["Phase"] = phase
+    dimension_sets = [list(dimensions)]
+    record = dict(properties or {})
+    if folder:
+        record["FolderId"] = folder
+        dimension_sets.append(list(dimensions) + ["FolderId"])
+    record.update(dimensions)
+    record.update(values)
+    record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{
+            "Namespace": NAMESPACE,
+            "Dimensions": dimension_sets,
+            "Metrics": [{"Name": name, "Unit": UNITS.get(name, "Count")} for name in values],
+        }],
+    }
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+@contextmanager
+def phase(name, folder=None, **properties):
+    """
+    Time the block as phase ``name``. Yields a dict the block may add metric
+    values to; Duration, and Throughput when BundleBytes is set, are added here.
+    """
+    values = {}
+    started = time.perf_counter()
+    try:
+        yield values
+    except BaseException:
+        values["Errors"] = 1
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        values["Duration"] = round(seconds * 1000, 3)
+        if values.get("BundleBytes") and seconds > 0:
+            values["Throughput"] = round(values["BundleBytes"] / seconds, 1)
+        emit(values, phase=name, folder=folder, properties=properties)
+
+
+def job(kind, seconds, polls, throttles, folder=None, status=None, **properties):
+    """
+    A finished QuickSight job as phase ``ExportJob`` / ``ImportJob``: its
+    duration from start to the poll that saw it terminal, poll iterations and
+    throttle retries. Used by the sync pollers and the async check chain alike.
+    """
+    values = {
+        "Duration": round(seconds * 1000, 3),
+        "PollIterations": polls,
+        "ThrottleRetries": throttles,
+    }
+    if status and status != "SUCCESSFUL":
+        values["Errors"] = 1
+    emit(values, phase=f"{kind.capitalize()}Job", folder=folder,
+         properties=dict(properties, status=status))
@@ -0,0 +1,196 @@
+"""
+Adaptive, jittered polling for QuickSight asset bundle jobs.
+
+Instead of a fixed sleep, each wait halves the gap to the job's expected
+duration (learned per job kind from completed jobs in this container) and then
+backs off exponentially once the job is overdue. Delays are jittered so that
+concurrent pollers don't align, Describe calls are capped, and throttling
+errors are retried with their own backoff instead of failing the job.
+"""
+import os
+import random
+import time
+
+from botocore.exceptions import ClientError
+
+THROTTLE_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+}
+
+MIN_DELAY = float(os.environ.get("POLL_MIN_DELAY", "1"))
+MAX_DELAY = float(os.environ.get("POLL_MAX_DELAY", "30"))
+MAX_POLLS = int(os.environ.get("POLL_MAX_POLLS", "120"))
+JITTER = 0.2
+BACKOFF = 1.6
+EWMA_ALPHA = 0.3
+
+# Seeds for the learned durations; refined by every job this container sees.
+_expected = {
+    "export": float(os.environ.get("POLL_EXPECTED_EXPORT_SECONDS", "45")),
+    "import": float(os.environ.get("POLL_EXPECTED_IMPORT_SECONDS", "90")),
+}
+
+
+class PollStats:
+    """Per-job polling counters, reported alongside the handler result."""
+
+    def __init__(self, kind, job_id):
+        self.kind = kind
+        self.job_id = job_id
+        self.polls = 0
+        self.throttles = 0
+        self.slept = 0.0
+        self.last_delay = 0.0
+        self.elapsed = 0.0
+        self.status = None
+
+    @property
+    def added_latency(self):
+        """Upper bound on how long the job sat finished before we noticed."""
+        return self.last_delay
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "jobId": self.job_id,
+            "status": self.status,
+            "polls": self.polls,
+            "throttleRetries": self.throttles,
+            "elapsedSeconds": round(self.elapsed, 3),
+            "sleptSeconds": round(self.slept, 3),
+            "addedLatencySeconds": round(self.added_latency, 3),
+        }
+
+
+def is_throttle(exc):
+    return isinstance(exc, ClientError) and exc.response.get("Error", {}).get("Code") in THROTTLE_CODES
+
+
+def expected_duration(kind):
+    return _expected.get(kind, 60.0)
+
+
+def record_duration(kind, seconds):
+    """Fold an observed job duration into the kind's moving average."""
+    prev = _expected.get(kind)
+    _expected[kind] = seconds if prev is None else (1 - EWMA_ALPHA) * prev + EWMA_ALPHA * seconds
+
+
+def next_delay(kind, elapsed, overdue_polls, min_delay=None, max_delay=None):
+    """Delay before the next Describe call for a job that has run ``elapsed`` seconds."""
+    min_delay = MIN_DELAY if min_delay is None else min_delay
+    max_delay = MAX_DELAY if max_delay is None else max_delay
+    remaining = expected_duration(kind) - elapsed
+    if remaining > 2 * min_delay:
+        base = remaining / 2
+    else:
+        base = min_delay * (BACKOFF ** overdue_polls)
+    base = min(max(base, min_delay), max_delay)
+    return base * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def throttle_delay(attempt, min_delay=None, max_delay=None):
+    """Full-jitter exponential backoff for throttled Describe calls."""
+    min_delay = MIN_DELAY if min_delay is None else min_delay
+    max_delay = MAX_DELAY if max_delay is None else max_delay
+    return random.uniform(min_delay, min(max_delay, min_delay * (2 ** attempt)))
+
+
+def time_budget(context, max_wait, reserve=30):
+    """Cap ``max_wait`` so a synchronous poll gives up before the Lambda times out."""
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if remaining is None:
+        return max_wait
+    return max(min(max_wait, remaining() / 1000 - reserve), 0)
+
+
+def poll_job(describe, terminal, kind, job_id, max_wait, max_polls=None,
+             started_at=None, max_throttle_retries=8, sleep=time.sleep):
+    """
+    Call ``describe()`` until its ``JobStatus`` is in ``terminal``.
+
+    ``started_at`` (epoch seconds) lets callers account for time the job already
+    spent running. Returns ``(response, PollStats)``; raises ``TimeoutError``
+    when ``max_wait`` or ``max_polls`` is exceeded.
+    """
+    max_polls = MAX_POLLS if max_polls is None else max_polls
+    started_at = time.time() if started_at is None else started_at
+    stats = PollStats(kind, job_id)
+    overdue = 0
+    throttled_in_a_row = 0
+
+    while True:
+        try:
+            resp = describe()
+        except ClientError as e:
+            if not is_throttle(e) or throttled_in_a_row >= max_throttle_retries:
+                raise
+            stats.throttles += 1
+            delay = throttle_delay(throttled_in_a_row)
+            throttled_in_a_row += 1
+            sleep(delay)
+            stats.slept += delay
+            continue
+        throttled_in_a_row = 0
+        stats.polls += 1
+        stats.status = resp.get("JobStatus")
+        stats.elapsed = time.time() - started_at
+
+        if stats.status in terminal:
+            record_duration(kind, stats.elapsed)
+            return resp, stats
+        if stats.elapsed >= max_wait:
+            # The last sleep is capped to end at max_wait; don't poll on with no delay.
+            raise TimeoutError(
+                f"{kind.capitalize()} job {job_id} timed out with status={stats.status}"
+            )
+        if stats.polls >= max_polls:
+            raise TimeoutError(
+                f"{kind.capitalize()} job {job_id} still {stats.status} after {stats.polls} polls"
+            )
+
+        if stats.elapsed >= expected_duration(kind):
+            overdue += 1
+        delay = min(next_delay(kind, stats.elapsed, overdue), max(max_wait - stats.elapsed, 0))
+        sleep(delay)
+        stats.slept += delay
+        stats.last_delay = delay
+
+
+def check_once(describe, terminal, kind, job_id, started_at, progress, max_wait,
+               max_polls=None, max_delay=None):
+    """
+    Single Describe call for a job tracked across invocations (async mode).
+
+    ``progress`` is the job's persisted counter dict (``polls``, ``overdue``,
+    ``throttles``) and is updated in place. Returns ``(response, delay)`` where
+    ``delay`` is None once the job is terminal and otherwise the suggested wait
+    before the next check; ``response`` is None when the call was throttled.
+    """
+    max_polls = MAX_POLLS if max_polls is None else max_polls
+    try:
+        resp = describe()
+    except ClientError as e:
+        if not is_throttle(e):
+            raise
+        progress["throttles"] = progress.get("throttles", 0) + 1
+        return None, throttle_delay(min(progress["throttles"], 6), max_delay=max_delay)
+
+    progress["polls"] = progress.get("polls", 0) + 1
+    status = resp.get("JobStatus")
+    elapsed = time.time() - started_at
+    if status in terminal:
+        record_duration(kind, elapsed)
+        return resp, None
+    if elapsed > max_wait:
+        raise TimeoutError(f"{kind.capitalize()} job {job_id} timed out with status={status}")
+    if progress["polls"] >= max_polls:
+        raise TimeoutError(
+            f"{kind.capitalize()} job {job_id} still {status} after {progress['polls']} polls"
+        )
+    if elapsed >= expected_duration(kind):
+        progress["overdue"] = progress.get("overdue", 0) + 1
+    return resp, next_delay(kind, elapsed, progress.get("overdue", 0), max_delay=max_delay)
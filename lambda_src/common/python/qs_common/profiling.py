@@ -0,0 +1,165 @@
+"""
+Opt-in per-invocation CPU profiling and memory tracing.
+
+``@profiled(name)`` wraps a Lambda entry point. An invocation is profiled when
+PROFILING_ENABLED is true, or with probability PROFILING_SAMPLE_RATE; both are
+plain environment variables, so profiling can be switched on for a deployed
+function by updating its configuration. Otherwise the wrapper costs one
+comparison (plus one random() call when a sample rate is set): the profilers
+are imported only for a profiled invocation.
+
+A profiled invocation runs under cProfile (every thread the handler starts,
+not just the calling one) and tracemalloc, then writes two gzip-compressed
+artifacts to PROFILING_BUCKET under
+``PROFILING_PREFIX<name>/<yyyy/mm/dd>/<time>-<request id>``:
+
+- ``.pstats.gz``: the merged profile in pstats format
+  (``gunzip`` it, then ``python -m pstats <file>``);
+- ``.txt.gz``: a report with the duration, traced and process peak memory, the
+  top PROFILING_TOP functions by cumulative and own time, and the top
+  allocation sites still holding memory when the handler returned.
+
+Artifacts are written whether the handler returned or raised; a failed upload
+is logged and never fails the invocation.
+"""
+import functools
+import os
+import random
+import time
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0") or 0)
+PROFILING_BUCKET = os.environ.get("PROFILING_BUCKET") or os.environ.get("BUCKET_NAME")
+PROFILING_PREFIX = os.environ.get("PROFILING_PREFIX", "profiles/")
+TOP = int(os.environ.get("PROFILING_TOP", "40"))
+# Frames kept per allocation traceback; more frames, more tracing overhead.
+TRACEMALLOC_FRAMES = int(os.environ.get("PROFILING_TRACEMALLOC_FRAMES", "5"))
+
+
+def sampled():
+    """Whether this invocation is profiled."""
+    return PROFILING_ENABLED or (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE)
+
+
+def profiled(name):
+    """Decorator for ``lambda_handler(event, context)``; see the module docstring."""
+    def wrap(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if not sampled():
+                return handler(event, context)
+            return _run_profiled(name, handler, event, context)
+        return wrapper
+    return wrap
+
+
+class _Session:
+    """cProfile for the calling thread and every thread started meanwhile, plus tracemalloc."""
+
+    def __init__(self):
+        import cProfile
+        import threading
+        import tracemalloc
+
+        self._cprofile = cProfile
+        self._threading = threading
+        self._tracemalloc = tracemalloc
+        self._lock = threading.Lock()
+        self.profiles = [cProfile.Profile()]
+        self.owns_tracemalloc = not tracemalloc.is_tracing()
+
+    def _profile_thread(self, *args):
+        import sys
+        profile = self._cprofile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # One profiler already sees every thread (sys.monitoring based cProfile).
+            sys.setprofile(None)
+            return
+        with self._lock:
+            self.profiles.append(profile)
+
+    def start(self):
+        if self.owns_tracemalloc:
+            self._tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._tracemalloc.reset_peak()
+        self.baseline = self._tracemalloc.take_snapshot()
+        self._threading.setprofile(self._profile_thread)
+        self.profiles[0].enable()
+
+    def stop(self):
+        self.profiles[0].disable()
+        self._threading.setprofile(None)
+        self.peak = self._tracemalloc.get_traced_memory()[1]
+        self.snapshot = self._tracemalloc.take_snapshot()
+        if self.owns_tracemalloc:
+            self._tracemalloc.stop()
+
+    def stats(self):
+        import pstats
+        with self._lock:
+            profiles = list(self.profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def allocations(self):
+        """Allocation sites holding more memory than before the invocation, largest first."""
+        ignore = [self._tracemalloc.Filter(False, self._tracemalloc.__file__),
+                  self._tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        snapshot = self.snapshot.filter_traces(ignore)
+        return [d for d in snapshot.compare_to(self.baseline.filter_traces(ignore), "lineno") if d.size_diff > 0]
+
+
+def _run_profiled(name, handler, event, context):
+    request_id = getattr(context, "aws_request_id", None) or f"local-{random.getrandbits(48):012x}"
+    session = _Session()
+    started = time.perf_counter()
+    outcome = "returned"
+    session.start()
+    try:
+        return handler(event, context)
+    except BaseException as e:
+        outcome = f"raised {type(e).__name__}"
+        raise
+    finally:
+        session.stop()
+        seconds = time.perf_counter() - started
+        try:
+            _write(name, request_id, session, seconds, outcome)
+        except Exception as e:
+            print(f"[WARN] Could not write profile for {request_id}: {e}")
+
+
+def _write(name, request_id, session, seconds, outcome):
+    import gzip
+    import io
+    import marshal
+    import resource
+
+    from qs_common import clients
+
+    stats = session.stats()
+    report = io.StringIO()
+    report.write(f"{name} invocation {request_id}: {seconds:.3f}s, {outcome}\n")
+    report.write(f"traced peak {session.peak / 1048576:.1f} MB, "
+                 f"process peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB\n\n")
+    stats.stream = report
+    for order in ("cumulative", "tottime"):
+        report.write(f"===== top {TOP} by {order} =====\n")
+        stats.sort_stats(order).print_stats(TOP)
+    report.write(f"===== top {TOP} allocation sites still held =====\n")
+    for diff in session.allocations()[:TOP]:
+        report.write(f"{diff}\n")
+
+    key = (f"{PROFILING_PREFIX}{name}/{time.strftime('%Y/%m/%d', time.gmtime())}/"
+           f"{time.strftime('%H%M%S', time.gmtime())}-{request_id}")
+    s3 = clients.client("s3")
+    s3.put_object(Bucket=PROFILING_BUCKET, Key=f"{key}.pstats.gz",
+                  Body=gzip.compress(marshal.dumps(stats.stats)), ContentType="application/gzip")
+    s3.put_object(Bucket=PROFILING_BUCKET, Key=f"{key}.txt.gz",
+                  Body=gzip.compress(report.getvalue().encode()), ContentType="application/gzip")
+    print(f"[INFO] Profile of {request_id} ({seconds:.1f}s, traced peak "
+          f"{session.peak / 1048576:.1f} MB): s3://{PROFILING_BUCKET}/{key}.{{pstats,txt}}.gz")
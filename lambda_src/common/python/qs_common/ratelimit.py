@@ -0,0 +1,139 @@
+"""
+Token-bucket rate limiting of QuickSight API calls across concurrent Lambdas.
+
+Budgets are per API operation (``{"rate": calls/s, "burst": bucket size}``,
+with an optional ``default``) and come from the stage config as the
+QS_RATE_LIMITS JSON. The shared bucket for an operation is the state-table item
+``rate#<region>#<Operation>``; an invocation leases a few tokens at a time with
+an optimistic conditional write and spends them locally, so most calls never
+touch DynamoDB. Leased tokens expire quickly to bound the burst a single
+container can hold back. Without a state table the buckets are local only, and
+DynamoDB errors fall back to the local bucket rather than blocking calls.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+from qs_common import state
+
+QS_RATE_LIMITS = os.environ.get("QS_RATE_LIMITS", "")
+LEASE_SECONDS = 1.0
+MAX_LEASE_ATTEMPTS = 5
+
+
+class _Lease:
+    def __init__(self):
+        self.tokens = 0
+        self.expires = 0.0
+        self.lock = threading.Lock()
+
+
+class RateLimiter:
+    def __init__(self, budgets, scope):
+        self.budgets = budgets
+        self.scope = scope
+        self.waited = 0.0
+        self._leases = {}
+        self._guard = threading.Lock()
+        # Local-only buckets (no state table, or DynamoDB unavailable)
+        self._local = {}
+
+    def budget(self, op):
+        return self.budgets.get(op) or self.budgets.get("default")
+
+    def _lease_for(self, op):
+        with self._guard:
+            return self._leases.setdefault(op, _Lease())
+
+    def acquire(self, op):
+        """Block until a call to ``op`` fits its budget; returns seconds waited."""
+        budget = self.budget(op)
+        if not budget:
+            return 0.0
+        lease = self._lease_for(op)
+        waited = 0.0
+        while True:
+            with lease.lock:
+                now = time.time()
+                if lease.tokens >= 1 and lease.expires > now:
+                    lease.tokens -= 1
+                    break
+                want = max(1, int(min(budget["burst"], budget["rate"] * LEASE_SECONDS)))
+                granted, wait = self._take(op, budget, want)
+                if granted:
+                    lease.tokens = granted - 1
+                    lease.expires = now + LEASE_SECONDS
+                    break
+            wait *= random.uniform(1.0, 1.3)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            self.waited += waited
+        return waited
+
+    def _take(self, op, budget, want):
+        """Take up to ``want`` tokens; returns ``(granted, wait_before_retry)``."""
+        if state.enabled():
+            try:
+                return self._take_shared(op, budget, want)
+            except Exception as e:
+                print(f"[WARN] Shared rate limit for {op} unavailable, using local bucket: {e}")
+        return self._take_local(op, budget, want)
+
+    def _take_shared(self, op, budget, want):
+        pk = f"rate#{self.scope}#{op}"
+        for _ in range(MAX_LEASE_ATTEMPTS):
+            now = time.time()
+            item = state.get(pk)
+            seen = item.get("updatedAt") if item else None
+            tokens = budget["burst"] if item is None else min(
+                budget["burst"], item.get("tokens", 0) + (now - seen) * budget["rate"]
+            )
+            granted = int(min(want, tokens))
+            if granted < 1:
+                return 0, (1 - tokens) / budget["rate"]
+            if state.update(pk, {"tokens": tokens - granted, "updatedAt": now},
+                            expect={"updatedAt": seen}):
+                return granted, 0.0
+        # Lost the race repeatedly: back off briefly and try again.
+        return 0, 1.0 / budget["rate"]
+
+    def _take_local(self, op, budget, want):
+        now = time.time()
+        tokens, seen = self._local.get(op, (budget["burst"], now))
+        tokens = min(budget["burst"], tokens + (now - seen) * budget["rate"])
+        granted = int(min(want, tokens))
+        if granted < 1:
+            self._local[op] = (tokens, now)
+            return 0, (1 - tokens) / budget["rate"]
+        self._local[op] = (tokens - granted, now)
+        return granted, 0.0
+
+
+def parse_budgets(raw):
+    budgets = {}
+    for op, cfg in (json.loads(raw) if raw else {}).items():
+        rate = float(cfg["rate"])
+        budgets[op] = {"rate": rate, "burst": float(cfg.get("burst", max(rate, 1)))}
+    return budgets
+
+
+def install(client, region, budgets=None):
+    """
+    Rate-limit every call ``client`` makes (paginators included). Returns the
+    limiter, or None when no budgets are configured.
+    """
+    budgets = parse_budgets(QS_RATE_LIMITS) if budgets is None else budgets
+    if not budgets:
+        return None
+    limiter = RateLimiter(budgets, region)
+
+    def before_call(model, **kwargs):
+        # Must return None: a value from a before-call handler replaces the response.
+        limiter.acquire(model.name)
+
+    service = client.meta.service_model.service_id.hyphenize()
+    client.meta.events.register(f"before-call.{service}", before_call)
+    return limiter
@@ -0,0 +1,160 @@
+"""
+Small DynamoDB-backed state store shared by the workers.
+
+Every item lives in one table keyed by a string ``pk`` whose prefix names the
+record type (``job#...``). Items may carry an ``expiresAt`` epoch that the
+table's TTL uses for eviction and that ``get`` honours immediately. Floats are stored as Decimals and converted
+back on read so callers only deal with plain Python types.
+"""
+import os
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from qs_common import clients
+
+STATE_TABLE = os.environ.get("STATE_TABLE")
+
+_dynamodb = None
+_table = None
+
+
+def enabled():
+    return bool(STATE_TABLE)
+
+
+def table():
+    global _dynamodb, _table
+    if _table is None:
+        if not STATE_TABLE:
+            raise RuntimeError("STATE_TABLE is not configured")
+        _dynamodb = clients.resource("dynamodb")
+        _table = _dynamodb.Table(STATE_TABLE)
+    return _table
+
+
+def to_dynamo(value):
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {to_dynamo(v) for v in value}
+    return value
+
+
+def from_dynamo(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: from_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [from_dynamo(v) for v in value]
+    if isinstance(value, set):
+        return {from_dynamo(v) for v in value}
+    return value
+
+
+def get(pk):
+    """Fetch an item; expired items (TTL deletion lags) read as missing."""
+    item = table().get_item(Key={"pk": pk}, ConsistentRead=True).get("Item")
+    if not item or item.get("expiresAt", time.time() + 1) <= time.time():
+        return None
+    return from_dynamo(item)
+
+
+def get_many(pks):
+    """Fetch several items at once; returns ``{pk: item}`` for the live ones."""
+    pks = list(dict.fromkeys(pks))
+    items, now = {}, time.time()
+    table()  # initialises the shared resource
+    for i in range(0, len(pks), 100):
+        request = {STATE_TABLE: {"Keys": [{"pk": pk} for pk in pks[i:i + 100]], "ConsistentRead": True}}
+        while request:
+            resp = _dynamodb.batch_get_item(RequestItems=request)
+            for item in resp.get("Responses", {}).get(STATE_TABLE, []):
+                if item.get("expiresAt", now + 1) > now:
+                    items[item["pk"]] = from_dynamo(item)
+            request = resp.get("UnprocessedKeys") or None
+    return items
+
+
+def put_many(items, ttl=None):
+    """Write ``{pk: attrs}`` in batches."""
+    with table().batch_writer() as batch:
+        for pk, attrs in items.items():
+            item = dict(attrs, pk=pk)
+            if ttl:
+                item["expiresAt"] = int(time.time() + ttl)
+            batch.put_item(Item=to_dynamo(item))
+
+
+def put(pk, attrs, ttl=None):
+    item = dict(attrs, pk=pk)
+    if ttl:
+        item["expiresAt"] = int(time.time() + ttl)
+    table().put_item(Item=to_dynamo(item))
+
+
+def update(pk, updates, expect=None):
+    """
+    Set ``updates`` on the item; with ``expect`` only when every listed
+    attribute currently has the given value (``None`` meaning absent). Returns
+    False if that condition did not hold.
+    """
+    names, values, sets = {}, {}, []
+    for i, (name, value) in enumerate(updates.items()):
+        names[f"#u{i}"] = name
+        values[f":u{i}"] = to_dynamo(value)
+        sets.append(f"#u{i} = :u{i}")
+    kwargs = {
+        "Key": {"pk": pk},
+        "UpdateExpression": "SET " + ", ".join(sets),
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+    if expect:
+        cond = None
+        for name, value in expect.items():
+            clause = Attr(name).not_exists() if value is None else Attr(name).eq(to_dynamo(value))
+            cond = clause if cond is None else cond & clause
+        kwargs["ConditionExpression"] = cond
+    try:
+        table().update_item(**kwargs)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
+
+
+def add(pk, name, values):
+    """
+    Add ``values`` to the set attribute ``name`` of an existing item. Adding
+    a member twice is a no-op. Returns the updated item, or None when the item
+    is missing or expired.
+    """
+    try:
+        item = table().update_item(
+            Key={"pk": pk},
+            UpdateExpression="ADD #n :v",
+            ConditionExpression=Attr("pk").exists(),
+            ExpressionAttributeNames={"#n": name},
+            ExpressionAttributeValues={":v": to_dynamo(set(values))},
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return None
+        raise
+    if item.get("expiresAt", time.time() + 1) <= time.time():
+        return None
+    return from_dynamo(item)
+
+
+def delete(pk):
+    table().delete_item(Key={"pk": pk})
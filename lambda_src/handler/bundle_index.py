@@ -0,0 +1,78 @@
+"""
+Index of the bundles written for every exported asset.
+
+Each bundle that lands in the target bucket(s) appends one immutable record to
+an append-only log in the exporter's own bucket,
+``<BUNDLE_INDEX_PREFIX>log/<yyyy>/<mm>/<dd>/<epoch ms>-<bundle>.json``, whose
+keys sort in write order. The log is materialized in the state table as one
+item per asset (``bundle#<account>#<arn>``) holding the latest entry and the
+previous BUNDLE_INDEX_HISTORY ones, newest first, so the newest bundle of a
+dashboard, or the one to roll back to, is a single read instead of a listing
+of the bundle prefix. ``scripts/bundle_index.py`` reads the index, replays the
+log into the table and re-imports any indexed version.
+"""
+import json
+import os
+import time
+
+from qs_common import state
+
+BUNDLE_INDEX = os.environ.get("BUNDLE_INDEX", "false").lower() == "true"
+BUNDLE_INDEX_PREFIX = os.environ.get("BUNDLE_INDEX_PREFIX", "index/")
+BUNDLE_INDEX_HISTORY = int(os.environ.get("BUNDLE_INDEX_HISTORY", "20"))
+LOG_BUCKET = os.environ.get("BUCKET_NAME")
+
+
+def enabled():
+    return BUNDLE_INDEX and bool(LOG_BUCKET) and state.enabled()
+
+
+def pk(account_id, arn):
+    return f"bundle#{account_id}#{arn}"
+
+
+def log_key(entry):
+    """``index/log/2024/05/01/1714521600000-exp-1.qs.json`` for the entry's bundle."""
+    stamp = time.strftime("%Y/%m/%d", time.gmtime(entry["at"]))
+    name = entry["key"].rsplit("/", 1)[-1]
+    return f"{BUNDLE_INDEX_PREFIX}log/{stamp}/{int(entry['at'] * 1000):013d}-{name}.json"
+
+
+def materialize(account_id, arns, entry):
+    """
+    Put ``entry`` at the head of every asset's history; older entries beyond
+    the depth drop off. Two exports of one asset landing at once may drop an
+    entry here (last writer wins); the log keeps both and a rebuild restores it.
+    """
+    pks = [pk(account_id, arn) for arn in arns]
+    current = state.get_many(pks)
+    items = {}
+    for key in pks:
+        history = [e for e in current.get(key, {}).get("history", []) if e["key"] != entry["key"]]
+        items[key] = {"latest": entry, "history": [entry] + history[:BUNDLE_INDEX_HISTORY - 1]}
+    state.put_many(items)
+
+
+def record(s3, account_id, arns, key, objects, sha256, folder_id=None, job_id=None):
+    """
+    Log and index a bundle written to ``key``. ``objects`` maps each target
+    bucket to the ``{"etag", "version_id"}`` of the object written there;
+    ``sha256`` is the bundle's content hash (a multipart ETag is not one).
+    """
+    entry = {
+        "key": key,
+        "at": time.time(),
+        "sha256": sha256,
+        "etag": next(iter(objects.values()), {}).get("etag"),
+        "versions": {bucket: obj.get("version_id") for bucket, obj in objects.items()},
+        "folderId": folder_id,
+        "jobId": job_id,
+    }
+    s3.put_object(
+        Bucket=LOG_BUCKET,
+        Key=log_key(entry),
+        Body=json.dumps(dict(entry, sourceAccount=account_id, arns=sorted(arns))).encode(),
+        ContentType="application/json",
+    )
+    materialize(account_id, arns, entry)
+    return entry
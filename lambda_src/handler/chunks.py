@@ -0,0 +1,97 @@
+"""
+Content-addressed storage of export bundles in the target bucket.
+
+Instead of one opaque ``.qs`` object per export, every member of the bundle
+zip (one JSON document per asset) is stored as a gzip blob named by the
+SHA-256 of its bytes, ``<TARGET_PREFIX>blobs/<aa>/<sha256>``, next to a small
+``<bundle>.chunks.json`` manifest listing members in order. Blobs the target
+already has are not written again; the source can't read the target bucket,
+so the blobs it wrote are tracked in the state table (``blob#<bucket>#<sha>``)
+and forgotten after BLOB_INDEX_TTL_DAYS, after which they are re-put. The
+target worker rebuilds the zip from the manifest before importing.
+"""
+import gzip
+import hashlib
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from qs_common import state
+
+CHUNKED_BUNDLES = os.environ.get("CHUNKED_BUNDLES", "false").lower() == "true"
+BLOB_INDEX_TTL = int(float(os.environ.get("BLOB_INDEX_TTL_DAYS", "7")) * 86400)
+MANIFEST_SUFFIX = ".chunks.json"
+# Bundles up to this size are staged in memory, larger ones spill to /tmp.
+SPOOL_BYTES = 64 * 1024 * 1024
+PUT_CONCURRENCY = 8
+
+
+def enabled():
+    return CHUNKED_BUNDLES and state.enabled()
+
+
+def manifest_key(bundle_key):
+    """``bundles/exp-1.qs`` -> ``bundles/exp-1.chunks.json``."""
+    if bundle_key.endswith(MANIFEST_SUFFIX):
+        return bundle_key
+    base = bundle_key[:-len(".qs")] if bundle_key.endswith(".qs") else bundle_key
+    return base + MANIFEST_SUFFIX
+
+
+def blob_key(prefix, digest):
+    return f"{prefix}blobs/{digest[:2]}/{digest}"
+
+
+def store(s3, buckets, prefix, bundle, key):
+    """
+    Write the blobs of the bundle zip ``bundle`` (a seekable file) that each
+    target bucket doesn't have yet, then the manifest at ``key`` in every
+    bucket. Returns byte counts summed over the buckets and the manifest's
+    ``{"etag", "version_id"}`` per bucket under ``objects``.
+    """
+    with zipfile.ZipFile(bundle) as zf:
+        # Hash first, then read again only the members some bucket is missing.
+        members = []
+        for info in zf.infolist():
+            if not info.is_dir():
+                members.append((info.filename, hashlib.sha256(zf.read(info)).hexdigest(), info.file_size))
+
+        known = state.get_many(
+            f"blob#{bucket}#{digest}" for bucket in buckets for _, digest, _ in members
+        )
+        puts, new = [], {}
+        for name, digest, size in dict((m[1], m) for m in members).values():
+            missing = [b for b in buckets if f"blob#{b}#{digest}" not in known]
+            if not missing:
+                continue
+            body = gzip.compress(zf.read(name), mtime=0)
+            for bucket in missing:
+                puts.append((bucket, blob_key(prefix, digest), body))
+                new[f"blob#{bucket}#{digest}"] = {"size": size}
+
+    manifest = json.dumps({
+        "format": 1,
+        "blobPrefix": f"{prefix}blobs/",
+        "members": [{"name": name, "sha256": digest, "size": size} for name, digest, size in members],
+    }, sort_keys=True).encode()
+
+    # Blobs before manifests: a manifest is only written once the blobs it lists exist.
+    with ThreadPoolExecutor(max_workers=PUT_CONCURRENCY) as executor:
+        list(executor.map(lambda p: s3.put_object(Bucket=p[0], Key=p[1], Body=p[2]), puts))
+        if new:
+            state.put_many(new, ttl=BLOB_INDEX_TTL)
+        written = list(executor.map(
+            lambda b: s3.put_object(Bucket=b, Key=key, Body=manifest, ContentType="application/json"),
+            buckets,
+        ))
+    return {
+        "members": len(members),
+        "blobs_written": len(puts),
+        "bytes_written": sum(len(p[2]) for p in puts) + len(manifest) * len(buckets),
+        "bytes_total": sum(size for _, _, size in members),
+        "objects": {
+            b: {"etag": resp.get("ETag"), "version_id": resp.get("VersionId")}
+            for b, resp in zip(buckets, written)
+        },
+    }
@@ -0,0 +1,94 @@
+"""
+Coalescing of buffered QuickSight EventBridge events.
+
+EventBridge delivers events to an SQS queue with a delivery delay; the
+function then receives them in batches. Events in one batch are grouped per
+(account, folder) so a burst becomes one export. Across batches a folder is
+debounced through its ``folder#<account>#<folderId>`` state record: an export
+that listed the folder after an event happened already covers that event.
+EventBridge event times have whole-second precision, so an event stamped T
+may have happened up to T + 1; only a listing from then on covers it.
+"""
+import json
+from datetime import datetime, timezone
+
+from qs_common import state
+
+
+def is_event_batch(event):
+    """True for SQS batches whose bodies are EventBridge events."""
+    records = event.get("Records") or []
+    return bool(records) and all(
+        r.get("eventSource") == "aws:sqs" and "detail-type" in _body(r) for r in records
+    )
+
+
+def _body(record):
+    try:
+        body = json.loads(record.get("body") or "{}")
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def event_time(evt):
+    raw = evt.get("time")
+    if not raw:
+        return datetime.now(timezone.utc).timestamp()
+    return datetime.fromisoformat(raw.replace("Z", "+00:00")).timestamp()
+
+
+def group_events(records, get_folder_ids, arn_from_event, region, force_refresh):
+    """
+    Collapse a batch into export groups.
+
+    Folder events group by (account, folderId), an event naming several folders
+    joining each of their groups; all other events of an account merge into
+    one group carrying the union of their resource ARNs. A group is forced when
+    any of its events asks for a forced refresh.
+    """
+    groups = {}
+    for record in records:
+        evt = _body(record)
+        account = evt.get("account")
+        for folder_id in get_folder_ids(evt) or [None]:
+            group = groups.setdefault((account, folder_id), {
+                "account": account,
+                "folderId": folder_id,
+                "latest": 0.0,
+                "events": 0,
+                "arns": set(),
+                "messageIds": [],
+                "force": False,
+            })
+            group["latest"] = max(group["latest"], event_time(evt))
+            group["events"] += 1
+            group["messageIds"].append(record["messageId"])
+            group["force"] = group["force"] or force_refresh(evt)
+            if not folder_id:
+                group["arns"].update(arn_from_event(evt, region))
+    return list(groups.values())
+
+
+def claim_folder(account, folder_id, latest_event, now):
+    """
+    Reserve an export for the folder unless one listed it after ``latest_event``.
+
+    Returns ``(claimed, previous)``; pass ``previous`` to ``release_folder`` if
+    the export fails so a retry isn't debounced away.
+    """
+    if not state.enabled():
+        return True, None
+    pk = f"folder#{account}#{folder_id}"
+    record = state.get(pk) or {}
+    previous = record.get("listedAt")
+    if previous is not None and previous >= latest_event + 1:
+        return False, previous
+    return state.update(pk, {"listedAt": now}, expect={"listedAt": previous}), previous
+
+
+def release_folder(account, folder_id, previous, claimed_at):
+    """Undo ``claim_folder`` unless another export has claimed the folder since."""
+    if state.enabled():
+        state.update(f"folder#{account}#{folder_id}", {"listedAt": previous or 0},
+                     expect={"listedAt": claimed_at})
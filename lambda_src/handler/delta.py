@@ -0,0 +1,64 @@
+"""
+Folder membership snapshots and deltas.
+
+The last exported membership of each folder (ARN -> LastUpdatedTime) is kept
+in the state table as ``snapshot#<account>#<folderId>``. A new listing is
+diffed against it: only added or changed members are exported, and removed
+members are written to a deletion manifest
+(``<TARGET_PREFIX><jobId>.deletions.json``) that the target worker can apply.
+"""
+import json
+import os
+import time
+
+from qs_common import state
+
+DELTA_EXPORTS = os.environ.get("DELTA_EXPORTS", "false").lower() == "true"
+DELETIONS_SUFFIX = ".deletions.json"
+
+
+def enabled():
+    return DELTA_EXPORTS and state.enabled()
+
+
+def load(account_id, folder_id):
+    """Previous snapshot's members, or None if this folder was never exported."""
+    record = state.get(f"snapshot#{account_id}#{folder_id}")
+    return None if record is None else record.get("members", {})
+
+
+def save(account_id, folder_id, members):
+    state.put(f"snapshot#{account_id}#{folder_id}", {
+        "members": members,
+        "takenAt": time.time(),
+    })
+
+
+def diff(previous, current):
+    """
+    Compare two ARN -> LastUpdatedTime maps.
+
+    Returns ``(changed, removed)``: ARNs that are new or whose time moved (or
+    is unknown), and ARNs no longer present.
+    """
+    changed = sorted(
+        arn for arn, stamp in current.items()
+        if arn not in previous or stamp is None or previous[arn] != stamp
+    )
+    removed = sorted(arn for arn in previous if arn not in current)
+    return changed, removed
+
+
+def write_deletion_manifest(s3, bucket, key, account_id, folder_id, removed):
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps({
+            "sourceAccount": account_id,
+            "folderId": folder_id,
+            "removed": removed,
+            "createdAt": time.time(),
+        }).encode(),
+        ContentType="application/json",
+    )
+    return key
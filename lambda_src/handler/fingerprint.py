@@ -0,0 +1,101 @@
+"""
+Resource-set fingerprints used to skip exports that would change nothing.
+
+A fingerprint is a SHA-256 over the sorted member ARNs and each member's
+LastUpdatedTime, together with those of every dataset, data source and theme
+the members depend on (from the dependency graph, ``graph.refresh``): an export
+includes its dependencies, so a dataset edited under an unchanged dashboard
+must change the fingerprint too. The fingerprint of the last successful export of a scope (a
+folder, or a fixed ARN set) is kept in the state table as
+``fp#<account>#<scope>`` and expires after ``FINGERPRINT_TTL_HOURS``.
+"""
+import hashlib
+import os
+
+from qs_common import state
+
+FINGERPRINT_CACHE = os.environ.get("FINGERPRINT_CACHE", "false").lower() == "true"
+FINGERPRINT_TTL = int(float(os.environ.get("FINGERPRINT_TTL_HOURS", "24")) * 3600)
+# Above this many ARNs of one type, one paginated List beats a Describe per ARN.
+DESCRIBE_LIMIT = 10
+
+# resource type -> (list op, list key, describe op, id param, describe key)
+_APIS = {
+    "dashboard": ("list_dashboards", "DashboardSummaryList", "describe_dashboard", "DashboardId", "Dashboard"),
+    "analysis": ("list_analyses", "AnalysisSummaryList", "describe_analysis", "AnalysisId", "Analysis"),
+    "dataset": ("list_data_sets", "DataSetSummaries", "describe_data_set", "DataSetId", "DataSet"),
+    "datasource": ("list_data_sources", "DataSources", "describe_data_source", "DataSourceId", "DataSource"),
+    "theme": ("list_themes", "ThemeSummaryList", "describe_theme", "ThemeId", "Theme"),
+}
+
+
+def enabled():
+    return FINGERPRINT_CACHE and state.enabled()
+
+
+def parse_arn(arn):
+    """``arn:aws:quicksight:<region>:<account>:<type>/<id>`` -> (type, id)."""
+    resource = arn.split(":", 5)[-1]
+    rtype, _, rid = resource.partition("/")
+    return rtype, rid
+
+
+def _stamp(value):
+    return value.isoformat() if hasattr(value, "isoformat") else (str(value) if value else None)
+
+
+def describe(qs, account_id, arn):
+    """The Describe payload of one asset (e.g. the ``Dashboard`` object), or None."""
+    rtype, rid = parse_arn(arn)
+    apis = _APIS.get(rtype)
+    if not apis:
+        return None
+    _, _, describe_op, id_param, describe_key = apis
+    return getattr(qs, describe_op)(AwsAccountId=account_id, **{id_param: rid}).get(describe_key, {})
+
+
+def resource_versions(qs, account_id, arns):
+    """Map each ARN to its LastUpdatedTime (ISO string, or None if unknown)."""
+    by_type = {}
+    for arn in arns:
+        by_type.setdefault(parse_arn(arn)[0], []).append(arn)
+
+    versions = {arn: None for arn in arns}
+    for rtype, typed_arns in by_type.items():
+        apis = _APIS.get(rtype)
+        if not apis:
+            continue
+        list_op, list_key = apis[:2]
+        if len(typed_arns) <= DESCRIBE_LIMIT:
+            for arn in typed_arns:
+                versions[arn] = _stamp(describe(qs, account_id, arn).get("LastUpdatedTime"))
+        else:
+            wanted = set(typed_arns)
+            for page in qs.get_paginator(list_op).paginate(AwsAccountId=account_id):
+                for summary in page.get(list_key, []):
+                    if summary.get("Arn") in wanted:
+                        versions[summary["Arn"]] = _stamp(summary.get("LastUpdatedTime"))
+    return versions
+
+
+def compute(versions):
+    digest = hashlib.sha256()
+    for arn in sorted(versions):
+        digest.update(f"{arn}|{versions[arn] or ''}\n".encode())
+    return digest.hexdigest()
+
+
+def scope_for(folder_id, arns):
+    if folder_id:
+        return f"folder/{folder_id}"
+    return "arns/" + hashlib.sha256("\n".join(sorted(arns)).encode()).hexdigest()[:32]
+
+
+def matches(account_id, scope, fingerprint):
+    """True when the last successful export of ``scope`` had this fingerprint."""
+    record = state.get(f"fp#{account_id}#{scope}")
+    return bool(record) and record.get("fingerprint") == fingerprint
+
+
+def remember(account_id, scope, fingerprint):
+    state.put(f"fp#{account_id}#{scope}", {"fingerprint": fingerprint}, ttl=FINGERPRINT_TTL)
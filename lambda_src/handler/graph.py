@@ -0,0 +1,146 @@
+"""
+Dependency-graph index of QuickSight assets and layered export plans.
+
+Edges run from dashboards and analyses to the datasets and themes they use,
+and from datasets to their data sources (and parent datasets). Each node is
+cached in the state table as ``graph#<account>#<arn>`` with the asset's
+LastUpdatedTime and is only re-described when that time moves, so refreshing
+the graph costs one List/Describe pass for the version check.
+
+With LAYERED_EXPORTS every export is split into layers that are exported
+without their dependencies and imported in order (data sources and themes,
+then datasets, then analyses and dashboards). A shared dependency is exported
+only when its version differs from the one last exported
+(``dep#<account>#<arn>``), so a dataset used by many dashboards travels once
+per change instead of inside every dashboard bundle.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+import fingerprint
+from qs_common import state
+
+LAYERED_EXPORTS = os.environ.get("LAYERED_EXPORTS", "false").lower() == "true"
+LAYER_SUFFIX = ".layer.qs"
+MANIFEST_SUFFIX = ".layers.json"
+
+# Import order; types not listed go into the last layer.
+LAYERS = (
+    ("datasource", "theme"),
+    ("dataset",),
+    ("analysis", "dashboard"),
+)
+_ARN_RE = re.compile(r"arn:aws[\w-]*:quicksight:[\w-]*:\d*:(?:dataset|datasource|theme)/[\w.-]+")
+
+
+def enabled():
+    return LAYERED_EXPORTS and state.enabled()
+
+
+def direct_deps(qs, account_id, arn):
+    """ARNs of the datasets, data sources and themes ``arn`` references."""
+    if fingerprint.parse_arn(arn)[0] not in {"dashboard", "analysis", "dataset"}:
+        return []
+    payload = json.dumps(fingerprint.describe(qs, account_id, arn) or {}, default=str)
+    return sorted(set(_ARN_RE.findall(payload)) - {arn})
+
+
+def refresh(qs, account_id, arns, versions=None):
+    """
+    Nodes for ``arns`` and everything they depend on, as
+    ``{arn: {"deps", "version"}}``; cached nodes are reused while their
+    version is unchanged. ``versions`` (ARN -> LastUpdatedTime) the caller
+    already fetched are not looked up again.
+    """
+    known = dict(versions or {})
+    nodes, frontier = {}, list(arns)
+    while frontier:
+        frontier = [arn for arn in dict.fromkeys(frontier) if arn not in nodes]
+        if not frontier:
+            break
+        versions = {arn: known[arn] for arn in frontier if arn in known}
+        versions.update(fingerprint.resource_versions(qs, account_id, [a for a in frontier if a not in known]))
+        cached = state.get_many(f"graph#{account_id}#{arn}" for arn in frontier)
+        stale = {}
+        for arn in frontier:
+            record = cached.get(f"graph#{account_id}#{arn}")
+            if record and versions[arn] is not None and record.get("version") == versions[arn]:
+                nodes[arn] = {"deps": record.get("deps", []), "version": versions[arn]}
+                continue
+            nodes[arn] = {"deps": direct_deps(qs, account_id, arn), "version": versions[arn]}
+            stale[f"graph#{account_id}#{arn}"] = nodes[arn]
+        if stale:
+            state.put_many(stale)
+        frontier = [dep for arn in frontier for dep in nodes[arn]["deps"]]
+    return nodes
+
+
+def _layer_index(arn):
+    rtype = fingerprint.parse_arn(arn)[0]
+    for i, types in enumerate(LAYERS):
+        if rtype in types:
+            return i
+    return len(LAYERS) - 1
+
+
+def plan_layers(account_id, nodes, requested, force=False):
+    """
+    Split an export of ``requested`` into ordered layers.
+
+    Requested assets are always exported; their transitive dependencies only
+    when new or changed since last exported (always with ``force``). Returns
+    ``(layers, versions)``: ``[{"layer", "types", "arns"}]`` (empty layers
+    dropped) and the ARN -> version map to pass to ``remember_exported`` once
+    the run succeeds.
+    """
+    requested = set(requested)
+    closure, stack = set(), list(requested)
+    while stack:
+        arn = stack.pop()
+        if arn in closure:
+            continue
+        closure.add(arn)
+        stack.extend(nodes.get(arn, {}).get("deps", []))
+
+    shared = sorted(closure - requested)
+    exported = {} if force else state.get_many(f"dep#{account_id}#{arn}" for arn in shared)
+    wanted = set(requested)
+    for arn in shared:
+        version = nodes[arn]["version"]
+        if version is None or exported.get(f"dep#{account_id}#{arn}", {}).get("version") != version:
+            wanted.add(arn)
+
+    layers = []
+    for i, types in enumerate(LAYERS):
+        arns = sorted(arn for arn in wanted if _layer_index(arn) == i)
+        if arns:
+            layers.append({"layer": i, "types": list(types), "arns": arns})
+    versions = {arn: nodes.get(arn, {}).get("version") for arn in wanted}
+    return layers, versions
+
+
+def remember_exported(account_id, versions):
+    state.put_many({
+        f"dep#{account_id}#{arn}": {"version": version}
+        for arn, version in versions.items() if version is not None
+    })
+
+
+def write_manifest(s3, bucket, key, run_id, account_id, folder_id, layers):
+    """
+    The target imports the listed layer bundles in order once this lands.
+    Returns the manifest's ``{"etag", "version_id", "sha256"}``.
+    """
+    body = json.dumps({
+        "runId": run_id,
+        "sourceAccount": account_id,
+        "folderId": folder_id,
+        "layers": layers,
+        "createdAt": time.time(),
+    }).encode()
+    resp = s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+    return {"etag": resp.get("ETag"), "version_id": resp.get("VersionId"),
+            "sha256": hashlib.sha256(body).hexdigest()}
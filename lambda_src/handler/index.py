@@ -1,61 +1,100 @@
+import contextlib
 import json
 import os
+import tempfile
 import time
 import uuid
-import urllib.request
-import urllib.error
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import bundle_index
+import chunks
+import coalesce
+import delta
+import fingerprint
+import graph
+import scheduler
+from qs_common import clients, jobs, metrics, profiling, ratelimit, state
+from qs_common.poller import is_throttle, poll_job, throttle_delay, time_budget
+from transfer import DownloadError, download_to, stream_url_to_buckets
 
 QS_REGION      = os.environ.get("QS_REGION", "us-east-1")
 TARGET_BUCKET  = os.environ["TARGET_BUCKET"]
+# Every target the export fans out to; TARGET_BUCKET is the primary one.
+TARGET_BUCKETS = json.loads(os.environ.get("TARGET_BUCKETS") or "[]") or [TARGET_BUCKET]
 TARGET_PREFIX  = os.environ.get("TARGET_PREFIX", "bundles/")
 ALLOWED_FOLDER_IDS = set(
     x.strip() for x in os.environ.get("ALLOWED_FOLDER_IDS", "").split(",") if x.strip()
 )
+TRANSFER_PART_SIZE = int(os.environ.get("TRANSFER_PART_SIZE_MB", "16")) * 1024 * 1024
+TRANSFER_CONCURRENCY = int(os.environ.get("TRANSFER_CONCURRENCY", "4"))
+FORCE_EXPORT = os.environ.get("FORCE_EXPORT", "false").lower() == "true"
+
+# Built on first use and kept warm for the container (see qs_common.clients).
+qs = clients.lazy("quicksight", QS_REGION, setup=lambda client: ratelimit.install(client, QS_REGION))
+s3 = clients.lazy("s3")
 
-qs = boto3.client("quicksight", region_name=QS_REGION)
-s3 = boto3.client("s3")
+EXPORT_TERMINAL = ("SUCCESSFUL", "FAILED")
 
-def poll_export(account_id, job_id, sleep=3, max_wait=600):
-    start = time.time()
-    while True:
-        resp = qs.describe_asset_bundle_export_job(
+def poll_export(account_id, job_id, max_wait=600, folder_id=None):
+    """Polls describe_asset_bundle_export_job until JobStatus is terminal."""
+    resp, stats = poll_job(
+        lambda: qs.describe_asset_bundle_export_job(
             AwsAccountId=account_id,
             AssetBundleExportJobId=job_id
-        )
-        status = resp.get("JobStatus")
-        if status in ("SUCCESSFUL", "FAILED"):
-            return resp
-        if time.time() - start > max_wait:
-            raise TimeoutError(f"Export job {job_id} timed out with status={status}")
-        time.sleep(sleep)
-
-def get_folder_id(evt):
+        ),
+        terminal=EXPORT_TERMINAL,
+        kind="export",
+        job_id=job_id,
+        max_wait=max_wait,
+    )
+    print(f"[INFO] Export poll stats: {json.dumps(stats.as_dict())}")
+    metrics.job("export", stats.elapsed, stats.polls, stats.throttles, folder_id, stats.status, jobId=job_id)
+    return resp, stats
+
+def to_all_targets(write):
+    """Run ``write(bucket)`` for every target bucket concurrently; ``{bucket: result}``."""
+    if len(TARGET_BUCKETS) == 1:
+        return {TARGET_BUCKET: write(TARGET_BUCKET)}
+    with ThreadPoolExecutor(max_workers=len(TARGET_BUCKETS)) as executor:
+        return dict(zip(TARGET_BUCKETS, executor.map(write, TARGET_BUCKETS)))
+
+def get_folder_ids(evt):
+    """
+    Every folder the event asks for: ``detail.folderId`` (string or list) or
+    ``detail.folderIds``; ``detail.syncAll`` means all of ALLOWED_FOLDER_IDS.
+    """
     detail = evt.get("detail", {})
-    fid = detail.get("folderId")
-    if isinstance(fid, list):
-        return fid[0] if fid else None
-    return fid
+    fids = detail.get("folderIds") or detail.get("folderId") or []
+    if isinstance(fids, str):
+        fids = [fids]
+    if not fids and detail.get("syncAll"):
+        fids = sorted(ALLOWED_FOLDER_IDS)
+    return list(dict.fromkeys(f for f in fids if f))
 
 def list_folder_member_arns(account_id, folder_id):
     arns, token = [], None
-    while True:
-        kwargs = {
-            "AwsAccountId": account_id,
-            "FolderId": folder_id,
-            "MaxResults": 100,
-        }
-        if token:
-            kwargs["NextToken"] = token
-        resp = qs.list_folder_members(**kwargs)
-        for m in resp.get("FolderMemberList", []):
-            arn = m.get("MemberArn")
-            if arn:
-                arns.append(arn)
-        token = resp.get("NextToken")
-        if not token:
-            break
-    return sorted(set(arns))
+    with metrics.phase("ListMembers", folder=folder_id) as phase:
+        while True:
+            kwargs = {
+                "AwsAccountId": account_id,
+                "FolderId": folder_id,
+                "MaxResults": 100,
+            }
+            if token:
+                kwargs["NextToken"] = token
+            resp = qs.list_folder_members(**kwargs)
+            for m in resp.get("FolderMemberList", []):
+                arn = m.get("MemberArn")
+                if arn:
+                    arns.append(arn)
+            token = resp.get("NextToken")
+            if not token:
+                break
+        arns = sorted(set(arns))
+        phase["ResourceCount"] = len(arns)
+    return arns
 
 def arn_from_event(evt, region):
     res = evt.get("resources") or []
@@ -74,56 +113,432 @@ def arn_from_event(evt, region):
         return [f"arn:aws:quicksight:{region}:{account}:dataset/{dsid}"]
     return []
 
-def lambda_handler(event, context):
-    src_account = event["account"]
-
-    folder_id = get_folder_id(event)
-    if folder_id:
-        if ALLOWED_FOLDER_IDS and folder_id not in ALLOWED_FOLDER_IDS:
-            return {"status": "SKIPPED", "reason": "Folder not allowed", "folderId": folder_id}
-        resource_arns = list_folder_member_arns(src_account, folder_id)
-        if not resource_arns:
-            return {"status": "SKIPPED", "reason": "Folder is empty", "folderId": folder_id}
-    else:
-        resource_arns = arn_from_event(event, QS_REGION)
-        if not resource_arns:
-            raise RuntimeError(f"Could not determine resources from event: {json.dumps(event)}")
-
+def start_export(src_account, resource_arns, attempts=5, include_dependencies=True):
+    """Starts the export job, backing off while the account is at its job limit."""
     job_id = f"exp-{uuid.uuid4().hex[:12]}"
-    qs.start_asset_bundle_export_job(
-        AwsAccountId=src_account,
-        AssetBundleExportJobId=job_id,
-        ResourceArns=resource_arns,
-        ExportFormat="QUICKSIGHT_JSON",
-        IncludeAllDependencies=True,
-        IncludePermissions=False,
-        IncludeTags=True,
-    )
+    for attempt in range(attempts):
+        try:
+            qs.start_asset_bundle_export_job(
+                AwsAccountId=src_account,
+                AssetBundleExportJobId=job_id,
+                ResourceArns=resource_arns,
+                ExportFormat="QUICKSIGHT_JSON",
+                IncludeAllDependencies=include_dependencies,
+                IncludePermissions=False,
+                IncludeTags=True,
+            )
+            return job_id
+        except ClientError as e:
+            limited = e.response.get("Error", {}).get("Code") == "LimitExceededException"
+            if not (limited or is_throttle(e)) or attempt + 1 == attempts:
+                raise
+            time.sleep(throttle_delay(attempt + 1, min_delay=2))
 
-    final = poll_export(src_account, job_id)
+def finish_export(job_id, final, ctx, poll):
+    """Copies a successful export's bundle to the target bucket."""
     if final.get("JobStatus") != "SUCCESSFUL":
-        raise RuntimeError(f"Export failed: {json.dumps(final)}")
+        raise RuntimeError(f"Export failed: {json.dumps(final, default=str)}")
 
-    final = qs.describe_asset_bundle_export_job(
-        AwsAccountId=src_account,
-        AssetBundleExportJobId=job_id
-    )
     download_url = final.get("DownloadUrl")
     if not download_url:
         raise RuntimeError("No DownloadUrl on successful export job")
 
+    key = ctx.get("bundleKey") or f"{TARGET_PREFIX}{job_id}.qs"
     try:
-        bundle_bytes = urllib.request.urlopen(download_url, timeout=60).read()
-    except urllib.error.URLError as e:
+        with metrics.phase("Transfer", folder=ctx.get("folderId"), jobId=job_id) as phase:
+            if chunks.enabled():
+                # Content-addressed mode: only blobs the target lacks cross the account boundary.
+                key = chunks.manifest_key(key)
+                with tempfile.SpooledTemporaryFile(max_size=chunks.SPOOL_BYTES) as bundle:
+                    size, sha256 = download_to(download_url, bundle)
+                    transfer = dict(chunks.store(s3, TARGET_BUCKETS, TARGET_PREFIX, bundle, key),
+                                    bytes=size, sha256=sha256)
+                objects = transfer.pop("objects")
+                print(f"[INFO] Chunked bundle {key}: {json.dumps(transfer)}")
+            else:
+                # Stream the bundle straight into every target bucket (downloaded once);
+                # memory stays at part_size * concurrency.
+                objects = stream_url_to_buckets(
+                    s3, download_url, TARGET_BUCKETS, key,
+                    part_size=TRANSFER_PART_SIZE,
+                    concurrency=TRANSFER_CONCURRENCY,
+                )
+                transfer = objects[TARGET_BUCKET]
+            phase["BundleBytes"] = transfer["bytes"]
+            phase["ResourceCount"] = ctx["resourceCount"]
+    except DownloadError as e:
         raise RuntimeError(f"Failed to download bundle: {e}") from e
 
-    key = f"{TARGET_PREFIX}{job_id}.qs"
-    s3.put_object(Bucket=TARGET_BUCKET, Key=key, Body=bundle_bytes)
-
-    return {
+    result = {
         "status": "OK",
         "job_status": final["JobStatus"],
+        "folderId": ctx.get("folderId"),
+        "resource_count": ctx["resourceCount"],
+        "removed_count": len(ctx.get("removed") or []),
+        "bundle_bytes": transfer["bytes"],
+        "bytes_written": transfer.get("bytes_written", transfer["bytes"]),
+        "poll": poll,
+        "s3_uri": f"s3://{TARGET_BUCKET}/{key}",
+        "targets": len(TARGET_BUCKETS),
+    }
+    if ctx.get("runId"):
+        manifest_uri = layer_done(ctx["runId"], ctx["layer"])
+        return dict(result, run_id=ctx["runId"], layer=ctx["layer"], manifest_uri=manifest_uri)
+    record_export(ctx, job_id)
+    if bundle_index.enabled() and ctx.get("arns"):
+        bundle_index.record(s3, ctx["accountId"], ctx["arns"], key, objects, transfer["sha256"],
+                            ctx.get("folderId"), job_id)
+    return result
+
+def record_export(ctx, job_id):
+    """Delta and fingerprint bookkeeping once a scope's export is fully written."""
+    # ----- Membership delta bookkeeping (removed members + new snapshot) -----
+    if ctx.get("removed"):
+        to_all_targets(lambda bucket: delta.write_deletion_manifest(
+            s3, bucket, f"{TARGET_PREFIX}{job_id}{delta.DELETIONS_SUFFIX}",
+            ctx["accountId"], ctx.get("folderId"), ctx["removed"],
+        ))
+    if ctx.get("snapshot") is not None:
+        delta.save(ctx["accountId"], ctx["folderId"], ctx["snapshot"])
+
+    if ctx.get("fingerprint"):
+        fingerprint.remember(ctx["accountId"], ctx["scope"], ctx["fingerprint"])
+
+def layer_done(run_id, layer):
+    """
+    Record a finished layer of a layered run. The layers are a set, so a
+    retried finish counts once; the call that completes it writes the layer
+    manifest and does the run's bookkeeping (all overwrites, safe to repeat)
+    and returns the manifest URI. Raises if the run is gone or has failed.
+    """
+    pk = f"run#{run_id}"
+    run = state.add(pk, "done", [layer])
+    if run is None:
+        raise RuntimeError(f"Run {run_id} is missing or expired")
+    if run.get("status") == "FAILED":
+        raise RuntimeError(f"Run {run_id} already failed: {run.get('error')}")
+    if len(run["done"]) < len(run["layers"]):
+        return None
+    ctx = run["ctx"]
+    key = f"{TARGET_PREFIX}{run_id}{graph.MANIFEST_SUFFIX}"
+    objects = to_all_targets(lambda bucket: graph.write_manifest(
+        s3, bucket, key, run_id, ctx["accountId"], ctx.get("folderId"), run["layers"],
+    ))
+    record_export(ctx, run_id)
+    graph.remember_exported(ctx["accountId"], run["versions"])
+    if bundle_index.enabled():
+        # Every asset of the run is indexed under the manifest that imports it.
+        arns = [arn for layer in run["layers"] for arn in layer["arns"]]
+        bundle_index.record(s3, ctx["accountId"], arns, key, objects, objects[TARGET_BUCKET]["sha256"],
+                            ctx.get("folderId"), run_id)
+    state.update(pk, {"status": "SUCCEEDED"}, expect={"status": None})
+    return f"s3://{TARGET_BUCKET}/{key}"
+
+def describe_export(job):
+    return qs.describe_asset_bundle_export_job(
+        AwsAccountId=job["accountId"],
+        AssetBundleExportJobId=job["jobId"]
+    )
+
+def on_export_done(job, final):
+    ctx = job["context"]
+    if final.get("JobStatus") != "SUCCESSFUL":
+        print(f"[ERROR] Export job {job['jobId']} failed: {json.dumps(final.get('Errors'), default=str)}")
+        export_failed(ctx, json.dumps(final.get("Errors"), default=str))
+        return {"errors": final.get("Errors")}
+    result = finish_export(job["jobId"], final, ctx, job["progress"])
+    print(f"[INFO] Export job {job['jobId']} finished: {json.dumps(result)}")
+    return result
+
+def on_export_failed(job, result):
+    """The check chain gave up on an export (timed out, or its transfer kept failing)."""
+    export_failed(job["context"], result.get("error"))
+
+def export_failed(ctx, error):
+    """An export that will never land: fail its layered run, or release its folder claim."""
+    if ctx.get("runId"):
+        run_failed(ctx["runId"], ctx.get("layer"), error)
+    else:
+        release_claim(ctx)
+
+def run_failed(run_id, layer, error):
+    """
+    Mark a layered run FAILED once one of its layers failed for good. The run
+    never writes its manifest, so the folder's claim is released (once) too.
+    """
+    pk = f"run#{run_id}"
+    run = state.get(pk)
+    if not run or not state.update(pk, {"status": "FAILED", "error": f"layer {layer}: {error}"},
+                                   expect={"status": None}):
+        return
+    print(f"[ERROR] Run {run_id} failed in layer {layer}: {error}")
+    release_claim(run["ctx"])
+
+def release_claim(ctx):
+    """Undo the folder's coalescing claim so its events aren't debounced away."""
+    claim = ctx.get("claim")
+    if claim:
+        coalesce.release_folder(ctx["accountId"], ctx["folderId"], claim["previous"], claim["claimedAt"])
+
+def plan_export(src_account, folder_id, resource_arns, force=False, versions=None, extra=None):
+    """
+    Builds the export plan for ``resource_arns``: ``(plan, None)``, or
+    ``(None, result)`` when the fingerprint shows nothing changed.
+
+    ``versions`` (ARN -> LastUpdatedTime of the whole scope) is reused when the
+    caller already fetched it; ``extra`` is merged into the job context.
+    """
+    ctx = {
+        "accountId": src_account,
         "folderId": folder_id,
-        "resource_count": len(resource_arns),
-        "s3_uri": f"s3://{TARGET_BUCKET}/{key}"
+        "resourceCount": len(resource_arns),
+        "arns": list(resource_arns),
+        **(extra or {}),
+    }
+
+    # ----- Skip the export when nothing changed since the last successful one -----
+    if fingerprint.enabled():
+        if versions is None:
+            versions = fingerprint.resource_versions(qs, src_account, resource_arns)
+        ctx["scope"] = fingerprint.scope_for(folder_id, resource_arns)
+        # Exports carry their dependencies: their versions count too.
+        nodes = graph.refresh(qs, src_account, resource_arns, versions)
+        ctx["fingerprint"] = fingerprint.compute(
+            {**{arn: node["version"] for arn, node in nodes.items()}, **versions}
+        )
+        if not force and fingerprint.matches(src_account, ctx["scope"], ctx["fingerprint"]):
+            return None, {"status": "SKIPPED", "reason": "Unchanged since last export",
+                          "folderId": folder_id, "fingerprint": ctx["fingerprint"]}
+
+    return {"arns": resource_arns, "ctx": ctx, "force": force}, None
+
+def plan_folder(src_account, folder_id, force=False):
+    """Lists the folder and plans its export: ``(plan, None)`` or ``(None, result)``."""
+    if ALLOWED_FOLDER_IDS and folder_id not in ALLOWED_FOLDER_IDS:
+        return None, {"status": "SKIPPED", "reason": "Folder not allowed", "folderId": folder_id}
+    resource_arns = list_folder_member_arns(src_account, folder_id)
+    if not delta.enabled():
+        if not resource_arns:
+            return None, {"status": "SKIPPED", "reason": "Folder is empty", "folderId": folder_id}
+        return plan_export(src_account, folder_id, resource_arns, force=force)
+
+    # ----- Delta mode: export only members added or changed since the last snapshot -----
+    versions = fingerprint.resource_versions(qs, src_account, resource_arns)
+    previous = delta.load(src_account, folder_id)
+    if previous is None:
+        if not resource_arns:
+            return None, {"status": "SKIPPED", "reason": "Folder is empty", "folderId": folder_id}
+        return plan_export(src_account, folder_id, resource_arns, force=force,
+                           versions=versions, extra={"snapshot": versions})
+
+    changed, removed = delta.diff(previous, versions)
+    extra = {"snapshot": versions, "removed": removed}
+    if force and resource_arns:
+        changed = resource_arns
+    if not changed and not removed:
+        return None, {"status": "SKIPPED", "reason": "No membership changes", "folderId": folder_id}
+    if not changed:
+        return None, publish_deletions(src_account, folder_id, removed, versions)
+    print(f"[INFO] Folder {folder_id}: exporting {len(changed)} of {len(resource_arns)} member(s), "
+          f"{len(removed)} removed")
+    return plan_export(src_account, folder_id, changed, force=force,
+                       versions=versions, extra=extra)
+
+def publish_deletions(src_account, folder_id, removed, snapshot):
+    """Removal-only delta: no export job, just the deletion manifest."""
+    key = f"{TARGET_PREFIX}del-{uuid.uuid4().hex[:12]}{delta.DELETIONS_SUFFIX}"
+    to_all_targets(lambda bucket: delta.write_deletion_manifest(
+        s3, bucket, key, src_account, folder_id, removed,
+    ))
+    delta.save(src_account, folder_id, snapshot)
+    return {"status": "OK", "folderId": folder_id, "resource_count": 0,
+            "removed_count": len(removed), "s3_uri": f"s3://{TARGET_BUCKET}/{key}"}
+
+def execute_plan(plan, context, job_slots=None):
+    """
+    Runs a planned export. ``job_slots`` (from the scheduler) is held only while
+    the QuickSight job runs, so the download/upload overlaps other folders' jobs.
+    """
+    if graph.enabled():
+        return execute_layered(plan, context, job_slots)
+    ctx = plan["ctx"]
+    with job_slots or contextlib.nullcontext():
+        job_id = start_export(ctx["accountId"], plan["arns"])
+
+        if jobs.ASYNC_MODE:
+            # Return immediately; a delayed check message picks up the download/upload.
+            jobs.submit("export", job_id, ctx["accountId"], ctx)
+            return {"status": "STARTED", "export_job": job_id, "folderId": ctx.get("folderId"),
+                    "resource_count": ctx["resourceCount"]}
+
+        final, poll_stats = poll_export(ctx["accountId"], job_id, max_wait=time_budget(context, 600),
+                                        folder_id=ctx.get("folderId"))
+    return finish_export(job_id, final, ctx, poll_stats.as_dict())
+
+def execute_layered(plan, context, job_slots=None):
+    """
+    Runs a planned export as dependency layers: one job per layer, exported
+    without dependencies, and a layer manifest once every layer has landed.
+    """
+    ctx = plan["ctx"]
+    account = ctx["accountId"]
+    nodes = graph.refresh(qs, account, plan["arns"])
+    layers, versions = graph.plan_layers(account, nodes, plan["arns"], force=plan.get("force", False))
+    run_id = f"run-{uuid.uuid4().hex[:12]}"
+    for layer in layers:
+        layer["key"] = f"{TARGET_PREFIX}{run_id}/{layer['layer']}{graph.LAYER_SUFFIX}"
+        if chunks.enabled():
+            layer["key"] = chunks.manifest_key(layer["key"])
+    state.put(f"run#{run_id}", {
+        "ctx": ctx,
+        "layers": layers,
+        "versions": versions,
+    }, ttl=jobs.JOB_TTL)
+    print(f"[INFO] Run {run_id}: {len(plan['arns'])} requested asset(s) -> "
+          f"{[len(layer['arns']) for layer in layers]} per layer")
+
+    def export_layer(layer):
+        layer_ctx = {
+            "accountId": account,
+            "folderId": ctx.get("folderId"),
+            "resourceCount": len(layer["arns"]),
+            "runId": run_id,
+            "layer": layer["layer"],
+            "bundleKey": layer["key"],
+        }
+        with job_slots or contextlib.nullcontext():
+            job_id = start_export(account, layer["arns"], include_dependencies=False)
+            if jobs.ASYNC_MODE:
+                jobs.submit("export", job_id, account, layer_ctx)
+                return {"status": "STARTED", "export_job": job_id, "layer": layer["layer"]}
+            final, poll_stats = poll_export(account, job_id, max_wait=time_budget(context, 600),
+                                            folder_id=ctx.get("folderId"))
+        return finish_export(job_id, final, layer_ctx, poll_stats.as_dict())
+
+    def run_layer(layer):
+        try:
+            return export_layer(layer)
+        except Exception as e:
+            run_failed(run_id, layer["layer"], e)
+            raise
+
+    with ThreadPoolExecutor(max_workers=len(layers)) as executor:
+        results = list(executor.map(run_layer, layers))
+    manifest_uri = next((r["manifest_uri"] for r in results if r.get("manifest_uri")), None)
+    return {
+        "status": "STARTED" if jobs.ASYNC_MODE else "OK",
+        "run_id": run_id,
+        "folderId": ctx.get("folderId"),
+        "resource_count": ctx["resourceCount"],
+        "layers": results,
+        "s3_uri": manifest_uri,
     }
+
+def export_folder(src_account, folder_id, context, force=False, job_slots=None, claim=None):
+    """
+    ``claim`` (``{"previous", "claimedAt"}`` from coalesce.claim_folder) travels
+    with an async export, so a failure seen by the check chain releases it.
+    """
+    with metrics.phase("ExportFolder", folder=folder_id):
+        plan, result = plan_folder(src_account, folder_id, force=force)
+        if plan is None:
+            return result
+        if claim:
+            plan["ctx"]["claim"] = claim
+        return execute_plan(plan, context, job_slots)
+
+def export_resources(src_account, resource_arns, context, force=False):
+    plan, result = plan_export(src_account, None, resource_arns, force=force)
+    return result if plan is None else execute_plan(plan, context)
+
+def export_folders(src_account, folder_ids, context, force=False):
+    """Exports several folders through the bounded scheduler."""
+    results = scheduler.run_all(
+        folder_ids,
+        lambda folder_id, slots: export_folder(src_account, folder_id, context, force, slots),
+    )
+    failed = [f for f, r in results.items() if r.get("status") == "FAILED"]
+    return {
+        "status": "PARTIAL" if failed else "OK",
+        "failed": failed,
+        "folders": results,
+    }
+
+def force_refresh(evt):
+    """``detail.forceRefresh`` on the event, or FORCE_EXPORT on the function."""
+    return FORCE_EXPORT or bool((evt.get("detail") or {}).get("forceRefresh"))
+
+def handle_event_batch(event, context):
+    """Buffered EventBridge events from SQS: one export per folder per batch."""
+    failures = set()
+    claims = {}
+    groups = coalesce.group_events(event["Records"], get_folder_ids, arn_from_event, QS_REGION,
+                                   force_refresh)
+    for group in groups:
+        folder_id = group["folderId"]
+        if not folder_id:
+            if not group["arns"]:
+                print(f"[WARN] Dropping {group['events']} event(s) with no resolvable resources")
+                continue
+            try:
+                result = export_resources(group["account"], sorted(group["arns"]), context,
+                                          force=group["force"])
+                print(f"[INFO] Coalesced {group['events']} event(s): {json.dumps(result, default=str)}")
+            except Exception as e:
+                print(f"[ERROR] Export for {len(group['arns'])} resource(s) failed: {e}")
+                failures.update(group["messageIds"])
+            continue
+        if ALLOWED_FOLDER_IDS and folder_id not in ALLOWED_FOLDER_IDS:
+            continue
+        claimed_at = time.time()
+        try:
+            claimed, previous = coalesce.claim_folder(
+                group["account"], folder_id, group["latest"], claimed_at
+            )
+        except Exception as e:
+            print(f"[ERROR] Could not claim folder {folder_id}: {e}")
+            failures.update(group["messageIds"])
+            continue
+        if not claimed:
+            print(f"[INFO] Folder {folder_id}: {group['events']} event(s) already covered by a newer export")
+            continue
+        claims[(group["account"], folder_id)] = (group, {"previous": previous, "claimedAt": claimed_at})
+
+    # ----- Claimed folders run concurrently under the job scheduler -----
+    results = scheduler.run_all(
+        claims,
+        lambda key, slots: export_folder(key[0], key[1], context, claims[key][0]["force"], slots,
+                                         claim=claims[key][1]),
+    )
+    for (account, folder_id), result in results.items():
+        group, claim = claims[(account, folder_id)]
+        if result.get("status") == "FAILED":
+            coalesce.release_folder(account, folder_id, claim["previous"], claim["claimedAt"])
+            failures.update(group["messageIds"])
+        else:
+            print(f"[INFO] Coalesced {group['events']} event(s): {json.dumps(result, default=str)}")
+    return {"batchItemFailures": [{"itemIdentifier": m} for m in sorted(failures)]}
+
+@profiling.profiled("export")
+def lambda_handler(event, context):
+    # ----- Async mode: delayed job-check messages from the SQS queue -----
+    if jobs.is_check_event(event):
+        return jobs.handle_checks(event, describe_export, EXPORT_TERMINAL, on_export_done,
+                                  on_export_failed)
+
+    # ----- Buffered mode: EventBridge events batched through SQS -----
+    if coalesce.is_event_batch(event):
+        return handle_event_batch(event, context)
+
+    src_account = event["account"]
+
+    folder_ids = get_folder_ids(event)
+    if len(folder_ids) == 1:
+        return export_folder(src_account, folder_ids[0], context, force=force_refresh(event))
+    if folder_ids:
+        return export_folders(src_account, folder_ids, context, force=force_refresh(event))
+
+    resource_arns = arn_from_event(event, QS_REGION)
+    if not resource_arns:
+        raise RuntimeError(f"Could not determine resources from event: {json.dumps(event)}")
+    return export_resources(src_account, resource_arns, context, force=force_refresh(event))
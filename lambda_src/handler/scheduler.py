@@ -0,0 +1,42 @@
+"""
+Bounded scheduler for exporting many folders in one invocation.
+
+Each folder runs as its own pipeline (list -> export job -> download/upload)
+on a thread pool, so listings happen concurrently. A semaphore of
+``max_jobs`` slots is held only while an export job is running, which keeps
+the account under QuickSight's concurrent-job limit; a pipeline releases its
+slot as soon as its job finishes, so download/upload of finished jobs overlaps
+with jobs that are still running.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENT_EXPORTS = int(os.environ.get("MAX_CONCURRENT_EXPORTS", "5"))
+MAX_PARALLEL_FOLDERS = int(os.environ.get("MAX_PARALLEL_FOLDERS", "16"))
+
+
+def run_all(items, pipeline, max_jobs=None, max_workers=None):
+    """
+    Run ``pipeline(item, job_slots)`` for every item and collect the results.
+
+    ``job_slots`` is the shared semaphore a pipeline must hold while its export
+    job runs. Returns ``{item: result}``; a pipeline that raises yields
+    ``{"status": "FAILED", "error": ...}`` without stopping the others.
+    """
+    items = list(items)
+    if not items:
+        return {}
+    job_slots = threading.BoundedSemaphore(max_jobs or MAX_CONCURRENT_EXPORTS)
+    workers = min(max_workers or MAX_PARALLEL_FOLDERS, len(items))
+
+    def guarded(item):
+        try:
+            return pipeline(item, job_slots)
+        except Exception as e:
+            print(f"[ERROR] Pipeline for {item} failed: {e}")
+            return {"status": "FAILED", "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {item: executor.submit(guarded, item) for item in items}
+        return {item: future.result() for item, future in futures.items()}
@@ -0,0 +1,344 @@
+"""
+Streaming transfer of export bundles from a presigned DownloadUrl into S3.
+
+The bundle is never held in memory as a whole: ranged GETs fill buffers taken
+from a fixed-size pool and each filled buffer is sent as one part of an S3
+multipart upload. Peak memory is bounded by ``part_size * concurrency``
+regardless of the bundle size. With several destination buckets each filled
+buffer is uploaded to all of them before it is reused, so the bundle is still
+downloaded only once. The SHA-256 of the whole object is computed on the way
+through: parts are fetched in parallel but fed to the digest in order.
+
+All GETs go through one module-level urllib3 pool, so the ranged GETs of a
+bundle, and the bundles of later warm invocations, reuse keep-alive
+connections to the download host instead of a TLS handshake per request.
+"""
+import contextlib
+import hashlib
+import io
+import queue
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part except the last
+HTTP_POOL_SIZE = 32  # connections kept per host; >= concurrency * transfers in flight
+CONNECT_TIMEOUT = 10
+_CONTENT_RANGE_RE = re.compile(r"bytes \d+-\d+/(\d+)")
+
+_http = urllib3.PoolManager(
+    maxsize=HTTP_POOL_SIZE,
+    # Follow redirects; _fetch_range retries network errors itself.
+    retries=urllib3.Retry(total=None, connect=0, read=0, status=0, other=0, redirect=5),
+    socket_options=urllib3.connection.HTTPConnection.default_socket_options
+    + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+)
+
+
+class DownloadError(IOError):
+    """The presigned URL answered with an error status or the connection failed."""
+
+
+def _download_error(e):
+    # MaxRetryError's message embeds the request path, i.e. the URL's signature.
+    reason = e.reason if isinstance(e, urllib3.exceptions.MaxRetryError) else e
+    return DownloadError(f"{type(reason).__name__}: {reason}")
+
+
+class _PartReader(io.RawIOBase):
+    """Read-only, seekable file object over the filled slice of a pooled buffer."""
+
+    def __init__(self, view):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        else:
+            pos = len(self._view) + offset
+        self._pos = max(0, min(pos, len(self._view)))
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+class _BufferPool:
+    """Fixed number of reusable part buffers; ``acquire`` blocks when all are in use."""
+
+    def __init__(self, size, count):
+        self._size = size
+        self._free = queue.Queue()
+        self._allocated = 0
+        self._count = count
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            allocate = self._allocated < self._count
+            if allocate:
+                self._allocated += 1
+        if allocate:
+            return bytearray(self._size)
+        return self._free.get()
+
+    def release(self, buf):
+        self._free.put(buf)
+
+
+class _OrderedDigest:
+    """SHA-256 over parts that arrive from several threads; each waits for its predecessor."""
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._next = 1
+        self._failed = False
+        self._turn = threading.Condition()
+
+    def update(self, part_number, data):
+        with self._turn:
+            self._turn.wait_for(lambda: self._next == part_number or self._failed)
+            if self._failed:
+                raise DownloadError(f"Part {part_number} abandoned: an earlier part failed")
+            self._digest.update(data)
+            self._next += 1
+            self._turn.notify_all()
+
+    def fail(self):
+        """A part will never arrive; release every part waiting behind it."""
+        with self._turn:
+            self._failed = True
+            self._turn.notify_all()
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+def _open(url, start=None, end=None, timeout=60):
+    """
+    GET ``url`` (optionally bytes ``start``-``end``) from the shared pool. The
+    connection goes back to the pool once the body has been read to the end.
+    """
+    headers = {"Range": f"bytes={start}-{end}"} if start is not None else {}
+    try:
+        resp = _http.request(
+            "GET", url, headers=headers, preload_content=False,
+            timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=timeout),
+        )
+    except urllib3.exceptions.HTTPError as e:
+        raise _download_error(e) from e
+    if resp.status >= 300:
+        reason = resp.reason
+        resp.drain_conn()
+        resp.release_conn()
+        # The URL itself is a credential; keep it out of the message.
+        raise DownloadError(f"HTTP Error {resp.status}: {reason}")
+    return resp
+
+
+def _fill(resp, view):
+    """Read from ``resp`` until ``view`` is full or the body ends; returns bytes read."""
+    filled = 0
+    try:
+        while filled < len(view):
+            n = resp.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+    except urllib3.exceptions.HTTPError as e:
+        raise _download_error(e) from e
+    return filled
+
+
+def _fetch_range(url, start, end, view, retries=3, timeout=60):
+    """Ranged GET of [start, end] into ``view``, retrying transient network errors."""
+    expected = end - start + 1
+    for attempt in range(retries):
+        try:
+            with _open(url, start, end, timeout=timeout) as resp:
+                n = _fill(resp, view[:expected])
+            if n == expected:
+                return n
+            err = IOError(f"Short read for bytes={start}-{end}: got {n} of {expected}")
+        except OSError as e:
+            err = e
+        if attempt + 1 < retries:
+            time.sleep(0.5 * (2 ** attempt))
+    raise err
+
+
+def _total_size(resp):
+    """Total object size from a 206 response, or None when ranges aren't honoured."""
+    if resp.status != 206:
+        return None
+    match = _CONTENT_RANGE_RE.match(resp.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+
+def _each(buckets, fn):
+    """``{bucket: fn(bucket)}``, with the buckets served concurrently."""
+    if len(buckets) == 1:
+        return {buckets[0]: fn(buckets[0])}
+    with ThreadPoolExecutor(max_workers=len(buckets)) as executor:
+        return dict(zip(buckets, executor.map(fn, buckets)))
+
+
+def stream_url_to_buckets(s3_client, url, buckets, key, part_size=16 * 1024 * 1024,
+                          concurrency=4, timeout=60):
+    """
+    Copy the object behind ``url`` to ``key`` in each of ``buckets``.
+
+    Uses parallel ranged GETs when the server honours ``Range`` and falls back
+    to a single sequential read (with parallel part uploads) otherwise. Every
+    part is teed into all buckets, so the object is downloaded once however
+    many buckets receive it; any failure aborts the upload everywhere. Bundles
+    that fit in one part are written with a plain ``put_object``.
+    Returns ``{bucket: {"bytes", "parts", "etag", "version_id", "sha256"}}``.
+    """
+    buckets = list(dict.fromkeys(buckets))
+    part_size = max(int(part_size), MIN_PART_SIZE)
+    concurrency = max(int(concurrency), 1)
+    pool = _BufferPool(part_size, concurrency)
+
+    first = pool.acquire()
+    resp = _open(url, 0, part_size - 1, timeout=timeout)
+    try:
+        total = _total_size(resp)
+        first_len = _fill(resp, memoryview(first))
+        if total is None:
+            # Range ignored (200): ``resp`` carries the whole body and is read on
+            # sequentially; a short first fill means the body already ended.
+            single = first_len < part_size
+        else:
+            single = total <= part_size
+        if single:
+            # Whole object fits in a single part: no multipart bookkeeping needed.
+            sha256 = hashlib.sha256(memoryview(first)[:first_len]).hexdigest()
+
+            def put(bucket):
+                out = s3_client.put_object(
+                    Bucket=bucket, Key=key, Body=_PartReader(memoryview(first)[:first_len])
+                )
+                return {"bytes": first_len, "parts": 1, "sha256": sha256,
+                        "etag": out.get("ETag"), "version_id": out.get("VersionId")}
+            return _each(buckets, put)
+        return _multipart(s3_client, url, buckets, key, resp, total, first, first_len,
+                          pool, part_size, concurrency, timeout)
+    finally:
+        resp.close()
+
+
+def _multipart(s3_client, url, buckets, key, resp, total, first, first_len,
+               pool, part_size, concurrency, timeout):
+    upload_ids = {}
+    digest = _OrderedDigest()
+    digest.update(1, memoryview(first)[:first_len])
+
+    def upload(part_number, buf, length):
+        def upload_to(bucket):
+            out = s3_client.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_ids[bucket], PartNumber=part_number,
+                Body=_PartReader(memoryview(buf)[:length]),
+            )
+            return {"PartNumber": part_number, "ETag": out["ETag"]}
+        try:
+            return _each(list(upload_ids), upload_to)
+        finally:
+            pool.release(buf)
+
+    def fetch_and_upload(part_number, start):
+        buf = pool.acquire()
+        try:
+            end = min(start + part_size, total) - 1
+            length = _fetch_range(url, start, end, memoryview(buf), timeout=timeout)
+            digest.update(part_number, memoryview(buf)[:length])
+        except BaseException:
+            pool.release(buf)
+            digest.fail()
+            raise
+        return upload(part_number, buf, length)
+
+    try:
+        for bucket in buckets:
+            upload_ids[bucket] = s3_client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(upload, 1, first, first_len)]
+            size = first_len
+            if total is not None:
+                for n, start in enumerate(range(part_size, total, part_size), start=2):
+                    futures.append(executor.submit(fetch_and_upload, n, start))
+                size = total
+            else:
+                # Sequential read of the un-ranged body; acquire() applies backpressure.
+                part_number = 2
+                while True:
+                    buf = pool.acquire()
+                    length = _fill(resp, memoryview(buf))
+                    if not length:
+                        pool.release(buf)
+                        break
+                    digest.update(part_number, memoryview(buf)[:length])
+                    futures.append(executor.submit(upload, part_number, buf, length))
+                    size += length
+                    part_number += 1
+            parts = [f.result() for f in futures]
+
+        def complete(bucket):
+            done = s3_client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_ids[bucket],
+                MultipartUpload={"Parts": sorted((p[bucket] for p in parts),
+                                                 key=lambda p: p["PartNumber"])},
+            )
+            return {"bytes": size, "parts": len(parts), "sha256": digest.hexdigest(),
+                    "etag": done.get("ETag"), "version_id": done.get("VersionId")}
+        results = _each(buckets, complete)
+    except BaseException:
+        for bucket, upload_id in upload_ids.items():
+            # An upload that already completed elsewhere can't be aborted; keep the original error.
+            with contextlib.suppress(Exception):
+                s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+    return results
+
+
+def download_to(url, fileobj, chunk_size=1024 * 1024, timeout=60):
+    """
+    Copy the object behind ``url`` into ``fileobj`` sequentially; returns
+    ``(bytes written, sha256)``.
+    """
+    size = 0
+    digest = hashlib.sha256()
+    buf = bytearray(chunk_size)
+    with _open(url, timeout=timeout) as resp:
+        while True:
+            n = _fill(resp, memoryview(buf))
+            if not n:
+                return size, digest.hexdigest()
+            fileobj.write(memoryview(buf)[:n])
+            digest.update(memoryview(buf)[:n])
+            size += n
@@ -0,0 +1,161 @@
+"""
+Per-asset diffing of QUICKSIGHT_JSON asset bundles.
+
+A bundle is a zip with one JSON document per asset (``<type>/<assetId>.json``).
+The bundle is read in memory, never extracted to disk; each document is
+normalized (volatile timestamps/status dropped, keys sorted) and hashed. The
+hash last imported for every asset is kept in the state table as
+``asset#<account>#<type>/<assetId>``. Only assets whose hash changed, plus any
+dependency the target has never received, go into a reduced bundle written
+under STAGING_PREFIX; unchanged dependencies already exist in the target and
+are resolved there by ARN.
+"""
+import hashlib
+import io
+import json
+import os
+import posixpath
+import re
+import uuid
+import zipfile
+
+from qs_common import state
+
+ASSET_DIFFING = os.environ.get("ASSET_DIFFING", "false").lower() == "true"
+STAGING_PREFIX = os.environ.get("STAGING_PREFIX", "staging/")
+INSPECT_MAX_BYTES = int(os.environ.get("INSPECT_MAX_BYTES", str(128 * 1024 * 1024)))
+
+VOLATILE_KEYS = {
+    "CreatedTime", "LastUpdatedTime", "LastPublishedTime", "ConsumedSpiceCapacityInBytes",
+    "RequestId", "Status", "VersionNumber",
+}
+_ARN_RE = re.compile(r"arn:aws[\w-]*:quicksight:[\w-]*:\d*:(\w+)/([\w.-]+)")
+
+
+def enabled():
+    return ASSET_DIFFING and state.enabled()
+
+
+def is_staged(key):
+    """Bundles the worker writes itself (reduced or rebuilt) are never imported on arrival."""
+    return key.startswith(STAGING_PREFIX)
+
+
+def _key(rtype, rid):
+    """Asset keys lowercase the type only; QuickSight IDs are case-sensitive."""
+    return f"{rtype.lower()}/{rid}"
+
+
+def asset_key(member):
+    """``dataSet/abc.json`` -> ``dataset/abc``; None for non-asset members."""
+    folder, name = posixpath.split(member)
+    if not folder or "/" in folder or not name.endswith(".json"):
+        return None
+    return _key(folder, name[:-len('.json')])
+
+
+def _normalize(doc):
+    if isinstance(doc, dict):
+        return {k: _normalize(v) for k, v in doc.items() if k not in VOLATILE_KEYS}
+    if isinstance(doc, list):
+        return [_normalize(v) for v in doc]
+    return doc
+
+
+def references(text):
+    """Asset keys of every QuickSight ARN in ``text``."""
+    return {_key(rtype, rid) for rtype, rid in _ARN_RE.findall(text)}
+
+
+def read(data, errors=None):
+    """
+    Parse bundle bytes once: ``{asset_key: {"member", "text", "doc"}}``.
+
+    Members that aren't valid UTF-8 JSON raise, or with an ``errors`` list are
+    skipped and reported there as ``{"member", "detail"}``.
+    """
+    docs = {}
+    with zipfile.ZipFile(io.BytesIO(data)) as bundle:
+        for info in bundle.infolist():
+            key = asset_key(info.filename)
+            if key is None or info.is_dir():
+                continue
+            try:
+                text = bundle.read(info).decode("utf-8")
+                docs[key] = {"member": info.filename, "text": text, "doc": json.loads(text)}
+            except ValueError as e:
+                if errors is None:
+                    raise
+                errors.append({"member": info.filename, "detail": str(e)})
+    return docs
+
+
+def inspect(data, docs=None):
+    """
+    Split bundle bytes (or the already ``read`` documents) into assets.
+
+    Returns ``{asset_key: {"member", "hash", "deps"}}`` where ``deps`` are the
+    other assets of the bundle that the document references by ARN.
+    """
+    docs = read(data) if docs is None else docs
+    assets = {}
+    for key, entry in docs.items():
+        canonical = json.dumps(_normalize(entry["doc"]), sort_keys=True, separators=(",", ":"))
+        assets[key] = {
+            "member": entry["member"],
+            "hash": hashlib.sha256(canonical.encode()).hexdigest(),
+        }
+    for key, entry in docs.items():
+        assets[key]["deps"] = sorted(ref for ref in references(entry["text"]) if ref in assets and ref != key)
+    return assets
+
+
+def _pk(account_id, key):
+    return f"asset#{account_id}#{key}"
+
+
+def plan(account_id, assets):
+    """
+    Pick the assets to import: changed ones and, transitively, any dependency
+    the target has no record of. Returns ``(include, unchanged)`` key lists.
+    """
+    previous = state.get_many(_pk(account_id, key) for key in assets)
+    known = {key for key in assets if _pk(account_id, key) in previous}
+    changed = [
+        key for key in assets
+        if previous.get(_pk(account_id, key), {}).get("hash") != assets[key]["hash"]
+    ]
+    include, stack = set(), list(changed)
+    while stack:
+        key = stack.pop()
+        if key in include:
+            continue
+        include.add(key)
+        stack.extend(dep for dep in assets[key]["deps"] if dep not in known)
+    return sorted(include), sorted(set(assets) - include)
+
+
+def write_reduced(s3, bucket, key, data, assets, include):
+    """Write a bundle with every non-asset member and only the included assets."""
+    keep = {assets[k]["member"] for k in include}
+    dropped = {a["member"] for a in assets.values()} - keep
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as src, \
+            zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            if info.filename not in dropped:
+                dst.writestr(info, src.read(info))
+    reduced_key = f"{STAGING_PREFIX}reduced-{uuid.uuid4().hex[:12]}-{posixpath.basename(key)}"
+    s3.put_object(Bucket=bucket, Key=reduced_key, Body=out.getvalue())
+    return reduced_key
+
+
+def record(account_id, hashes):
+    """Remember ``{asset_key: hash}`` as imported."""
+    state.put_many({_pk(account_id, key): {"hash": h} for key, h in hashes.items()})
+
+
+def forget(account_id, keys):
+    """Drop records of assets (``<type>/<id>``) deleted from the target so they re-import if they return."""
+    for key in keys:
+        state.delete(_pk(account_id, _key(*key.split("/", 1))))
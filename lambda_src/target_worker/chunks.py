@@ -0,0 +1,53 @@
+"""
+Rebuild bundles stored as content-addressed chunks.
+
+In chunked mode the source writes every member of a bundle zip as a gzip blob
+named by its SHA-256 and a ``<bundle>.chunks.json`` manifest listing the
+members in order. Before import the worker fetches the blobs, verifies their
+hashes and writes the reassembled zip under STAGING_PREFIX, which QuickSight
+then imports like any other bundle.
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_SUFFIX = ".chunks.json"
+STAGING_PREFIX = os.environ.get("STAGING_PREFIX", "staging/")
+FETCH_CONCURRENCY = 8
+SPOOL_BYTES = 64 * 1024 * 1024
+
+
+def is_chunk_manifest(key):
+    return key.endswith(MANIFEST_SUFFIX)
+
+
+def _fetch(s3, bucket, prefix, member):
+    body = s3.get_object(Bucket=bucket, Key=f"{prefix}{member['sha256'][:2]}/{member['sha256']}")["Body"].read()
+    data = gzip.decompress(body)
+    if hashlib.sha256(data).hexdigest() != member["sha256"]:
+        raise RuntimeError(f"Blob {member['sha256']} for {member['name']} is corrupt")
+    return data
+
+
+def rebuild(s3, bucket, key):
+    """Reassemble the bundle described by manifest ``key``; returns the new object key."""
+    manifest = json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    members = manifest["members"]
+    name = posixpath.basename(key)[:-len(MANIFEST_SUFFIX)]
+    rebuilt_key = f"{STAGING_PREFIX}rebuilt-{uuid.uuid4().hex[:12]}-{name}.qs"
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as out:
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf, \
+                ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+            blobs = executor.map(lambda m: _fetch(s3, bucket, manifest["blobPrefix"], m), members)
+            for member, data in zip(members, blobs):
+                zf.writestr(member["name"], data)
+        out.seek(0)
+        s3.upload_fileobj(out, bucket, rebuilt_key)
+    print(f"[INFO] Rebuilt {len(members)} member(s) of s3://{bucket}/{key} as {rebuilt_key}")
+    return rebuilt_key
@@ -0,0 +1,63 @@
+"""
+Deletion manifests written by the source export Lambda in delta mode.
+
+A ``*.deletions.json`` object lists source ARNs that left an exported folder.
+Asset IDs are preserved by asset bundle imports, so each ARN maps to the asset
+with the same ID in the target account. Deletion only happens when
+APPLY_DELETIONS is enabled; otherwise the manifest is logged and skipped.
+"""
+import json
+import os
+
+from botocore.exceptions import ClientError
+
+APPLY_DELETIONS = os.environ.get("APPLY_DELETIONS", "false").lower() == "true"
+DELETIONS_SUFFIX = ".deletions.json"
+
+# Dependents first so nothing is deleted while still referenced.
+_DELETE_ORDER = ["dashboard", "analysis", "dataset", "datasource", "theme"]
+_DELETE_APIS = {
+    "dashboard": ("delete_dashboard", "DashboardId"),
+    "analysis": ("delete_analysis", "AnalysisId"),
+    "dataset": ("delete_data_set", "DataSetId"),
+    "datasource": ("delete_data_source", "DataSourceId"),
+    "theme": ("delete_theme", "ThemeId"),
+}
+
+
+def is_deletion_manifest(key):
+    return key.endswith(DELETIONS_SUFFIX)
+
+
+def _parse_arn(arn):
+    rtype, _, rid = arn.split(":", 5)[-1].partition("/")
+    return rtype, rid
+
+
+def apply_manifest(qs, s3, bucket, key, account_id):
+    manifest = json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    removed = manifest.get("removed", [])
+    if not APPLY_DELETIONS:
+        print(f"[INFO] APPLY_DELETIONS is off; not deleting {len(removed)} asset(s) from s3://{bucket}/{key}")
+        return {"status": "SKIPPED", "reason": "Deletions disabled", "removed": removed}
+
+    targets = sorted(
+        (_parse_arn(arn) for arn in removed),
+        key=lambda t: _DELETE_ORDER.index(t[0]) if t[0] in _DELETE_ORDER else len(_DELETE_ORDER),
+    )
+    deleted, missing, unsupported = [], [], []
+    for rtype, rid in targets:
+        api = _DELETE_APIS.get(rtype)
+        if not api:
+            unsupported.append(f"{rtype}/{rid}")
+            continue
+        op, id_param = api
+        try:
+            getattr(qs, op)(AwsAccountId=account_id, **{id_param: rid})
+            deleted.append(f"{rtype}/{rid}")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ResourceNotFoundException":
+                raise
+            missing.append(f"{rtype}/{rid}")
+    print(f"[INFO] Applied deletions from s3://{bucket}/{key}: deleted={deleted} missing={missing}")
+    return {"status": "OK", "deleted": deleted, "missing": missing, "unsupported": unsupported}
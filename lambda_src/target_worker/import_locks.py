@@ -0,0 +1,176 @@
+"""
+Conflict-aware scheduling of imports in the target account.
+
+Imports that touch the same assets collide and roll back; imports of disjoint
+asset sets can run side by side. Every import takes a ticket listing the
+assets it will write, as short hashes of their ``<type>/<id>`` keys, or ``*``
+when the bundle could not be inspected. A ticket may start when no live ticket
+overlapping it is running or arrived earlier, so overlapping imports run one at
+a time in arrival order while disjoint ones run in parallel.
+
+A ticket names one import attempt (the worker uses the bundle's S3 URI plus an
+attempt id), never just a bundle, so a duplicate delivery can't take over a
+running import's ticket: a ticket found running belongs to someone else and is
+waited for like a conflict. The account's queue record
+(``importlock#<account>``) holds only each ticket's arrival, lease and state,
+updated with optimistic concurrency on its ``version``; the asset set, the
+large part, is a separate item per ticket (``importlock#<account>#<id>``), so
+a burst of big bundles can't push the shared record past DynamoDB's item size.
+
+A ticket that cannot start within its wait is dropped, so it never holds up
+later imports; only callers whose message is redelivered on failure (the
+bundle queue) keep its place in line, for WAIT_LEASE. Running tickets hold a
+lease covering the import; a ticket left behind by a crashed invocation
+expires and stops blocking others.
+"""
+import hashlib
+import io
+import os
+import random
+import time
+import zipfile
+
+import bundle_diff
+from qs_common import state
+
+IMPORT_SCHEDULING = os.environ.get("IMPORT_SCHEDULING", "false").lower() == "true"
+WAIT_LEASE = int(os.environ.get("IMPORT_LOCK_WAIT_LEASE", "1800"))
+# How long an invocation without a known deadline (async job checks) waits.
+MAX_WAIT = float(os.environ.get("IMPORT_LOCK_MAX_WAIT", "60"))
+POLL_INTERVAL = 2.0
+WILDCARD = "*"
+
+
+class Busy(RuntimeError):
+    """Conflicting imports still hold the bundle's assets; try again later."""
+
+
+def enabled():
+    return IMPORT_SCHEDULING and state.enabled()
+
+
+def _pk(account_id):
+    return f"importlock#{account_id}"
+
+
+def _ticket_id(ticket):
+    return hashlib.sha1(ticket.encode()).hexdigest()[:16]
+
+
+def _assets_pk(account_id, ticket_id):
+    return f"importlock#{account_id}#{ticket_id}"
+
+
+def asset_set(data=None, keys=None):
+    """Short hashes of the asset keys a bundle writes; ``[*]`` when unknown."""
+    if keys is None and data is not None:
+        with zipfile.ZipFile(io.BytesIO(data)) as bundle:
+            keys = [k for k in map(bundle_diff.asset_key, bundle.namelist()) if k]
+    if not keys:
+        return [WILDCARD]
+    return sorted({hashlib.sha1(k.encode()).hexdigest()[:12] for k in keys})
+
+
+def _overlaps(a, b):
+    return WILDCARD in a or WILDCARD in b or not set(a).isdisjoint(b)
+
+
+def _blocked_by(tickets, assets, ticket_id, now):
+    """
+    Tickets that must finish before ``ticket_id`` may start. ``assets`` maps
+    ticket ids to asset sets; a ticket whose set is unknown conflicts with all.
+    """
+    mine = tickets[ticket_id]
+    order = (mine["arrivedAt"], ticket_id)
+    return [
+        other for other, t in tickets.items()
+        if other != ticket_id and t["leaseUntil"] > now
+        and _overlaps(assets[ticket_id], assets.get(other) or [WILDCARD])
+        and (t["running"] or (t["arrivedAt"], other) < order)
+    ]
+
+
+def _load_assets(account_id, ticket_ids, known):
+    """Fill ``known`` with the asset sets of ``ticket_ids`` not loaded yet; ``{id: ticket}``."""
+    missing = [t for t in ticket_ids if t not in known]
+    names = {}
+    if missing:
+        items = state.get_many([_assets_pk(account_id, t) for t in missing])
+        for ticket_id in missing:
+            item = items.get(_assets_pk(account_id, ticket_id))
+            if item:
+                known[ticket_id] = item["assets"]
+                names[ticket_id] = item["ticket"]
+    return names
+
+
+def _attempt(account_id, ticket_id, assets, run_lease):
+    """
+    Take or renew the ticket and start it if nothing conflicting is ahead.
+    Returns the blocking ticket ids (empty once started).
+    """
+    pk = _pk(account_id)
+    while True:
+        now = time.time()
+        record = state.get(pk) or {}
+        tickets = {k: t for k, t in (record.get("tickets") or {}).items() if t["leaseUntil"] > now}
+        mine = tickets.get(ticket_id) or {"arrivedAt": now, "running": False}
+        if mine["running"]:
+            return [ticket_id]  # a duplicate of this attempt holds the ticket
+        tickets[ticket_id] = dict(mine, leaseUntil=now + WAIT_LEASE)
+        _load_assets(account_id, list(tickets), assets)
+        blockers = _blocked_by(tickets, assets, ticket_id, now)
+        if not blockers:
+            tickets[ticket_id].update(running=True, startedAt=now, leaseUntil=now + run_lease)
+        if state.update(pk, {"tickets": tickets, "version": record.get("version", 0) + 1},
+                        expect={"version": record.get("version")}):
+            return blockers
+
+
+def acquire(account_id, ticket, assets, run_lease, max_wait=None, keep_place=False):
+    """
+    Wait until ``ticket`` may start and mark it running; raises Busy after
+    ``max_wait`` seconds. On Busy the ticket is dropped unless ``keep_place``
+    (the caller's message is redelivered on failure), which keeps its place in
+    line for WAIT_LEASE.
+    """
+    deadline = time.time() + (MAX_WAIT if max_wait is None else max_wait)
+    ticket_id = _ticket_id(ticket)
+    state.put(_assets_pk(account_id, ticket_id), {"ticket": ticket, "assets": assets},
+              ttl=max(run_lease, WAIT_LEASE) + 3600)
+    known = {ticket_id: assets}
+    attempt = 0
+    while True:
+        blockers = _attempt(account_id, ticket_id, known, run_lease)
+        if not blockers:
+            if attempt:
+                print(f"[INFO] Import {ticket} started after {attempt} wait(s)")
+            return
+        attempt += 1
+        delay = min(POLL_INTERVAL * attempt, 15) * random.uniform(0.8, 1.2)
+        if time.time() + delay > deadline:
+            if not keep_place and ticket_id not in blockers:
+                release(account_id, ticket)
+            names = _load_assets(account_id, blockers, {})
+            raise Busy(f"Import {ticket} is waiting for conflicting import(s): "
+                       f"{', '.join(sorted(names.get(b, b) for b in blockers))}")
+        print(f"[INFO] Import {ticket} waits for {len(blockers)} conflicting import(s)")
+        time.sleep(delay)
+
+
+def release(account_id, ticket):
+    """Drop ``ticket`` (running or waiting); a no-op when it is gone already."""
+    pk = _pk(account_id)
+    ticket_id = _ticket_id(ticket)
+    while True:
+        record = state.get(pk)
+        if not record or ticket_id not in (record.get("tickets") or {}):
+            break
+        now = time.time()
+        tickets = {
+            k: t for k, t in record["tickets"].items() if k != ticket_id and t["leaseUntil"] > now
+        }
+        if state.update(pk, {"tickets": tickets, "version": record["version"] + 1},
+                        expect={"version": record["version"]}):
+            break
+    state.delete(_assets_pk(account_id, ticket_id))
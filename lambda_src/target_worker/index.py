@@ -1,61 +1,54 @@
 import json
 import os
-import time
 import uuid
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+
+import bundle_diff
+import chunks
+import deletions
+import import_locks
+import layers
+import ledger
+import overrides
+import validate
+from qs_common import clients, jobs, metrics, profiling, ratelimit
+from qs_common.poller import poll_job, time_budget
 
 QS_REGION       = os.environ.get("QS_REGION", "us-east-1")
 TARGET_ACCOUNT  = os.environ["TARGET_ACCOUNT"]
 OVERRIDES_S3_KEY = os.environ.get("OVERRIDES_S3_KEY")
+MAX_CONCURRENT_IMPORTS = int(os.environ.get("MAX_CONCURRENT_IMPORTS", "4"))
+
+# Built on first use and kept warm for the container (see qs_common.clients).
+qs = clients.lazy("quicksight", QS_REGION, setup=lambda client: ratelimit.install(client, QS_REGION))
+s3 = clients.lazy("s3")
 
-qs = boto3.client("quicksight", region_name=QS_REGION)
-s3 = boto3.client("s3")
+IMPORT_TERMINAL = ("SUCCESSFUL", "FAILED", "FAILED_ROLLBACK_COMPLETED", "FAILED_ROLLBACK_ERROR")
 
-def poll_import(job_id, sleep=3, max_wait=900):
+def poll_import(job_id, max_wait=900):
     """Polls describe_asset_bundle_import_job until JobStatus is terminal."""
-    start = time.time()
-    while True:
-        resp = qs.describe_asset_bundle_import_job(
+    resp, stats = poll_job(
+        lambda: qs.describe_asset_bundle_import_job(
             AwsAccountId=TARGET_ACCOUNT,
             AssetBundleImportJobId=job_id
-        )
-        status = resp.get("JobStatus")  # <-- top-level field
-        if status in ("SUCCESSFUL", "FAILED", "FAILED_ROLLBACK_COMPLETED", "FAILED_ROLLBACK_ERROR"):
-            return resp
-        if time.time() - start > max_wait:
-            raise TimeoutError(f"Import job {job_id} timed out with status={status}")
-        time.sleep(sleep)
-
-def lambda_handler(event, context):
-    # ----- S3 event parsing (use Records[0] for both bucket and key) -----
-    rec = event["Records"][0]
-    bucket = rec["s3"]["bucket"]["name"]
-    key    = rec["s3"]["object"]["key"]
-    s3_uri = f"s3://{bucket}/{key}"
-
-    # ----- Optional: load overrides JSON from the same bucket -----
-    override_params = {}
-    try:
-        if OVERRIDES_S3_KEY:
-            obj = s3.get_object(Bucket=bucket, Key=OVERRIDES_S3_KEY)
-            override_params = json.loads(obj["Body"].read()).get("OverrideParameters", {})
-    except Exception as e:
-        # Proceed without overrides; log and continue
-        print(f"[WARN] Could not load overrides at s3://{bucket}/{OVERRIDES_S3_KEY}: {e}")
+        ),
+        terminal=IMPORT_TERMINAL,
+        kind="import",
+        job_id=job_id,
+        max_wait=max_wait,
+    )
+    print(f"[INFO] Import poll stats: {json.dumps(stats.as_dict())}")
+    metrics.job("import", stats.elapsed, stats.polls, stats.throttles, status=stats.status, jobId=job_id)
+    return resp, stats
 
-    # ----- Start import job (FailureAction=ROLLBACK is safer) -----
-    job_id = f"imp-{uuid.uuid4().hex[:12]}"
-    start_resp = qs.start_asset_bundle_import_job(
+def describe_import(job):
+    return qs.describe_asset_bundle_import_job(
         AwsAccountId=TARGET_ACCOUNT,
-        AssetBundleImportJobId=job_id,
-        AssetBundleImportSource={"S3Uri": s3_uri},
-        FailureAction="ROLLBACK",
-        OverrideParameters=override_params
+        AssetBundleImportJobId=job["jobId"]
     )
-    print(f"[INFO] Started import job {job_id} for {s3_uri}: {json.dumps(start_resp, default=str)}")
 
-    # ----- Poll until terminal status -----
-    final = poll_import(job_id)
+def import_result(job_id, final, s3_uri, poll):
     status = final.get("JobStatus")
     print(f"[INFO] Import job {job_id} final status: {status}")
     if status != "SUCCESSFUL":
@@ -66,5 +59,323 @@ def lambda_handler(event, context):
             "rollbackErrors": final.get("RollbackErrors"),
             "warnings": final.get("Warnings")
         }, default=str))
+    return {"status": "OK", "import_job": job_id, "s3_uri": s3_uri, "poll": poll}
+
+def on_import_done(job, final):
+    ctx = job["context"]
+    if ctx.get("importLock"):
+        import_locks.release(TARGET_ACCOUNT, ctx["importLock"])
+    try:
+        result = import_result(job["jobId"], final, ctx["s3Uri"], job["progress"])
+    except RuntimeError as e:
+        # Terminal failure: record it on the job instead of retrying the check.
+        print(f"[ERROR] Import job {job['jobId']} failed: {e}")
+        result = {"error": str(e)}
+    if "error" not in result and ctx.get("assetHashes"):
+        bundle_diff.record(TARGET_ACCOUNT, ctx["assetHashes"])
+    if "error" not in result and ctx.get("layerKeys") and ctx["layerIndex"] + 1 < len(ctx["layerKeys"]):
+        # ----- Layered import: start the next layer; its completion carries the chain on -----
+        ledger_ctx = {k: ctx[k] for k in ("bundleHash", "ledgerToken", "reimport") if k in ctx}
+        override_params, overrides_cache = load_overrides(ctx["bucket"])
+        try:
+            chained = import_layers(ctx["bucket"], ctx["layerManifest"], ctx["layerKeys"], ctx["layerIndex"] + 1,
+                                    override_params, overrides_cache, None, ledger_ctx)
+        except import_locks.Busy:
+            raise  # the job check retries this completion later
+        except Exception as e:
+            print(f"[ERROR] Next layer of {ctx['layerManifest']} failed: {e}")
+            chained, result = {"status": "FAILED"}, {"error": str(e)}
+        if chained["status"] == "STARTED":
+            return dict(result, next_layer=chained["layers"][-1])
+    if ctx.get("bundleHash"):
+        ledger.complete(TARGET_ACCOUNT, ctx["bundleHash"], ctx["ledgerToken"],
+                        "error" not in result, dict(result, import_job=job["jobId"]))
+    return result
+
+def on_import_failed(job, result):
+    """
+    The check chain gave up on an import (timed out, or the next layer stayed
+    Busy): free its assets and mark the ledger entry FAILED so the bundle can be
+    imported again without waiting for the lease to expire.
+    """
+    ctx = job["context"]
+    if ctx.get("importLock"):
+        import_locks.release(TARGET_ACCOUNT, ctx["importLock"])
+    if ctx.get("bundleHash"):
+        ledger.complete(TARGET_ACCOUNT, ctx["bundleHash"], ctx["ledgerToken"], False,
+                        dict(result, import_job=job["jobId"]))
+
+def bundle_records(event):
+    """
+    Yield ``(message_id, bucket, key)`` for every S3 record of the event.
+
+    Records come either straight from an S3 notification (``message_id`` is
+    None) or wrapped in SQS messages from the bundle queue; one message may
+    carry several S3 records, and S3 test events carry none.
+    """
+    for rec in event.get("Records", []):
+        if "s3" in rec:
+            yield None, rec["s3"]["bucket"]["name"], unquote_plus(rec["s3"]["object"]["key"])
+        elif rec.get("eventSource") == "aws:sqs":
+            for inner in json.loads(rec["body"]).get("Records", []):
+                yield rec["messageId"], inner["s3"]["bucket"]["name"], unquote_plus(inner["s3"]["object"]["key"])
+
+def load_overrides(bucket):
+    """``(override_params, cache outcome)``; ``({}, None)`` without OVERRIDES_S3_KEY."""
+    if not OVERRIDES_S3_KEY:
+        return {}, None
+    with metrics.phase("LoadOverrides") as phase:
+        params, outcome = overrides.load(s3, bucket, OVERRIDES_S3_KEY)
+        phase["CacheHits"] = int(outcome == "hit")
+        phase["CacheRevalidated"] = int(outcome == "revalidated")
+        phase["CacheMisses"] = int(outcome == "miss")
+    return params, outcome
+
+def process_bundle(bucket, key, context, queued=None):
+    """
+    Import one bundle (or apply one deletion manifest); raises on failure.
+    ``queued``: the id of the bundle-queue message the record came in, which
+    SQS redelivers on failure; None for direct S3 notifications.
+    """
+    s3_uri = f"s3://{bucket}/{key}"
+
+    # ----- Staged (reduced/rebuilt) bundles are written by this worker; never re-import them -----
+    if bundle_diff.is_staged(key):
+        return {"status": "SKIPPED", "reason": "Staged bundle", "s3_uri": s3_uri}
+
+    # ----- Layer bundles are imported in order through their layer manifest -----
+    if layers.is_layer_bundle(key):
+        return {"status": "SKIPPED", "reason": "Imported through its layer manifest", "s3_uri": s3_uri}
+
+    # ----- Deletion manifests from delta exports -----
+    if deletions.is_deletion_manifest(key):
+        result = deletions.apply_manifest(qs, s3, bucket, key, TARGET_ACCOUNT)
+        if bundle_diff.enabled() and result.get("deleted"):
+            bundle_diff.forget(TARGET_ACCOUNT, result["deleted"])
+        return result
+
+    # ----- Optional: overrides JSON from the same bucket (cached, ETag-revalidated) -----
+    override_params, overrides_cache = load_overrides(bucket)
+
+    # ----- Re-imports of an indexed version bypass the ledger's dedup and asset diffing -----
+    job_ctx = {"reimport": True} if ledger.is_reimport(key) else None
+
+    # ----- Import ledger: skip content already imported, one importer per bundle -----
+    if not ledger.enabled():
+        return import_bundle(bucket, key, override_params, overrides_cache, context, job_ctx, queued)
+    content_hash = ledger.bundle_hash(s3, bucket, key, override_params)
+    lease = jobs.ASYNC_MAX_WAIT + 300 if jobs.ASYNC_MODE else time_budget(context, 900, reserve=5) + 60
+    token, record = ledger.acquire(TARGET_ACCOUNT, content_hash, s3_uri, lease, force=bool(job_ctx))
+    if token is None:
+        record = record or {}
+        reason = "Already imported" if record.get("status") == "SUCCEEDED" else "Import already in progress"
+        print(f"[INFO] {reason} for {s3_uri} (bundle {content_hash[:12]}, first seen at {record.get('s3Uri')})")
+        return {"status": "SKIPPED", "reason": reason, "s3_uri": s3_uri, "bundle_hash": content_hash,
+                "import_job": (record.get("result") or {}).get("import_job")}
+    ledger_ctx = dict(job_ctx or {}, bundleHash=content_hash, ledgerToken=token)
+    try:
+        result = import_bundle(bucket, key, override_params, overrides_cache, context, ledger_ctx, queued)
+    except Exception as e:
+        ledger.complete(TARGET_ACCOUNT, content_hash, token, False, {"error": str(e)})
+        raise
+    if result["status"] in ("OK", "SKIPPED"):
+        ledger.complete(TARGET_ACCOUNT, content_hash, token, True, result)
+    return dict(result, bundle_hash=content_hash)
+
+def read_bundle(bucket, key):
+    """The bundle's bytes for inspection, or None when it is too large to hold in memory."""
+    with metrics.phase("ReadBundle") as phase:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        if obj["ContentLength"] > bundle_diff.INSPECT_MAX_BYTES:
+            print(f"[WARN] s3://{bucket}/{key} is too large to inspect ({obj['ContentLength']} bytes)")
+            return None
+        data = obj["Body"].read()
+        phase["BundleBytes"] = len(data)
+    return data
+
+def check_bundle(bucket, key, data, override_params):
+    """Validate the bundle before any import job starts; returns its parsed documents."""
+    s3_uri = f"s3://{bucket}/{key}"
+    with metrics.phase("Validate") as phase:
+        report, docs = validate.validate(data, override_params, validate.target_lookup(qs, TARGET_ACCOUNT))
+        phase["ResourceCount"] = len(docs or ())
+    if not report["ok"]:
+        print(f"[ERROR] Validation failed for {s3_uri}: {json.dumps(report)}")
+        raise ValueError(f"Bundle {s3_uri} failed validation: {json.dumps(report['errors'])}")
+    print(f"[INFO] Validated {s3_uri}: {json.dumps(report)}")
+    return docs
+
+def reduce_bundle(bucket, key, data, docs=None, reimport=False):
+    """
+    Diff the bundle's assets against what the target last imported. A
+    re-import keeps every asset and records all their hashes.
+
+    Returns ``(import_uri, asset_hashes, diff)``: the bundle to import (the
+    original, or a reduced copy), the hashes to record once it succeeds, and a
+    summary. ``import_uri`` is None when no asset changed.
+    """
+    s3_uri = f"s3://{bucket}/{key}"
+    if data is None:
+        return s3_uri, None, None
+    assets = bundle_diff.inspect(data, docs)
+    if not assets:
+        return s3_uri, None, None
+    if reimport:
+        include, unchanged = sorted(assets), []
+    else:
+        include, unchanged = bundle_diff.plan(TARGET_ACCOUNT, assets)
+    hashes = {k: assets[k]["hash"] for k in include}
+    diff = {"assets": len(assets), "imported": include, "unchanged": len(unchanged)}
+    print(f"[INFO] Asset diff for {s3_uri}: {json.dumps(diff)}")
+    if not include:
+        return None, hashes, diff
+    if not unchanged:
+        return s3_uri, hashes, diff
+    reduced_key = bundle_diff.write_reduced(s3, bucket, key, data, assets, include)
+    return f"s3://{bucket}/{reduced_key}", hashes, diff
+
+def import_layers(bucket, key, layer_keys, start, override_params, overrides_cache, context, job_ctx=None,
+                  queued=None):
+    """
+    Import the layer bundles of manifest ``key`` in order, from index ``start``.
+
+    Sync mode waits for each layer before the next. Async mode stops at the
+    first layer whose job was started; that job's completion resumes here.
+    """
+    results = []
+    for i in range(start, len(layer_keys)):
+        chain = dict(job_ctx or {}, layerManifest=key, layerKeys=layer_keys, layerIndex=i, bucket=bucket)
+        result = import_bundle(bucket, layer_keys[i], override_params, overrides_cache, context, chain, queued)
+        results.append(dict(result, layer=i))
+        if result["status"] == "STARTED":
+            break
+    return {
+        "status": "STARTED" if results and results[-1]["status"] == "STARTED" else "OK",
+        "s3_uri": f"s3://{bucket}/{key}",
+        "layers": results,
+    }
+
+def import_bundle(bucket, key, override_params, overrides_cache, context, job_ctx=None, queued=None):
+    """Import the bundle, or only its changed assets when diffing is enabled."""
+    s3_uri = f"s3://{bucket}/{key}"
+    if layers.is_layer_manifest(key):
+        return import_layers(bucket, key, layers.layer_keys(s3, bucket, key), 0,
+                             override_params, overrides_cache, context, job_ctx, queued)
+    if chunks.is_chunk_manifest(key):
+        # Content-addressed bundle: reassemble the zip from its blobs first.
+        key = chunks.rebuild(s3, bucket, key)
+
+    # ----- Read the bundle once for validation, diffing and conflict scheduling -----
+    data = docs = None
+    if validate.enabled() or bundle_diff.enabled() or import_locks.enabled():
+        data = read_bundle(bucket, key)
+    if data is not None and validate.enabled():
+        docs = check_bundle(bucket, key, data, override_params)
+
+    if not bundle_diff.enabled():
+        lock = import_lock(s3_uri, data, list(docs) if docs else None, queued)
+        result = start_import(f"s3://{bucket}/{key}", override_params, overrides_cache, context, job_ctx, lock)
+        return dict(result, s3_uri=s3_uri, import_uri=f"s3://{bucket}/{key}")
+
+    import_uri, asset_hashes, diff = reduce_bundle(bucket, key, data, docs, (job_ctx or {}).get("reimport", False))
+    if import_uri is None:
+        return {"status": "SKIPPED", "reason": "No asset changes", "s3_uri": s3_uri, "diff": diff}
+    if asset_hashes:
+        job_ctx = dict(job_ctx or {}, assetHashes=asset_hashes)
+    lock = import_lock(s3_uri, data, diff["imported"] if diff else None, queued)
+    result = start_import(import_uri, override_params, overrides_cache, context, job_ctx, lock)
+    if result["status"] == "OK" and asset_hashes:
+        bundle_diff.record(TARGET_ACCOUNT, asset_hashes)
+    return dict(result, s3_uri=s3_uri, import_uri=import_uri, diff=diff)
+
+def import_lock(s3_uri, data, asset_keys, queued=None):
+    """
+    ``(ticket, assets, keep_place)`` for the conflict scheduler, or None when
+    it is off. The ticket names this import attempt, not just the bundle: a
+    queued record reuses its message id, so its redelivery resumes the ticket
+    and keeps its place; anything else gets a fresh id. Two deliveries of one
+    key thus never share a ticket and are serialized like any overlap.
+    """
+    if not import_locks.enabled():
+        return None
+    ticket = f"{s3_uri}#{queued or uuid.uuid4().hex[:12]}"
+    return ticket, import_locks.asset_set(data, asset_keys), queued is not None
+
+def start_import(s3_uri, override_params, overrides_cache, context, job_ctx=None, lock=None):
+    """
+    Start the import job, then poll it (sync) or hand it to the check queue
+    (async). With ``lock`` the job waits until no conflicting import runs.
+    """
+    if lock:
+        ticket, assets, keep_place = lock
+        run_lease = jobs.ASYNC_MAX_WAIT + 300 if jobs.ASYNC_MODE else time_budget(context, 900, reserve=5) + 60
+        max_wait = time_budget(context, 900, reserve=5) / 2 if context else None
+        import_locks.acquire(TARGET_ACCOUNT, ticket, assets, run_lease, max_wait, keep_place)
+        job_ctx = dict(job_ctx or {}, importLock=ticket)
+
+    try:
+        # ----- Start import job (FailureAction=ROLLBACK is safer) -----
+        job_id = f"imp-{uuid.uuid4().hex[:12]}"
+        start_resp = qs.start_asset_bundle_import_job(
+            AwsAccountId=TARGET_ACCOUNT,
+            AssetBundleImportJobId=job_id,
+            AssetBundleImportSource={"S3Uri": s3_uri},
+            FailureAction="ROLLBACK",
+            OverrideParameters=override_params
+        )
+        print(f"[INFO] Started import job {job_id} for {s3_uri}: {json.dumps(start_resp, default=str)}")
+
+        if jobs.ASYNC_MODE:
+            # Return immediately; a delayed check message records the outcome (and releases the lock).
+            jobs.submit("import", job_id, TARGET_ACCOUNT, dict(job_ctx or {}, s3Uri=s3_uri))
+            return {"status": "STARTED", "import_job": job_id, "s3_uri": s3_uri,
+                    "overrides_cache": overrides_cache}
+
+        # ----- Poll until terminal status -----
+        final, poll_stats = poll_import(job_id, max_wait=time_budget(context, 900, reserve=5))
+    except Exception:
+        if lock:
+            import_locks.release(TARGET_ACCOUNT, lock[0])
+        raise
+    if lock:
+        import_locks.release(TARGET_ACCOUNT, lock[0])
+    return dict(import_result(job_id, final, s3_uri, poll_stats.as_dict()),
+                overrides_cache=overrides_cache)
+
+@profiling.profiled("target_worker")
+def lambda_handler(event, context):
+    # ----- Async mode: delayed job-check messages from the SQS queue -----
+    if jobs.is_check_event(event):
+        return jobs.handle_checks(event, describe_import, IMPORT_TERMINAL, on_import_done,
+                                  on_import_failed)
+
+    # ----- Every S3 record of the batch, several imports at a time -----
+    records = list(bundle_records(event))
+
+    def guarded(record):
+        message_id, bucket, key = record
+        try:
+            with metrics.phase("ImportBundle"):
+                result = process_bundle(bucket, key, context, queued=message_id)
+        except Exception as e:
+            print(f"[ERROR] Bundle s3://{bucket}/{key} failed: {e}")
+            result = {"status": "FAILED", "s3_uri": f"s3://{bucket}/{key}", "error": str(e)}
+        return dict(result, messageId=message_id) if message_id else result
+
+    results = []
+    if records:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_IMPORTS, len(records))) as executor:
+            results = list(executor.map(guarded, records))
 
-    return {"status": "OK", "import_job": job_id, "s3_uri": s3_uri}
+    failed = [r for r in results if r.get("status") == "FAILED"]
+    if failed and any(message_id is None for message_id, _, _ in records):
+        # Direct S3 notifications have no partial-batch contract: fail the invocation.
+        raise RuntimeError(json.dumps(failed, default=str))
+    return {
+        "status": "FAILED" if failed and len(failed) == len(results) else "PARTIAL" if failed else "OK",
+        "results": results,
+        # SQS redelivers only these messages (ReportBatchItemFailures)
+        "batchItemFailures": [
+            {"itemIdentifier": m} for m in sorted({r["messageId"] for r in failed})
+        ],
+    }
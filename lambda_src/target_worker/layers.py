@@ -0,0 +1,30 @@
+"""
+Layered imports written by the source export Lambda.
+
+With layered exports the source writes one bundle per dependency layer
+(``<runId>/<n>.layer.qs``: data sources and themes, then datasets, then
+analyses and dashboards) and, once all of them have landed, a
+``<runId>.layers.json`` manifest listing them in import order. Layer bundles
+are only imported through their manifest, one layer after the other, so every
+layer finds its dependencies already in the target account.
+"""
+import json
+
+LAYER_SUFFIX = ".layer.qs"
+# Layer bundles stored as content-addressed chunks
+CHUNKED_LAYER_SUFFIX = ".layer.chunks.json"
+MANIFEST_SUFFIX = ".layers.json"
+
+
+def is_layer_bundle(key):
+    return key.endswith((LAYER_SUFFIX, CHUNKED_LAYER_SUFFIX))
+
+
+def is_layer_manifest(key):
+    return key.endswith(MANIFEST_SUFFIX)
+
+
+def layer_keys(s3, bucket, key):
+    """Keys of the manifest's layer bundles, in import order."""
+    manifest = json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    return [layer["key"] for layer in sorted(manifest["layers"], key=lambda layer: layer["layer"])]
@@ -0,0 +1,92 @@
+"""
+Import ledger: one record per bundle content imported into the target account.
+
+A bundle is identified by the SHA-256 of its bytes together with the
+OverrideParameters it is imported with, so S3 redeliveries, overwrites of a
+versioned key and re-exports of identical content map to the same record
+(``import#<account>#<hash>``). A record that ended ``SUCCEEDED`` makes later
+copies short-circuit. While an import runs the record is ``IN_PROGRESS`` under a
+random token with a lease; a concurrent duplicate sees the live lease and
+backs off, and a lease left behind by a crashed invocation simply expires.
+
+Copies named ``reimport-*`` (written by ``scripts/bundle_index.py`` to roll an
+asset back or forward to an indexed version) are imported even when their
+content already was.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from qs_common import state
+
+IMPORT_LEDGER = os.environ.get("IMPORT_LEDGER", "false").lower() == "true"
+LEDGER_TTL = int(float(os.environ.get("IMPORT_LEDGER_TTL_DAYS", "30")) * 86400)
+HASH_CHUNK = 8 * 1024 * 1024
+REIMPORT_PREFIX = "reimport-"
+
+
+def enabled():
+    return IMPORT_LEDGER and state.enabled()
+
+
+def is_reimport(key):
+    return key.rsplit("/", 1)[-1].startswith(REIMPORT_PREFIX)
+
+
+def bundle_hash(s3, bucket, key, override_params):
+    """SHA-256 over the object's bytes (streamed) and the canonical overrides."""
+    digest = hashlib.sha256()
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    for chunk in iter(lambda: body.read(HASH_CHUNK), b""):
+        digest.update(chunk)
+    digest.update(b"\0overrides:")
+    digest.update(json.dumps(override_params or {}, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _pk(account_id, content_hash):
+    return f"import#{account_id}#{content_hash}"
+
+
+def acquire(account_id, content_hash, s3_uri, lease_seconds, force=False):
+    """
+    Try to take the import of ``content_hash``.
+
+    Returns ``(token, None)`` when this caller should run the import, or
+    ``(None, record)`` when it must not: the record either shows a successful
+    import or another invocation's live lease. ``force`` takes over a
+    successful record too (a live lease is still respected).
+    """
+    pk = _pk(account_id, content_hash)
+    for _ in range(2):
+        now = time.time()
+        record = state.get(pk)
+        if record and record.get("status") == "SUCCEEDED" and not force:
+            return None, record
+        if record and record.get("status") == "IN_PROGRESS" and record.get("leaseUntil", 0) > now:
+            return None, record
+        token = uuid.uuid4().hex
+        claimed = state.update(pk, {
+            "status": "IN_PROGRESS",
+            "token": token,
+            "leaseUntil": now + lease_seconds,
+            "s3Uri": s3_uri,
+            "startedAt": now,
+            "expiresAt": int(now + LEDGER_TTL),
+        }, expect={"token": record.get("token") if record else None})
+        if claimed:
+            return token, None
+    # Lost the race twice; report whoever holds it now.
+    return None, state.get(pk)
+
+
+def complete(account_id, content_hash, token, succeeded, result):
+    """Record the outcome; a no-op if the lease was lost to another invocation."""
+    return state.update(_pk(account_id, content_hash), {
+        "status": "SUCCEEDED" if succeeded else "FAILED",
+        "finishedAt": time.time(),
+        "leaseUntil": 0,
+        "result": result or {},
+    }, expect={"token": token})
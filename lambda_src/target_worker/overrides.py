@@ -0,0 +1,72 @@
+"""
+OverrideParameters for imports, cached across warm invocations.
+
+The parsed ``OverrideParameters`` of each overrides object are kept at module
+scope with the object's ETag. Within ``OVERRIDES_CACHE_TTL`` seconds the cached
+copy is used as is; after that it is revalidated with a conditional GET
+(If-None-Match), so an unchanged file costs a 304 and no parse. A missing
+object means "no overrides"; any other failure (access denied, invalid JSON)
+raises instead of importing without the overrides. The worker imports several
+records at once; lookups are serialized, so concurrent imports share one fetch.
+"""
+import json
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+OVERRIDES_CACHE_TTL = float(os.environ.get("OVERRIDES_CACHE_TTL", "60"))
+
+# (bucket, key) -> {"etag", "params", "checkedAt"}
+_cache = {}
+# Counters for the life of the container; logged with every lookup.
+stats = {"hit": 0, "revalidated": 0, "miss": 0}
+_lock = threading.Lock()
+
+
+def _not_modified(e):
+    err = e.response.get("Error", {})
+    return err.get("Code") in ("304", "NotModified") or \
+        e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304
+
+
+def load(s3, bucket, key, ttl=None):
+    """
+    Return ``(override_params, outcome)`` for ``s3://bucket/key``; ``outcome`` is
+    ``hit`` (fresh cache), ``revalidated`` (304 from S3) or ``miss`` (fetched).
+    """
+    with _lock:
+        return _load(s3, bucket, key, OVERRIDES_CACHE_TTL if ttl is None else ttl)
+
+
+def _load(s3, bucket, key, ttl):
+    now = time.time()
+    cached = _cache.get((bucket, key))
+    if cached and now - cached["checkedAt"] < ttl:
+        outcome = "hit"
+    else:
+        outcome = "miss"
+        kwargs = {"Bucket": bucket, "Key": key}
+        if cached and cached["etag"]:
+            kwargs["IfNoneMatch"] = cached["etag"]
+        try:
+            obj = s3.get_object(**kwargs)
+            params = json.loads(obj["Body"].read()).get("OverrideParameters", {})
+            cached = {"etag": obj.get("ETag"), "params": params}
+        except ClientError as e:
+            if cached and _not_modified(e):
+                outcome = "revalidated"
+            elif e.response.get("Error", {}).get("Code") == "NoSuchKey":
+                print(f"[INFO] No overrides object at s3://{bucket}/{key}; importing without overrides")
+                cached = {"etag": None, "params": {}}
+            else:
+                raise
+        except ValueError as e:
+            raise ValueError(f"Invalid overrides JSON at s3://{bucket}/{key}: {e}") from e
+        cached["checkedAt"] = now
+        _cache[(bucket, key)] = cached
+
+    stats[outcome] += 1
+    print(f"[INFO] Overrides cache {outcome} for s3://{bucket}/{key}: {json.dumps(stats)}")
+    return cached["params"], outcome
@@ -0,0 +1,154 @@
+"""
+Pre-import validation of QUICKSIGHT_JSON asset bundles.
+
+A bad bundle otherwise only shows up once the import job has rolled back,
+minutes later. The bundle is parsed once into an index of its assets and the
+assets they reference by ARN, and checked for:
+
+- a zip that can't be read, or members that aren't JSON;
+- data sources whose connection needs credentials (anything but the IAM-based
+  types) without a matching ``OverrideParameters.DataSources`` entry carrying
+  ``Credentials``, when REQUIRE_DATASOURCE_OVERRIDES is set;
+- references to datasets, data sources, themes or analyses that are neither
+  in the bundle nor in the target account (looked up by ID, after
+  ``ResourceIdOverrideConfiguration.PrefixForAllResources``).
+
+The result is a report ``{"ok", "errors", "warnings", "assets", "elapsedMs"}``
+whose issues are ``{"code", "asset", "detail"}``.
+"""
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import bundle_diff
+
+BUNDLE_VALIDATION = os.environ.get("BUNDLE_VALIDATION", "false").lower() == "true"
+REQUIRE_DATASOURCE_OVERRIDES = os.environ.get("REQUIRE_DATASOURCE_OVERRIDES", "true").lower() == "true"
+
+# Connections QuickSight authorizes through its IAM role; no credentials to supply.
+CREDENTIAL_FREE_TYPES = {
+    "ATHENA", "S3", "AWS_IOT_ANALYTICS", "TIMESTREAM", "AMAZON_ELASTICSEARCH", "AMAZON_OPENSEARCH",
+}
+# Referenced types an import can't do without, and how to find them in the target.
+_DESCRIBE_APIS = {
+    "dataset": ("describe_data_set", "DataSetId"),
+    "datasource": ("describe_data_source", "DataSourceId"),
+    "theme": ("describe_theme", "ThemeId"),
+    "analysis": ("describe_analysis", "AnalysisId"),
+}
+
+
+def enabled():
+    return BUNDLE_VALIDATION
+
+
+def _get(doc, name):
+    """Field lookup that ignores case (bundle JSON is camelCase, the API PascalCase)."""
+    name = name.lower()
+    return next((v for k, v in (doc or {}).items() if k.lower() == name), None)
+
+
+def _issue(code, asset, detail):
+    return {"code": code, "asset": asset, "detail": detail}
+
+
+def target_lookup(qs, account_id):
+    """
+    ``exists(asset_key)`` for the target account: True, False, or None when
+    the lookup itself failed (reported as a warning, not an error).
+    """
+    def exists(key):
+        rtype, _, rid = key.partition("/")
+        op, id_field = _DESCRIBE_APIS[rtype]
+        try:
+            getattr(qs, op)(AwsAccountId=account_id, **{id_field: rid})
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ResourceNotFoundException":
+                return False
+            return None
+    return exists
+
+
+def _check_overrides(docs, override_params, errors):
+    overrides = {
+        _get(entry, "DataSourceId"): entry
+        for entry in (override_params or {}).get("DataSources", []) or []
+    }
+    for key, entry in docs.items():
+        if not key.startswith("datasource/"):
+            continue
+        doc = entry["doc"]
+        source_type = (_get(doc, "Type") or "").upper()
+        params = _get(doc, "DataSourceParameters") or {}
+        iam_auth = _get(_get(params, "RedshiftParameters"), "IAMParameters") is not None
+        if source_type in CREDENTIAL_FREE_TYPES or iam_auth:
+            continue
+        source_id = key.partition("/")[2]
+        override = overrides.get(source_id)
+        label = source_type or "untyped"
+        if override is None:
+            errors.append(_issue("DATASOURCE_OVERRIDE_MISSING", key,
+                                 f"{label} data source has no OverrideParameters.DataSources entry"))
+        elif not _get(override, "Credentials"):
+            errors.append(_issue("DATASOURCE_CREDENTIALS_MISSING", key,
+                                 f"Override for {label} data source has no Credentials"))
+
+
+def _check_references(docs, override_params, exists, errors, warnings):
+    id_config = (override_params or {}).get("ResourceIdOverrideConfiguration") or {}
+    prefix = id_config.get("PrefixForAllResources") or ""
+    missing = {}
+    for key, entry in docs.items():
+        for ref in bundle_diff.references(entry["text"]):
+            if ref != key and ref not in docs and ref.partition("/")[0] in _DESCRIBE_APIS:
+                missing.setdefault(ref, []).append(key)
+    if not missing:
+        return
+    refs = sorted(missing)
+    if exists:
+        targets = [f"{ref.partition('/')[0]}/{prefix}{ref.partition('/')[2]}" for ref in refs]
+        with ThreadPoolExecutor(max_workers=min(8, len(refs))) as executor:
+            found = list(executor.map(exists, targets))
+    else:
+        found = [None] * len(refs)
+    for ref, present in zip(refs, found):
+        users = ", ".join(sorted(missing[ref]))
+        if present is False:
+            errors.append(_issue("MISSING_DEPENDENCY", ref,
+                                 f"Not in the bundle or the target account; used by {users}"))
+        elif present is None:
+            warnings.append(_issue("UNVERIFIED_DEPENDENCY", ref,
+                                   f"Not in the bundle and could not be looked up; used by {users}"))
+
+
+def validate(data, override_params, exists=None):
+    """
+    Validate bundle bytes; returns ``(report, docs)`` so the parsed documents
+    can be reused (e.g. by asset diffing). ``exists`` is ``target_lookup``'s
+    callable; without it unresolved references are only warnings.
+    """
+    started = time.perf_counter()
+    errors, warnings, malformed = [], [], []
+    try:
+        docs = bundle_diff.read(data, errors=malformed)
+    except zipfile.BadZipFile as e:
+        docs = {}
+        errors.append(_issue("BAD_ZIP", None, str(e)))
+    errors.extend(_issue("MALFORMED_JSON", m["member"], m["detail"]) for m in malformed)
+    if not docs and not errors:
+        errors.append(_issue("EMPTY_BUNDLE", None, "No asset documents in the bundle"))
+    if REQUIRE_DATASOURCE_OVERRIDES:
+        _check_overrides(docs, override_params, errors)
+    _check_references(docs, override_params, exists, errors, warnings)
+    report = {
+        "ok": not errors,
+        "errors": errors,
+        "warnings": warnings,
+        "assets": len(docs),
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return report, docs
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+"""
+Backfill a target account from every folder (or asset) of the source account.
+
+    python scripts/backfill.py --function <export lambda> [--mode folders|assets]
+
+Runs the export Lambda's own code locally, synchronously, with the deployed
+function's environment (``--function``; or set TARGET_BUCKET etc. yourself):
+folders are listed with ``list_folder_member_arns`` and exported, downloaded
+and uploaded through the bounded scheduler exactly as a multi-folder event
+would be. The credentials used must be able to write to the target bucket(s),
+whose policy admits the configured source principal (e.g. the function's role).
+
+Imports need a trigger on the target bucket: ``target.lambda.bundleQueue`` or
+a notification managed outside the stack. Without one, pass
+``--target-function`` (and ``--target-profile`` for the target account) and
+every written bundle is handed to that worker directly, as the S3
+notification would (primary target only). With just ``--target-profile`` the
+bucket is checked for a trigger before anything is exported.
+
+Progress is checkpointed to ``--state-file`` after every folder or asset
+batch; running the same command again resumes, skipping units that finished
+and retrying the ones that failed or were interrupted.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import quote_plus
+
+import boto3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "lambda_src", "handler"), os.path.join(ROOT, "lambda_src", "common", "python")]
+
+DONE = ("OK", "SKIPPED")
+# Asset types exported in assets mode; dependencies travel with them.
+LISTINGS = {
+    "dashboard": ("list_dashboards", "DashboardSummaryList"),
+    "analysis": ("list_analyses", "AnalysisSummaryList"),
+    "dataset": ("list_data_sets", "DataSetSummaries"),
+}
+
+
+class Checkpoint:
+    """Units of work and their outcomes, rewritten atomically after each one."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {"meta": meta, "units": [], "results": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+            if self.data["meta"] != meta:
+                sys.exit(f"{path} belongs to another backfill ({self.data['meta']}); use another --state-file")
+
+    @property
+    def units(self):
+        return self.data["units"]
+
+    def add(self, units):
+        """Append newly planned units; planned ones keep their ids and results."""
+        self.data["units"].extend(units)
+        self.save()
+
+    def pending(self, retry_failed=True):
+        results = self.data["results"]
+        return [
+            u for u in self.units
+            if results.get(u["id"], {}).get("status") not in DONE
+            and (retry_failed or u["id"] not in results)
+        ]
+
+    def mark(self, unit_id, result):
+        with self.lock:
+            self.data["results"][unit_id] = dict(result, finishedAt=time.time())
+            self.save()
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f, indent=1, default=str)
+        os.replace(tmp, self.path)
+
+
+def load_function_env(name, region):
+    """Environment of the deployed export Lambda, so the backfill uses its settings."""
+    cfg = boto3.client("lambda", region_name=region).get_function_configuration(FunctionName=name)
+    return cfg.get("Environment", {}).get("Variables", {})
+
+
+def has_bundle_trigger(s3, bucket):
+    """Whether new objects in ``bucket`` notify anything (queue, function, topic or EventBridge)."""
+    cfg = s3.get_bucket_notification_configuration(Bucket=bucket)
+    return "EventBridgeConfiguration" in cfg or any(
+        cfg.get(k) for k in ("QueueConfigurations", "LambdaFunctionConfigurations", "TopicConfigurations")
+    )
+
+
+def invoke_import(lam, function, s3_uri):
+    """Hand the object at ``s3_uri`` to the target worker the way an S3 notification would."""
+    bucket, key = s3_uri[len("s3://"):].split("/", 1)
+    event = {"Records": [{
+        "eventSource": "aws:s3",
+        "s3": {"bucket": {"name": bucket}, "object": {"key": quote_plus(key, safe="/")}},
+    }]}
+    lam.invoke(FunctionName=function, InvocationType="Event", Payload=json.dumps(event).encode())
+
+
+def folder_units(qs, account_id, planned=()):
+    units = []
+    for page in qs.get_paginator("list_folders").paginate(AwsAccountId=account_id):
+        for folder in page.get("FolderSummaryList", []):
+            units.append({"id": f"folder/{folder['FolderId']}", "folderId": folder["FolderId"]})
+    return sorted((u for u in units if u["id"] not in planned), key=lambda u: u["id"])
+
+
+def asset_units(qs, account_id, types, batch_size, planned=(), first=0):
+    """Batches of the assets not ``planned`` yet, numbered from ``first``."""
+    arns = []
+    for rtype in types:
+        op, field = LISTINGS[rtype]
+        for page in qs.get_paginator(op).paginate(AwsAccountId=account_id):
+            arns.extend(
+                s["Arn"] for s in page.get(field, [])
+                if s.get("Arn") and s.get("Status") != "DELETED"
+            )
+    arns = sorted(set(arns) - set(planned))
+    return [
+        {"id": f"assets/{first + i // batch_size:05d}", "arns": arns[i:i + batch_size]}
+        for i in range(0, len(arns), batch_size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--function", help="deployed export Lambda whose environment to use")
+    parser.add_argument("--profile", help="AWS profile of the source account")
+    parser.add_argument("--region", help="region of the export Lambda (QuickSight region comes from its QS_REGION)")
+    parser.add_argument("--account", help="source account id (default: the caller's)")
+    parser.add_argument("--mode", choices=("folders", "assets"), default="folders")
+    parser.add_argument("--types", default="dashboard,analysis", help=f"assets mode: any of {','.join(LISTINGS)}")
+    parser.add_argument("--batch-size", type=int, default=25, help="assets mode: assets per export job")
+    parser.add_argument("--max-jobs", type=int, help="export jobs at once (default: MAX_CONCURRENT_EXPORTS)")
+    parser.add_argument("--max-parallel", type=int, help="units in flight (default: MAX_PARALLEL_FOLDERS)")
+    parser.add_argument("--state-file", help="checkpoint file (default: backfill-<account>-<mode>.json)")
+    parser.add_argument("--replan", action="store_true", help="enumerate again and add what is new")
+    parser.add_argument("--skip-failed", action="store_true", help="do not retry units that failed before")
+    parser.add_argument("--no-force", action="store_true", help="honour the fingerprint cache and delta snapshots")
+    parser.add_argument("--dry-run", action="store_true", help="plan and show pending units only")
+    parser.add_argument("--target-function", help="target worker to invoke for every written bundle "
+                                                  "(when the target bucket has no trigger)")
+    parser.add_argument("--target-profile", help="AWS profile of the target account (worker / bucket check)")
+    parser.add_argument("--target-region", help="region of the target worker and bucket (default: --region)")
+    args = parser.parse_args()
+
+    boto3.setup_default_session(profile_name=args.profile, region_name=args.region)
+    if args.function:
+        os.environ.update(load_function_env(args.function, args.region))
+    if "TARGET_BUCKET" not in os.environ:
+        parser.error("--function (or TARGET_BUCKET and the rest of the export environment) is required")
+    # Poll jobs here instead of handing them to the job-check queue.
+    os.environ["ASYNC_MODE"] = "false"
+
+    target = boto3.Session(profile_name=args.target_profile, region_name=args.target_region or args.region)
+    worker = target.client("lambda") if args.target_function else None
+    if worker is None:
+        if args.target_profile:
+            if not has_bundle_trigger(target.client("s3"), os.environ["TARGET_BUCKET"]):
+                parser.error(f"s3://{os.environ['TARGET_BUCKET']} has no bucket notification, so nothing "
+                             "would import the bundles; enable target.lambda.bundleQueue or pass --target-function")
+        else:
+            print("[WARN] Imports rely on the target bucket's notifications (target.lambda.bundleQueue); "
+                  "pass --target-function to invoke the worker directly")
+
+    import index  # noqa: E402  (reads the environment at import)
+    import scheduler  # noqa: E402
+
+    account = args.account or boto3.client("sts").get_caller_identity()["Account"]
+    checkpoint = Checkpoint(
+        args.state_file or f"backfill-{account}-{args.mode}.json",
+        {"account": account, "mode": args.mode},
+    )
+    if not checkpoint.units or args.replan:
+        if args.mode == "folders":
+            units = folder_units(index.qs, account, {u["id"] for u in checkpoint.units})
+        else:
+            planned = {arn for u in checkpoint.units for arn in u["arns"]}
+            units = asset_units(index.qs, account, args.types.split(","), args.batch_size,
+                                planned, len(checkpoint.units))
+        checkpoint.add(units)
+    pending = checkpoint.pending(retry_failed=not args.skip_failed)
+    print(f"[INFO] {len(checkpoint.units)} unit(s) planned, {len(pending)} to run ({checkpoint.path})")
+    if args.dry_run or not pending:
+        return
+
+    force = not args.no_force
+    by_id = {u["id"]: u for u in pending}
+
+    def pipeline(unit_id, job_slots):
+        unit = by_id[unit_id]
+        if "folderId" in unit:
+            result = index.export_folder(account, unit["folderId"], None, force=force, job_slots=job_slots)
+        else:
+            plan, result = index.plan_export(account, None, unit["arns"], force=force)
+            if plan is not None:
+                result = index.execute_plan(plan, None, job_slots)
+        return result
+
+    def checkpointed(unit_id, job_slots):
+        try:
+            result = pipeline(unit_id, job_slots)
+        except Exception as e:
+            result = {"status": "FAILED", "error": str(e)}
+        summary = {
+            k: result[k] for k in ("status", "reason", "error", "s3_uri", "resource_count")
+            if result.get(k) is not None
+        }
+        if worker and summary.get("status") == "OK" and summary.get("s3_uri"):
+            try:
+                invoke_import(worker, args.target_function, summary["s3_uri"])
+                summary["import"] = "invoked"
+            except Exception as e:
+                summary.update(status="FAILED", error=f"exported, but invoking the import failed: {e}")
+        checkpoint.mark(unit_id, summary)
+        print(f"[INFO] {unit_id}: {json.dumps(summary, default=str)}")
+        # A failed import invocation fails the unit for the run's exit code too.
+        return dict(result, **summary)
+
+    started = time.time()
+    results = scheduler.run_all(
+        list(by_id), checkpointed,
+        max_jobs=args.max_jobs, max_workers=args.max_parallel,
+    )
+    failed = sorted(u for u, r in results.items() if r.get("status") not in DONE)
+    print(f"[INFO] Backfill pass done in {time.time() - started:.0f}s: "
+          f"{len(results) - len(failed)} ok, {len(failed)} failed")
+    if failed:
+        print(f"[WARN] Failed: {', '.join(failed)}; run again to retry them")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
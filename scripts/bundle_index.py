@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Look up and re-import indexed bundles.
+
+    python scripts/bundle_index.py --table <state table> latest <asset arn>
+    python scripts/bundle_index.py --table <state table> history <asset arn>
+    python scripts/bundle_index.py --table <state table> reimport <asset arn> [--back 1 | --key K]
+    python scripts/bundle_index.py --table <state table> rebuild --log-bucket <exporter bucket>
+
+``reimport`` copies the chosen version of the bundle (by S3 version id when
+the bucket is versioned) next to it as ``reimport-<id>-<name>``; the target
+worker imports such copies in full even if the ledger already saw the content.
+Use ``--target-profile`` when the target bucket lives in another account.
+``rebuild`` replays the append-only log into the state table.
+"""
+import argparse
+import json
+import os
+import posixpath
+import sys
+import uuid
+
+import boto3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "lambda_src", "handler"), os.path.join(ROOT, "lambda_src", "common", "python")]
+
+import bundle_index  # noqa: E402
+from qs_common import state  # noqa: E402
+
+REIMPORT_PREFIX = "reimport-"  # keep in sync with lambda_src/target_worker/ledger.py
+
+
+def account_of(arn):
+    return arn.split(":")[4]
+
+
+def lookup(arn):
+    item = state.get(bundle_index.pk(account_of(arn), arn))
+    if not item:
+        sys.exit(f"No bundle indexed for {arn}")
+    return item
+
+
+def pick(item, back=None, key=None):
+    history = item.get("history") or [item["latest"]]
+    if key:
+        match = [e for e in history if e["key"] == key]
+        if not match:
+            sys.exit(f"{key} is not in the indexed history")
+        return match[0]
+    if back >= len(history):
+        sys.exit(f"Only {len(history)} version(s) indexed")
+    return history[back]
+
+
+def reimport(s3, entry, buckets=None):
+    folder, name = posixpath.split(entry["key"])
+    copy_key = posixpath.join(folder, f"{REIMPORT_PREFIX}{uuid.uuid4().hex[:12]}-{name}")
+    uris = []
+    for bucket, version_id in entry["versions"].items():
+        if buckets and bucket not in buckets:
+            continue
+        source = {"Bucket": bucket, "Key": entry["key"]}
+        if version_id and version_id != "null":
+            source["VersionId"] = version_id
+        s3.copy(source, bucket, copy_key)
+        uris.append(f"s3://{bucket}/{copy_key}")
+    return uris
+
+
+def rebuild(s3, log_bucket, prefix):
+    """Replay every log record, oldest first; returns the number replayed."""
+    count = 0
+    pages = s3.get_paginator("list_objects_v2").paginate(Bucket=log_bucket, Prefix=f"{prefix}log/")
+    for page in pages:
+        for obj in page.get("Contents", []):
+            record = json.loads(s3.get_object(Bucket=log_bucket, Key=obj["Key"])["Body"].read())
+            account, arns = record.pop("sourceAccount"), record.pop("arns")
+            bundle_index.materialize(account, arns, record)
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default=os.environ.get("STATE_TABLE"), help="state table of the exporter")
+    parser.add_argument("--profile", help="AWS profile for the state table (source account)")
+    parser.add_argument("--target-profile", help="AWS profile for the target bucket(s)")
+    parser.add_argument("--region", help="region of the state table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("latest", "history"):
+        sub.add_parser(name).add_argument("arn")
+    p = sub.add_parser("reimport")
+    p.add_argument("arn")
+    p.add_argument("--back", type=int, default=1, help="versions back from the latest (0 = latest)")
+    p.add_argument("--key", help="re-import this indexed bundle key instead")
+    p.add_argument("--bucket", action="append", help="only this target bucket (repeatable)")
+    p = sub.add_parser("rebuild")
+    p.add_argument("--log-bucket", required=True, help="the exporter's bucket holding the log")
+    p.add_argument("--prefix", default=bundle_index.BUNDLE_INDEX_PREFIX)
+    args = parser.parse_args()
+
+    if not args.table:
+        parser.error("--table (or STATE_TABLE) is required")
+    boto3.setup_default_session(profile_name=args.profile, region_name=args.region)
+    state.STATE_TABLE = args.table
+
+    if args.command == "latest":
+        print(json.dumps(lookup(args.arn)["latest"], indent=2))
+    elif args.command == "history":
+        print(json.dumps(lookup(args.arn).get("history", []), indent=2))
+    elif args.command == "reimport":
+        entry = pick(lookup(args.arn), args.back, args.key)
+        target = boto3.Session(profile_name=args.target_profile, region_name=args.region)
+        for uri in reimport(target.client("s3"), entry, args.bucket):
+            print(f"[INFO] Re-import of {entry['key']} triggered as {uri}")
+    elif args.command == "rebuild":
+        count = rebuild(boto3.client("s3"), args.log_bucket, args.prefix)
+        print(f"[INFO] Replayed {count} log record(s) into {args.table}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Fail when importing a Lambda handler takes longer than its init budget.
+
+    python scripts/check_init_budget.py [--budget-ms 400] [--runs 5]
+
+``tests/test_init_budget.py`` runs the same check under pytest.
+
+Each handler module is imported in a fresh interpreter with a placeholder
+environment (the same variables the stacks set, no AWS credentials needed),
+``--runs`` times; the median import time is compared with the budget. The
+import must also leave every AWS client and boto3's default session unbuilt:
+clients are created lazily on first use (``qs_common.clients``), so import-time work is module loading only.
+Exits 1 when a handler is over budget or builds a client while importing.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMON = os.path.join(ROOT, "lambda_src", "common", "python")
+HANDLERS = {
+    "export": (os.path.join(ROOT, "lambda_src", "handler"), {
+        "TARGET_BUCKET": "init-budget-bucket",
+        "BUCKET_NAME": "init-budget-bucket",
+    }),
+    "target_worker": (os.path.join(ROOT, "lambda_src", "target_worker"), {
+        "TARGET_ACCOUNT": "000000000000",
+        "BUCKET_NAME": "init-budget-bucket",
+    }),
+}
+
+# Runs in the child: time the import the way the Lambda runtime does it.
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import index
+elapsed = time.perf_counter() - started
+import boto3
+from qs_common import clients
+print(json.dumps({"ms": elapsed * 1000, "clients": [list(k) for k in clients._cache],
+                  "session": boto3.DEFAULT_SESSION is not None}))
+"""
+BUDGET_MS = float(os.environ.get("INIT_BUDGET_MS", "400"))
+
+
+def measure(code_dir, env_vars):
+    env = dict(os.environ, AWS_DEFAULT_REGION="us-east-1", STATE_TABLE="init-budget-table", **env_vars)
+    env["PYTHONPATH"] = os.pathsep.join([code_dir, COMMON])
+    # Like a fresh deployment package: our modules are compiled on every import.
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    out = subprocess.run([sys.executable, "-c", PROBE], env=env, cwd=code_dir,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def check(name, budget_ms=BUDGET_MS, runs=5):
+    """Import handler ``name`` ``runs`` times; a report with ``ok`` false when over budget or eager."""
+    code_dir, env_vars = HANDLERS[name]
+    results = [measure(code_dir, env_vars) for _ in range(max(runs, 1))]
+    report = {
+        "median": statistics.median(r["ms"] for r in results),
+        "max": max(r["ms"] for r in results),
+        "runs": len(results),
+        "clients": sorted({tuple(c) for r in results for c in r["clients"]}),
+        "session": any(r.get("session") for r in results),
+    }
+    report["ok"] = report["median"] <= budget_ms and not report["clients"] and not report["session"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS,
+                        help="allowed median import time per handler (default: INIT_BUDGET_MS or 400)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--handler", action="append", choices=sorted(HANDLERS),
+                        help="only this handler (repeatable)")
+    args = parser.parse_args()
+
+    failed = []
+    for name in args.handler or sorted(HANDLERS):
+        report = check(name, args.budget_ms, args.runs)
+        print(f"[INFO] {name}: median {report['median']:.0f} ms over {report['runs']} run(s), "
+              f"max {report['max']:.0f} ms, budget {args.budget_ms:.0f} ms: {'ok' if report['ok'] else 'OVER'}")
+        if report["clients"]:
+            print(f"[ERROR] {name}: clients built at import: {report['clients']}")
+        if report["session"]:
+            print(f"[ERROR] {name}: boto3 default session built at import")
+        if not report["ok"]:
+            failed.append(name)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
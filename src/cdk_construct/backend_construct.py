@@ -1,3 +1,5 @@
+import json
+
 from constructs import Construct
 from aws_cdk import (
     Duration,
@@ -5,13 +7,10 @@ from aws_cdk import (
     aws_s3 as s3,
     aws_iam as iam,
 )
-
-RUNTIME_MAP = {
-    "python3.12": _lambda.Runtime.PYTHON_3_12,
-    "python3.11": _lambda.Runtime.PYTHON_3_11,
-    "python3.10": _lambda.Runtime.PYTHON_3_10,
-    "python3.9":  _lambda.Runtime.PYTHON_3_9,
-}
+from src.cdk_construct.job_check_construct import JobCheckQueueConstruct
+from src.cdk_construct.lambda_runtime import create_common_layer, resolve_runtime
+from src.cdk_construct.state_table_construct import StateTableConstruct
+from src.config.load import rate_limits_json, target_configs
 
 
 class BackendConstruct(Construct):
@@ -21,9 +20,11 @@ class BackendConstruct(Construct):
         # Extract configuration sections
         self.bucket_cfg = cfg.get("bucket", {}) or {}
         self.lambda_cfg = cfg.get("lambda", {}) or {}
+        self.rate_limits = rate_limits_json(cfg)
         
-        # Parse target configuration
-        self.target_bucket_name = self._get_target_bucket_name(cfg)
+        # Parse target configuration (one bucket per target; the first is primary)
+        self.target_bucket_names = self._get_target_bucket_names(cfg)
+        self.target_bucket_name = self.target_bucket_names[0] if self.target_bucket_names else None
         self.allow_put_object_acl = bool(cfg.get("allowPutObjectAcl", False))
         self.target_prefix = self._normalize_prefix(
             self.lambda_cfg.get("targetPrefix", "bundles/")
@@ -31,18 +32,23 @@ class BackendConstruct(Construct):
 
         # Create resources
         self.bucket = self._create_source_bucket()
+        self.common_layer = self._create_common_layer()
         self.func = self._create_source_lambda()
+        self.state = StateTableConstruct(self, "State")
+        self.job_checks = self._create_job_check_queue()
         
         # Configure permissions
         self._configure_permissions()
 
-    def _get_target_bucket_name(self, cfg: dict) -> str | None:
-        """Extract target bucket name from configuration (supports multiple formats)."""
-        if cfg.get("target") and cfg["target"].get("bucket", {}).get("name"):
-            return cfg["target"]["bucket"]["name"]
-        elif cfg.get("targetBucket", {}).get("name"):
-            return cfg["targetBucket"]["name"]
-        return None
+    def _get_target_bucket_names(self, cfg: dict) -> list[str]:
+        """Extract target bucket names from configuration (supports multiple formats)."""
+        names = [
+            t["bucket"]["name"] for t in target_configs(cfg)
+            if (t.get("bucket") or {}).get("name")
+        ]
+        if not names and cfg.get("targetBucket", {}).get("name"):
+            names = [cfg["targetBucket"]["name"]]
+        return names
 
     def _normalize_prefix(self, prefix: str) -> str:
         """Normalize S3 prefix to ensure consistent format."""
@@ -51,14 +57,7 @@ class BackendConstruct(Construct):
 
     def _resolve_runtime(self) -> _lambda.Runtime:
         """Resolve Lambda runtime from configuration."""
-        cfg_runtime = (self.lambda_cfg.get("runtime") or "python3.12").lower()
-        runtime_enum = RUNTIME_MAP.get(cfg_runtime)
-        if runtime_enum is None:
-            raise ValueError(
-                f"Unsupported runtime '{cfg_runtime}'. "
-                f"Choose one of: {list(RUNTIME_MAP.keys())}"
-            )
-        return runtime_enum
+        return resolve_runtime(self.lambda_cfg)
 
     def _create_source_bucket(self) -> s3.Bucket:
         """Create the primary S3 bucket in the source account."""
@@ -71,6 +70,10 @@ class BackendConstruct(Construct):
             enforce_ssl=True,
         )
 
+    def _create_common_layer(self) -> _lambda.LayerVersion:
+        """Create the layer carrying the shared ``qs_common`` helper package."""
+        return create_common_layer(self, self._resolve_runtime())
+
     def _create_source_lambda(self) -> _lambda.Function:
         """Create the source Lambda function with proper configuration."""
         return _lambda.Function(
@@ -83,31 +86,80 @@ class BackendConstruct(Construct):
             ),
             timeout=Duration.seconds(self.lambda_cfg.get("timeout", 60)),
             memory_size=self.lambda_cfg.get("memory", 1024),
+            layers=[self.common_layer],
             environment=self._build_environment_variables(),
         )
 
+    def _create_job_check_queue(self) -> JobCheckQueueConstruct | None:
+        """Create the delayed job-check queue when async mode is enabled."""
+        async_cfg = self.lambda_cfg.get("async", {}) or {}
+        if not async_cfg.get("enabled"):
+            return None
+        return JobCheckQueueConstruct(
+            self, "JobChecks",
+            func=self.func,
+            lambda_timeout=self.lambda_cfg.get("timeout", 60),
+            async_cfg=async_cfg,
+        )
+
     def _build_environment_variables(self) -> dict[str, str]:
         """Build environment variables for the Lambda function."""
+        transfer_cfg = self.lambda_cfg.get("transfer", {}) or {}
+        polling_cfg = self.lambda_cfg.get("polling", {}) or {}
+        fingerprint_cfg = self.lambda_cfg.get("fingerprintCache", {}) or {}
+        scheduler_cfg = self.lambda_cfg.get("scheduler", {}) or {}
+        chunk_cfg = self.lambda_cfg.get("chunkedBundles", {}) or {}
+        index_cfg = self.lambda_cfg.get("bundleIndex", {}) or {}
+        clients_cfg = self.lambda_cfg.get("clients", {}) or {}
+        profiling_cfg = self.lambda_cfg.get("profiling", {}) or {}
         return {
             "BUCKET_NAME": self.bucket.bucket_name,
             "QS_REGION": self.lambda_cfg.get("qsRegion", "us-east-1"),
             "TARGET_BUCKET": self.target_bucket_name or self.bucket.bucket_name,
+            "TARGET_BUCKETS": json.dumps(self.target_bucket_names) if len(self.target_bucket_names) > 1 else "",
             "TARGET_PREFIX": self.target_prefix,
             "ALLOWED_FOLDER_IDS": self.lambda_cfg.get("allowedFolderIds", ""),
+            "TRANSFER_PART_SIZE_MB": str(transfer_cfg.get("partSizeMb", 16)),
+            "TRANSFER_CONCURRENCY": str(transfer_cfg.get("concurrency", 4)),
+            "POLL_MIN_DELAY": str(polling_cfg.get("minDelay", 1)),
+            "POLL_MAX_DELAY": str(polling_cfg.get("maxDelay", 30)),
+            "POLL_MAX_POLLS": str(polling_cfg.get("maxPolls", 120)),
+            "POLL_EXPECTED_EXPORT_SECONDS": str(polling_cfg.get("expectedSeconds", 45)),
+            "FINGERPRINT_CACHE": str(bool(fingerprint_cfg.get("enabled", False))).lower(),
+            "FINGERPRINT_TTL_HOURS": str(fingerprint_cfg.get("ttlHours", 24)),
+            "FORCE_EXPORT": str(bool(self.lambda_cfg.get("forceExport", False))).lower(),
+            "DELTA_EXPORTS": str(bool(self.lambda_cfg.get("deltaExports", False))).lower(),
+            "LAYERED_EXPORTS": str(bool(self.lambda_cfg.get("layeredExports", False))).lower(),
+            "CHUNKED_BUNDLES": str(bool(chunk_cfg.get("enabled", False))).lower(),
+            "BLOB_INDEX_TTL_DAYS": str(chunk_cfg.get("indexTtlDays", 7)),
+            "BUNDLE_INDEX": str(bool(index_cfg.get("enabled", False))).lower(),
+            "BUNDLE_INDEX_HISTORY": str(index_cfg.get("historyDepth", 20)),
+            "MAX_CONCURRENT_EXPORTS": str(scheduler_cfg.get("maxConcurrentExports", 5)),
+            "MAX_PARALLEL_FOLDERS": str(scheduler_cfg.get("maxParallelFolders", 16)),
+            "QS_RATE_LIMITS": self.rate_limits,
+            "CLIENT_MAX_POOL_CONNECTIONS": str(clients_cfg.get("maxPoolConnections", 32)),
+            "CLIENT_MAX_ATTEMPTS": str(clients_cfg.get("maxAttempts", 5)),
+            # Profiles land next to the bundles in the primary target bucket
+            "PROFILING_ENABLED": str(bool(profiling_cfg.get("enabled", False))).lower(),
+            "PROFILING_SAMPLE_RATE": str(profiling_cfg.get("sampleRate", 0)),
+            "PROFILING_BUCKET": self.target_bucket_name or self.bucket.bucket_name,
+            "PROFILING_PREFIX": f"{self.target_prefix}profiles/",
         }
 
     def _configure_permissions(self) -> None:
         """Configure all necessary permissions for the Lambda function."""
         # Grant read/write permissions on the source bucket
         self.bucket.grant_read_write(self.func)
+        self.state.grant_to(self.func)
         
-        # Configure cross-account permissions if target bucket is specified
-        if self.target_bucket_name:
+        # Configure cross-account permissions if target buckets are specified
+        if self.target_bucket_names:
             self._configure_cross_account_permissions()
 
     def _configure_cross_account_permissions(self) -> None:
         """Configure cross-account permissions for target bucket access."""
-        actions = ["s3:PutObject"]
+        # AbortMultipartUpload: a failed streaming copy cleans up its parts
+        actions = ["s3:PutObject", "s3:AbortMultipartUpload"]
         if self.allow_put_object_acl:
             actions.append("s3:PutObjectAcl")
             
@@ -116,7 +168,8 @@ class BackendConstruct(Construct):
                 effect=iam.Effect.ALLOW,
                 actions=actions,
                 resources=[
-                    f"arn:aws:s3:::{self.target_bucket_name}/{self.target_prefix}*"
+                    f"arn:aws:s3:::{name}/{self.target_prefix}*"
+                    for name in self.target_bucket_names
                 ],
             )
         )
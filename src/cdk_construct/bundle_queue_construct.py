@@ -0,0 +1,45 @@
+from constructs import Construct
+from aws_cdk import (
+    aws_lambda as _lambda,
+    aws_s3 as s3,
+    aws_s3_notifications as s3n,
+)
+
+from .sqs_source_construct import SqsSourceConstruct
+
+
+class BundleQueueConstruct(SqsSourceConstruct):
+    """SQS queue between the target bucket's object-created events and the worker.
+
+    New bundles (whole or chunked), deletion manifests and layer manifests
+    under the target prefix are sent to the queue and delivered to the worker in batches. The
+    worker imports every record of a batch concurrently and reports failed
+    messages individually, so only failed bundles are redelivered.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        *,
+        func: _lambda.Function,
+        bucket: s3.Bucket,
+        prefix: str,
+        lambda_timeout: int,
+        queue_cfg: dict,
+    ) -> None:
+        super().__init__(
+            scope, id,
+            func=func,
+            lambda_timeout=lambda_timeout,
+            max_receive_count=queue_cfg.get("maxReceiveCount", 3),
+            batch_size=queue_cfg.get("batchSize", 10),
+            batch_window_seconds=queue_cfg.get("batchWindowSeconds", 5),
+        )
+
+        for suffix in (".qs", ".chunks.json", ".deletions.json", ".layers.json"):
+            bucket.add_event_notification(
+                s3.EventType.OBJECT_CREATED,
+                s3n.SqsDestination(self.queue),
+                s3.NotificationKeyFilter(prefix=prefix, suffix=suffix),
+            )
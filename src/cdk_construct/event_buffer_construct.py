@@ -0,0 +1,33 @@
+from constructs import Construct
+from aws_cdk import aws_lambda as _lambda
+
+from .sqs_source_construct import SqsSourceConstruct
+
+
+class EventBufferConstruct(SqsSourceConstruct):
+    """SQS buffer between the QuickSight EventBridge rules and the export Lambda.
+
+    Every event is held for ``debounceSeconds`` before it becomes visible and
+    the event source waits up to ``batchWindowSeconds`` to fill a batch, so a
+    burst of folder-membership events reaches the function as one batch that
+    it collapses into a single export per folder.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        *,
+        func: _lambda.Function,
+        lambda_timeout: int,
+        buffer_cfg: dict,
+    ) -> None:
+        super().__init__(
+            scope, id,
+            func=func,
+            lambda_timeout=lambda_timeout,
+            max_receive_count=3,
+            batch_size=buffer_cfg.get("batchSize", 100),
+            batch_window_seconds=buffer_cfg.get("batchWindowSeconds", 20),
+            delivery_delay_seconds=buffer_cfg.get("debounceSeconds", 30),
+        )
@@ -0,0 +1,46 @@
+from constructs import Construct
+from aws_cdk import aws_lambda as _lambda
+
+from .sqs_source_construct import SqsSourceConstruct
+
+
+class JobCheckQueueConstruct(SqsSourceConstruct):
+    """Delayed-message queue that re-invokes a worker to check a running job.
+
+    In async mode the worker starts a QuickSight asset bundle job, records it
+    in the state table and returns; messages on this queue (sent with a delay
+    from the adaptive poller) bring it back to check the job and finish it.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        *,
+        func: _lambda.Function,
+        lambda_timeout: int,
+        async_cfg: dict,
+    ) -> None:
+        super().__init__(
+            scope, id,
+            func=func,
+            lambda_timeout=lambda_timeout,
+            max_receive_count=5,
+            # A terminal check runs the whole bundle transfer/import
+            # follow-up; one job per invocation keeps it within the timeout.
+            batch_size=async_cfg.get("checkBatchSize", 1),
+        )
+
+        self.queue.grant_send_messages(func)
+
+        func.add_environment("ASYNC_MODE", "true")
+        func.add_environment("JOB_CHECK_QUEUE_URL", self.queue.queue_url)
+        func.add_environment(
+            "ASYNC_MAX_WAIT", str(async_cfg.get("maxWaitSeconds", 7200))
+        )
+        func.add_environment(
+            "ASYNC_MAX_DELAY", str(async_cfg.get("maxCheckDelaySeconds", 120))
+        )
+        # A check that outlives this lease is presumed dead; its redelivered
+        # message (visibility timeout: 6x the function timeout) takes over.
+        func.add_environment("JOB_CHECK_LEASE", str(lambda_timeout + 60))
@@ -0,0 +1,33 @@
+from constructs import Construct
+from aws_cdk import aws_lambda as _lambda
+
+RUNTIME_MAP = {
+    "python3.12": _lambda.Runtime.PYTHON_3_12,
+    "python3.11": _lambda.Runtime.PYTHON_3_11,
+    "python3.10": _lambda.Runtime.PYTHON_3_10,
+    "python3.9":  _lambda.Runtime.PYTHON_3_9,
+}
+
+COMMON_LAYER_PATH = "lambda_src/common"
+
+
+def resolve_runtime(lambda_cfg: dict) -> _lambda.Runtime:
+    """Resolve a function's runtime from its ``lambda`` config section."""
+    cfg_runtime = (lambda_cfg.get("runtime") or "python3.12").lower()
+    runtime_enum = RUNTIME_MAP.get(cfg_runtime)
+    if runtime_enum is None:
+        raise ValueError(
+            f"Unsupported runtime '{cfg_runtime}'. "
+            f"Choose one of: {list(RUNTIME_MAP.keys())}"
+        )
+    return runtime_enum
+
+
+def create_common_layer(scope: Construct, runtime: _lambda.Runtime) -> _lambda.LayerVersion:
+    """Create the layer carrying the shared ``qs_common`` helper package for ``runtime``."""
+    return _lambda.LayerVersion(
+        scope, "CommonLayer",
+        code=_lambda.Code.from_asset(COMMON_LAYER_PATH),
+        compatible_runtimes=[runtime],
+        description="Shared helpers for the QuickSight migration Lambdas",
+    )
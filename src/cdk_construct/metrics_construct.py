@@ -0,0 +1,130 @@
+from constructs import Construct
+from aws_cdk import (
+    Duration,
+    Stack,
+    aws_cloudwatch as cloudwatch,
+    aws_cloudwatch_actions as cw_actions,
+    aws_lambda as _lambda,
+    aws_sns as sns,
+)
+
+# Phases each Lambda records (qs_common.metrics); keep in sync with the
+# metrics.phase()/metrics.job() calls in lambda_src.
+SOURCE_PHASES = ("ListMembers", "ExportJob", "Transfer", "ExportFolder")
+TARGET_PHASES = ("LoadOverrides", "ReadBundle", "Validate", "ImportJob", "ImportBundle")
+# Phases whose records carry BundleBytes / Throughput and PollIterations / ThrottleRetries.
+BYTE_PHASES = ("Transfer", "ReadBundle")
+JOB_PHASES = ("ExportJob", "ImportJob")
+
+
+class MetricsConstruct(Construct):
+    """Per-phase metrics of one Lambda: EMF settings, a dashboard and latency alarms.
+
+    The function writes its metrics as Embedded Metric Format log lines (no
+    PutMetricData calls, so no extra permissions); this construct turns them
+    on, names the Stage and Target dimensions it records, and builds a
+    dashboard of phase latency (p50/p90), bundle bytes and throughput, job
+    polls and throttle retries, and errors. ``metricsCfg.alarms`` maps a phase
+    to the p90 latency (seconds) that raises its alarm, optionally notifying
+    ``alarmTopicArn``.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        *,
+        func: _lambda.Function,
+        stage: str,
+        target: str,
+        phases: tuple,
+        metrics_cfg: dict,
+    ) -> None:
+        super().__init__(scope, id)
+
+        self.namespace = metrics_cfg.get("namespace", "QuickSightMigrations")
+        self.dimensions = {"Stage": stage, "Target": target}
+        self.phases = phases
+
+        func.add_environment("METRICS_ENABLED", "true")
+        func.add_environment("METRICS_NAMESPACE", self.namespace)
+        func.add_environment("METRICS_STAGE", stage)
+        func.add_environment("METRICS_TARGET", target)
+
+        self.alarms = self._create_alarms(metrics_cfg)
+        self.dashboard = self._create_dashboard(metrics_cfg)
+
+    def _metric(self, name: str, phase: str, statistic: str, period: Duration) -> cloudwatch.Metric:
+        return cloudwatch.Metric(
+            namespace=self.namespace,
+            metric_name=name,
+            dimensions_map=dict(self.dimensions, Phase=phase),
+            statistic=statistic,
+            period=period,
+            label=f"{phase} {name} {statistic}",
+        )
+
+    def _create_alarms(self, metrics_cfg: dict) -> list[cloudwatch.Alarm]:
+        """p90 Duration alarms for the configured phases this function records."""
+        thresholds = metrics_cfg.get("alarms", {}) or {}
+        unknown = set(thresholds) - set(SOURCE_PHASES) - set(TARGET_PHASES)
+        if unknown:
+            raise ValueError(f"metrics.alarms: unknown phase(s) {sorted(unknown)}")
+        period = Duration.minutes(metrics_cfg.get("alarmPeriodMinutes", 15))
+        topic = None
+        if metrics_cfg.get("alarmTopicArn"):
+            topic = sns.Topic.from_topic_arn(self, "AlarmTopic", metrics_cfg["alarmTopicArn"])
+
+        alarms = []
+        for phase in self.phases:
+            if phase not in thresholds:
+                continue
+            seconds = float(thresholds[phase])
+            alarm = cloudwatch.Alarm(
+                self, f"{phase}LatencyAlarm",
+                metric=self._metric("Duration", phase, "p90", period),
+                threshold=seconds * 1000,
+                evaluation_periods=metrics_cfg.get("evaluationPeriods", 2),
+                comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+                alarm_description=(
+                    f"p90 {phase} latency above {seconds:g}s "
+                    f"({self.dimensions['Stage']}, target {self.dimensions['Target']})"
+                ),
+            )
+            if topic:
+                alarm.add_alarm_action(cw_actions.SnsAction(topic))
+            alarms.append(alarm)
+        return alarms
+
+    def _create_dashboard(self, metrics_cfg: dict) -> cloudwatch.Dashboard:
+        period = Duration.minutes(metrics_cfg.get("dashboardPeriodMinutes", 5))
+        byte_phases = [p for p in self.phases if p in BYTE_PHASES]
+        job_phases = [p for p in self.phases if p in JOB_PHASES]
+
+        def graph(title, metrics, right=None):
+            return cloudwatch.GraphWidget(title=title, left=metrics, right=right or [], width=12, height=6)
+
+        dashboard = cloudwatch.Dashboard(
+            self, "Dashboard",
+            dashboard_name=f"{Stack.of(self).stack_name}-phases",
+        )
+        dashboard.add_widgets(
+            graph("Phase latency p50 (ms)", [self._metric("Duration", p, "p50", period) for p in self.phases]),
+            graph("Phase latency p90 (ms)", [self._metric("Duration", p, "p90", period) for p in self.phases]),
+        )
+        dashboard.add_widgets(
+            graph("Bundle bytes", [self._metric("BundleBytes", p, "Sum", period) for p in byte_phases],
+                  right=[self._metric("Throughput", p, "Average", period) for p in byte_phases]),
+            graph("Job polls and throttle retries",
+                  [self._metric("PollIterations", p, "Average", period) for p in job_phases],
+                  right=[self._metric("ThrottleRetries", p, "Sum", period) for p in job_phases]),
+        )
+        widgets = [graph("Errors and resources", [self._metric("Errors", p, "Sum", period) for p in self.phases],
+                         right=[self._metric("ResourceCount", p, "Average", period) for p in self.phases
+                                if p in ("ListMembers", "Transfer", "Validate")])]
+        if self.alarms:
+            widgets.append(cloudwatch.AlarmStatusWidget(title="Latency alarms", alarms=self.alarms,
+                                                        width=12, height=6))
+        dashboard.add_widgets(*widgets)
+        return dashboard
@@ -0,0 +1,63 @@
+from constructs import Construct
+from aws_cdk import (
+    Duration,
+    aws_lambda as _lambda,
+    aws_lambda_event_sources as event_sources,
+    aws_sqs as sqs,
+)
+
+
+class SqsSourceConstruct(Construct):
+    """SQS queue, with a dead-letter queue, that feeds a Lambda function.
+
+    Base of the queues the Lambdas consume. The visibility timeout is 6x the
+    function timeout, the AWS guidance for SQS event sources, so a message is
+    not redelivered while an invocation may still be working on it. The
+    function reports failed messages individually (partial batch responses);
+    a message that fails ``max_receive_count`` times moves to the
+    dead-letter queue, kept for 14 days.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        *,
+        func: _lambda.Function,
+        lambda_timeout: int,
+        max_receive_count: int,
+        batch_size: int,
+        batch_window_seconds: int | None = None,
+        delivery_delay_seconds: int | None = None,
+    ) -> None:
+        super().__init__(scope, id)
+
+        self.dead_letter_queue = sqs.Queue(
+            self, "DeadLetterQueue",
+            retention_period=Duration.days(14),
+            enforce_ssl=True,
+        )
+        self.queue = sqs.Queue(
+            self, "Queue",
+            delivery_delay=(
+                Duration.seconds(delivery_delay_seconds)
+                if delivery_delay_seconds is not None else None
+            ),
+            visibility_timeout=Duration.seconds(lambda_timeout * 6),
+            enforce_ssl=True,
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=max_receive_count, queue=self.dead_letter_queue
+            ),
+        )
+
+        func.add_event_source(
+            event_sources.SqsEventSource(
+                self.queue,
+                batch_size=batch_size,
+                max_batching_window=(
+                    Duration.seconds(batch_window_seconds)
+                    if batch_window_seconds is not None else None
+                ),
+                report_batch_item_failures=True,
+            )
+        )
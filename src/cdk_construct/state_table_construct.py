@@ -0,0 +1,30 @@
+from constructs import Construct
+from aws_cdk import (
+    aws_dynamodb as dynamodb,
+    aws_lambda as _lambda,
+)
+
+
+class StateTableConstruct(Construct):
+    """DynamoDB table holding the workers' small state records (jobs, caches, locks).
+
+    Items are keyed by a prefixed string ``pk`` and expire through the
+    ``expiresAt`` TTL attribute.
+    """
+
+    def __init__(self, scope: Construct, id: str) -> None:
+        super().__init__(scope, id)
+
+        self.table = dynamodb.Table(
+            self, "Table",
+            partition_key=dynamodb.Attribute(
+                name="pk", type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+        )
+
+    def grant_to(self, func: _lambda.Function) -> None:
+        """Give ``func`` read/write access and point it at the table."""
+        self.table.grant_read_write_data(func)
+        func.add_environment("STATE_TABLE", self.table.table_name)
@@ -1,3 +1,4 @@
+import json
 import os
 import yaml
 import re
@@ -41,3 +42,47 @@ def substitute_env_vars(content: str) -> str:
     # Pattern to match ${VAR_NAME} or ${VAR_NAME:default}
     pattern = r'\$\{([^}]+)\}'
     return re.sub(pattern, replace_env_var, content)
+
+def rate_limits_json(cfg: dict, section: dict | None = None) -> str:
+    """
+    Validate the per-API QuickSight budgets (``rateLimits``) and serialise them
+    for the Lambdas' QS_RATE_LIMITS variable. A ``rateLimits`` block inside
+    ``section`` (e.g. ``target``) replaces the stage-wide one.
+    """
+    limits = (section or {}).get("rateLimits") or cfg.get("rateLimits") or {}
+    budgets = {}
+    for api, budget in limits.items():
+        rate = float(budget.get("rate", 0))
+        burst = float(budget.get("burst", max(rate, 1)))
+        if rate <= 0 or burst < 1:
+            raise ValueError(
+                f"rateLimits.{api}: 'rate' must be > 0 and 'burst' >= 1"
+            )
+        budgets[api] = {"rate": rate, "burst": burst}
+    return json.dumps(budgets, sort_keys=True) if budgets else ""
+
+def metrics_config(cfg: dict, section: dict | None = None) -> dict:
+    """
+    The per-phase ``metrics`` settings for a stack. A ``metrics`` block inside
+    ``section`` (e.g. a target) replaces the stage-wide one; alarm thresholds
+    are p90 phase latencies in seconds.
+    """
+    metrics = (section or {}).get("metrics") or cfg.get("metrics") or {}
+    for phase, seconds in (metrics.get("alarms") or {}).items():
+        if float(seconds) <= 0:
+            raise ValueError(f"metrics.alarms.{phase}: threshold must be > 0 seconds")
+    return metrics
+
+def target_configs(cfg: dict) -> list[dict]:
+    """
+    Target blocks of the stage: the ``targets`` list (each entry needs a unique
+    ``name``) or the single ``target`` block, returned as a one-entry list with
+    ``name`` left unset so its stack keeps the original id.
+    """
+    if cfg.get("targets"):
+        targets = cfg["targets"]
+        names = [t.get("name") for t in targets]
+        if not all(names) or len(set(names)) != len(names):
+            raise ValueError("Every entry in 'targets' needs a unique 'name'")
+        return targets
+    return [cfg["target"]] if cfg.get("target") else []
@@ -3,6 +3,9 @@ from aws_cdk import Stack, CfnOutput
 from aws_cdk import aws_events as events
 from aws_cdk import aws_events_targets as targets
 from src.cdk_construct.backend_construct import BackendConstruct
+from src.cdk_construct.event_buffer_construct import EventBufferConstruct
+from src.cdk_construct.metrics_construct import SOURCE_PHASES, MetricsConstruct
+from src.config.load import metrics_config, target_configs
 
 class InfraStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, *, cfg: dict, **kwargs) -> None:
@@ -10,6 +13,33 @@ class InfraStack(Stack):
 
         backend = BackendConstruct(self, "Backend", cfg=cfg)
 
+        # Per-phase EMF metrics, dashboard and latency alarms. The exporter
+        # serves every target, so its Target dimension names them all.
+        metrics_cfg = metrics_config(cfg)
+        if metrics_cfg.get("enabled"):
+            MetricsConstruct(
+                self, "Metrics",
+                func=backend.func,
+                stage=cfg["stage"],
+                target=",".join(t.get("name") or "default" for t in target_configs(cfg)) or "default",
+                phases=SOURCE_PHASES,
+                metrics_cfg=metrics_cfg,
+            )
+
+        # Rules deliver straight to the Lambda, or through an SQS buffer that
+        # coalesces bursts of events into one export per folder.
+        buffer_cfg = cfg.get("lambda", {}).get("eventBuffer", {}) or {}
+        if buffer_cfg.get("enabled"):
+            buffer = EventBufferConstruct(
+                self, "EventBuffer",
+                func=backend.func,
+                lambda_timeout=cfg.get("lambda", {}).get("timeout", 60),
+                buffer_cfg=buffer_cfg,
+            )
+            rule_target = targets.SqsQueue(buffer.queue)
+        else:
+            rule_target = targets.LambdaFunction(backend.func)
+
         # --- EventBridge rule (folder membership updates) ---
         # Pull folder IDs from cfg["lambda"]["allowedFolderIds"] if present.
         allowed_ids = (cfg.get("lambda", {}).get("allowedFolderIds") or "").split(",")
@@ -29,7 +59,7 @@ class InfraStack(Stack):
             event_pattern=event_pattern,
             enabled=True,  # default True, explicit for clarity
         )
-        rule.add_target(targets.LambdaFunction(backend.func))
+        rule.add_target(rule_target)
 
         # (Optional) legacy update events (dashboard/analysis/dataset)
         if cfg.get("lambda", {}).get("enableLegacyEvents"):
@@ -47,7 +77,7 @@ class InfraStack(Stack):
                 ),
                 enabled=True,
             )
-            legacy_rule.add_target(targets.LambdaFunction(backend.func))
+            legacy_rule.add_target(rule_target)
 
         # Outputs
         CfnOutput(self, "BucketNameOut", value=backend.bucket.bucket_name)
@@ -7,6 +7,19 @@ from aws_cdk import (
     aws_lambda as _lambda,
 )
 from constructs import Construct
+from src.cdk_construct.bundle_queue_construct import BundleQueueConstruct
+from src.cdk_construct.job_check_construct import JobCheckQueueConstruct
+from src.cdk_construct.lambda_runtime import create_common_layer, resolve_runtime
+from src.cdk_construct.metrics_construct import TARGET_PHASES, MetricsConstruct
+from src.cdk_construct.state_table_construct import StateTableConstruct
+
+# Where the worker writes bundles of its own (reduced to changed assets, or
+# rebuilt from chunks); kept outside the bundle prefix so they never trigger
+# another import.
+STAGING_PREFIX = "staging/"
+# Profiles of both Lambdas, under the bundle prefix (no notification suffix matches them)
+PROFILES_DIR = "profiles/"
+
 
 class TargetStack(Stack):
     def __init__(
@@ -23,10 +36,19 @@ class TargetStack(Stack):
         qs_region: str,
         lambda_timeout: int = 60,
         lambda_memory: int = 128,
+        lambda_cfg: dict | None = None,
+        rate_limits: str = "",
+        stage: str = "dev",
+        target_name: str = "default",
+        metrics_cfg: dict | None = None,
         **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Optional target.lambda section (feature settings for the worker)
+        self.lambda_cfg = lambda_cfg or {}
+        self.rate_limits = rate_limits
+
         # Normalize prefix to ensure consistent format
         self.target_prefix = self._normalize_prefix(target_prefix)
 
@@ -41,12 +63,17 @@ class TargetStack(Stack):
             )
 
         # Create the target Lambda function
+        self.common_layer = self._create_common_layer()
         self.target_function = self._create_target_lambda(
             target_account, 
             qs_region, 
             lambda_timeout, 
             lambda_memory
         )
+        self.state = StateTableConstruct(self, "State")
+        self.job_checks = self._create_job_check_queue(lambda_timeout)
+        self.bundle_queue = self._create_bundle_queue(lambda_timeout)
+        self.metrics = self._create_metrics(stage, target_name, metrics_cfg or {})
         
         # Configure Lambda permissions
         self._configure_lambda_permissions()
@@ -68,6 +95,24 @@ class TargetStack(Stack):
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
             encryption=s3.BucketEncryption.S3_MANAGED,
             enforce_ssl=True,
+            lifecycle_rules=[
+                # Parts of uploads whose abort never arrived (e.g. a timed-out copy)
+                s3.LifecycleRule(
+                    abort_incomplete_multipart_upload_after=Duration.days(1),
+                ),
+                s3.LifecycleRule(
+                    prefix=STAGING_PREFIX,
+                    expiration=Duration.days(7),
+                    noncurrent_version_expiration=Duration.days(1),
+                ),
+                s3.LifecycleRule(
+                    prefix=f"{self.target_prefix}{PROFILES_DIR}",
+                    expiration=Duration.days(
+                        (self.lambda_cfg.get("profiling", {}) or {}).get("retentionDays", 14)
+                    ),
+                    noncurrent_version_expiration=Duration.days(1),
+                ),
+            ],
         )
 
     def _configure_cross_account_permissions(
@@ -76,7 +121,7 @@ class TargetStack(Stack):
         allow_put_object_acl: bool
     ) -> None:
         """Configure cross-account permissions for source Lambda."""
-        actions = ["s3:PutObject"]
+        actions = ["s3:PutObject", "s3:AbortMultipartUpload"]
         if allow_put_object_acl:
             actions.append("s3:PutObjectAcl")
 
@@ -90,6 +135,10 @@ class TargetStack(Stack):
             )
         )
 
+    def _create_common_layer(self) -> _lambda.LayerVersion:
+        """Create the layer carrying the shared ``qs_common`` helper package."""
+        return create_common_layer(self, resolve_runtime(self.lambda_cfg))
+
     def _create_target_lambda(
         self, 
         target_account: str, 
@@ -98,24 +147,101 @@ class TargetStack(Stack):
         memory: int
     ) -> _lambda.Function:
         """Create the target Lambda function with optimized configuration."""
+        polling_cfg = self.lambda_cfg.get("polling", {}) or {}
+        validation_cfg = self.lambda_cfg.get("bundleValidation", {}) or {}
+        scheduling_cfg = self.lambda_cfg.get("importScheduling", {}) or {}
+        clients_cfg = self.lambda_cfg.get("clients", {}) or {}
+        profiling_cfg = self.lambda_cfg.get("profiling", {}) or {}
+        overrides_key = self.lambda_cfg.get("overridesS3Key")
+        environment = {}
+        if overrides_key:
+            environment["OVERRIDES_S3_KEY"] = overrides_key
         return _lambda.Function(
             self, "TargetWorkerFn",
-            runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="index.handler",
+            runtime=resolve_runtime(self.lambda_cfg),
+            handler="index.lambda_handler",
             code=_lambda.Code.from_asset("lambda_src/target_worker"),
             timeout=Duration.seconds(timeout),
             memory_size=memory,
+            layers=[self.common_layer],
             environment={
+                **environment,
                 "BUCKET_NAME": self.target_bucket.bucket_name,
                 "TARGET_ACCOUNT": str(target_account),
                 "QS_REGION": str(qs_region),
                 "TARGET_PREFIX": self.target_prefix,
+                "POLL_MIN_DELAY": str(polling_cfg.get("minDelay", 1)),
+                "POLL_MAX_DELAY": str(polling_cfg.get("maxDelay", 30)),
+                "POLL_MAX_POLLS": str(polling_cfg.get("maxPolls", 120)),
+                "POLL_EXPECTED_IMPORT_SECONDS": str(polling_cfg.get("expectedSeconds", 90)),
+                "APPLY_DELETIONS": str(bool(self.lambda_cfg.get("applyDeletions", False))).lower(),
+                "QS_RATE_LIMITS": self.rate_limits,
+                "OVERRIDES_CACHE_TTL": str(self.lambda_cfg.get("overridesCacheTtlSeconds", 60)),
+                "MAX_CONCURRENT_IMPORTS": str(self.lambda_cfg.get("maxConcurrentImports", 4)),
+                "IMPORT_LEDGER": str(bool(self.lambda_cfg.get("importLedger", False))).lower(),
+                "ASSET_DIFFING": str(bool(self.lambda_cfg.get("assetDiffing", False))).lower(),
+                "STAGING_PREFIX": STAGING_PREFIX,
+                "BUNDLE_VALIDATION": str(bool(validation_cfg.get("enabled", False))).lower(),
+                "REQUIRE_DATASOURCE_OVERRIDES": str(
+                    bool(validation_cfg.get("requireDataSourceOverrides", bool(overrides_key)))
+                ).lower(),
+                "IMPORT_SCHEDULING": str(bool(scheduling_cfg.get("enabled", False))).lower(),
+                "IMPORT_LOCK_WAIT_LEASE": str(scheduling_cfg.get("waitLeaseSeconds", 1800)),
+                "CLIENT_MAX_POOL_CONNECTIONS": str(clients_cfg.get("maxPoolConnections", 32)),
+                "CLIENT_MAX_ATTEMPTS": str(clients_cfg.get("maxAttempts", 5)),
+                "PROFILING_ENABLED": str(bool(profiling_cfg.get("enabled", False))).lower(),
+                "PROFILING_SAMPLE_RATE": str(profiling_cfg.get("sampleRate", 0)),
+                "PROFILING_BUCKET": self.target_bucket.bucket_name,
+                "PROFILING_PREFIX": f"{self.target_prefix}{PROFILES_DIR}",
             },
         )
 
+    def _create_job_check_queue(self, timeout: int) -> JobCheckQueueConstruct | None:
+        """Create the delayed job-check queue when async mode is enabled."""
+        async_cfg = self.lambda_cfg.get("async", {}) or {}
+        if not async_cfg.get("enabled"):
+            return None
+        return JobCheckQueueConstruct(
+            self, "JobChecks",
+            func=self.target_function,
+            lambda_timeout=timeout,
+            async_cfg=async_cfg,
+        )
+
+    def _create_bundle_queue(self, timeout: int) -> BundleQueueConstruct | None:
+        """Deliver new bundles to the worker through SQS when enabled."""
+        queue_cfg = self.lambda_cfg.get("bundleQueue", {}) or {}
+        if not queue_cfg.get("enabled"):
+            return None
+        return BundleQueueConstruct(
+            self, "BundleQueue",
+            func=self.target_function,
+            bucket=self.target_bucket,
+            prefix=self.target_prefix,
+            lambda_timeout=timeout,
+            queue_cfg=queue_cfg,
+        )
+
+    def _create_metrics(self, stage: str, target_name: str, metrics_cfg: dict) -> MetricsConstruct | None:
+        """Per-phase EMF metrics, dashboard and latency alarms for the worker."""
+        if not metrics_cfg.get("enabled"):
+            return None
+        return MetricsConstruct(
+            self, "Metrics",
+            func=self.target_function,
+            stage=stage,
+            target=target_name,
+            phases=TARGET_PHASES,
+            metrics_cfg=metrics_cfg,
+        )
+
     def _configure_lambda_permissions(self) -> None:
         """Configure Lambda permissions with least privilege principle."""
         self.target_bucket.grant_read(self.target_function)
+        self.target_bucket.grant_put(self.target_function, f"{STAGING_PREFIX}*")
+        # Always granted, so profiling can be switched on without a deploy
+        self.target_bucket.grant_put(self.target_function, f"{self.target_prefix}{PROFILES_DIR}*")
+        self.state.grant_to(self.target_function)
 
     def _create_outputs(self) -> None:
         """Create CloudFormation outputs for important resources."""
@@ -0,0 +1,87 @@
+"""
+Shared fixtures for the Lambda unit tests.
+
+The shared layer (``qs_common``) is importable directly; handler modules are
+loaded with ``load_module`` because both handlers have sibling modules of the
+same name (``index``, ``chunks``). State-backed code runs against a moto
+DynamoDB table (``state_table``).
+"""
+import importlib
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMON_DIR = os.path.join(ROOT, "lambda_src", "common", "python")
+HANDLER_DIR = os.path.join(ROOT, "lambda_src", "handler")
+WORKER_DIR = os.path.join(ROOT, "lambda_src", "target_worker")
+
+# Before any module under test reads its configuration.
+os.environ.update({
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_EC2_METADATA_DISABLED": "true",
+    "STATE_TABLE": "test-state",
+    "TARGET_ACCOUNT": "222222222222",
+    "TARGET_BUCKET": "test-target",
+    "BUCKET_NAME": "test-target",
+})
+sys.path.insert(0, COMMON_DIR)
+
+
+def load_module(code_dir, name):
+    """Import ``code_dir``/``name``.py (and its siblings) without leaking them to other tests."""
+    before = set(sys.modules)
+    sys.path.insert(0, code_dir)
+    try:
+        module = importlib.import_module(name)
+    finally:
+        sys.path.remove(code_dir)
+        for loaded in set(sys.modules) - before:
+            if os.path.dirname(getattr(sys.modules[loaded], "__file__", None) or "") == code_dir:
+                del sys.modules[loaded]
+    return module
+
+
+def _atomic_item_writes(monkeypatch):
+    """
+    Serialize moto's item writes. DynamoDB checks a condition and writes the
+    item atomically; moto does not, so concurrent conditional updates from
+    threaded tests could both succeed.
+    """
+    from moto.dynamodb.models import DynamoDBBackend
+
+    lock = threading.Lock()
+    for name in ("put_item", "update_item", "delete_item"):
+        write = getattr(DynamoDBBackend, name)
+
+        def locked(self, *args, _write=write, **kwargs):
+            with lock:
+                return _write(self, *args, **kwargs)
+
+        monkeypatch.setattr(DynamoDBBackend, name, locked)
+
+
+@pytest.fixture
+def state_table(monkeypatch):
+    """A fresh moto state table; AWS clients are rebuilt inside the mock."""
+    from moto import mock_aws
+
+    from qs_common import clients, state
+
+    _atomic_item_writes(monkeypatch)
+    with mock_aws():
+        clients.reset()
+        state._dynamodb = state._table = None
+        clients.resource("dynamodb").create_table(
+            TableName=os.environ["STATE_TABLE"],
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield state
+        clients.reset()
+        state._dynamodb = state._table = None
@@ -0,0 +1,38 @@
+"""Asset diffing: unchanged assets are skipped, deleted ones are forgotten."""
+import io
+import json
+import zipfile
+
+import pytest
+
+from conftest import WORKER_DIR, load_module
+
+ACCOUNT = "222222222222"
+
+
+@pytest.fixture
+def bundle_diff(state_table):
+    return load_module(WORKER_DIR, "bundle_diff")
+
+
+def bundle(**members):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as z:
+        for name, doc in members.items():
+            z.writestr(name.replace("__", "/") + ".json", json.dumps(doc))
+    return out.getvalue()
+
+
+def test_unchanged_assets_are_skipped(bundle_diff):
+    assets = bundle_diff.inspect(bundle(dataSet__Sales={"Name": "sales"}, theme__t1={"Name": "t"}))
+    bundle_diff.record(ACCOUNT, {k: a["hash"] for k, a in assets.items()})
+    changed = bundle_diff.inspect(bundle(dataSet__Sales={"Name": "sales v2"}, theme__t1={"Name": "t"}))
+    assert bundle_diff.plan(ACCOUNT, changed) == (["dataset/Sales"], ["theme/t1"])
+
+
+def test_deleted_asset_with_mixed_case_id_is_forgotten(bundle_diff):
+    assets = bundle_diff.inspect(bundle(dataSet__Sales={"Name": "sales"}))
+    bundle_diff.record(ACCOUNT, {k: a["hash"] for k, a in assets.items()})
+    # deletions report the type as QuickSight spells it
+    bundle_diff.forget(ACCOUNT, ["dataSet/Sales"])
+    assert bundle_diff.plan(ACCOUNT, assets) == (["dataset/Sales"], [])
@@ -0,0 +1,35 @@
+"""Bundle index entries: content hash, history order and the append-only log."""
+import json
+
+import pytest
+
+from qs_common import clients
+
+from conftest import HANDLER_DIR, load_module
+
+ACCOUNT = "111111111111"
+ARN = "arn:aws:quicksight:us-east-1:111111111111:dashboard/d1"
+
+
+@pytest.fixture
+def index(state_table):
+    module = load_module(HANDLER_DIR, "bundle_index")
+    s3 = clients.client("s3")
+    s3.create_bucket(Bucket=module.LOG_BUCKET)
+    module.s3 = s3
+    return module
+
+
+def test_entries_carry_the_bundle_sha256_newest_first(index):
+    objects = {"t1": {"etag": '"abc-3"', "version_id": "v1"}}
+    index.record(index.s3, ACCOUNT, [ARN], "bundles/exp-1.qs", objects, "1" * 64, job_id="exp-1")
+    index.record(index.s3, ACCOUNT, [ARN], "bundles/exp-2.qs", objects, "2" * 64, job_id="exp-2")
+
+    item = index.state.get(index.pk(ACCOUNT, ARN))
+    assert item["latest"]["sha256"] == "2" * 64
+    assert [e["key"] for e in item["history"]] == ["bundles/exp-2.qs", "bundles/exp-1.qs"]
+
+    logged = index.s3.list_objects_v2(Bucket=index.LOG_BUCKET)["Contents"]
+    bodies = [json.loads(index.s3.get_object(Bucket=index.LOG_BUCKET, Key=o["Key"])["Body"].read())
+              for o in logged]
+    assert sorted(b["sha256"] for b in bodies) == ["1" * 64, "2" * 64]
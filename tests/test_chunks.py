@@ -0,0 +1,86 @@
+"""Chunked bundles: blob dedup across exports and buckets, and rebuilding on the target."""
+import gzip
+import io
+import zipfile
+
+import pytest
+
+from qs_common import clients
+
+from conftest import HANDLER_DIR, WORKER_DIR, load_module
+
+PREFIX = "bundles/"
+
+
+@pytest.fixture
+def s3(state_table):
+    client = clients.client("s3")
+    for bucket in ("tbkt", "tbkt-dr"):
+        client.create_bucket(Bucket=bucket)
+    return client
+
+
+@pytest.fixture
+def source(s3):
+    return load_module(HANDLER_DIR, "chunks")
+
+
+def bundle(**members):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as zf:
+        for name, body in members.items():
+            zf.writestr(f"{name}.json", body)
+    data.seek(0)
+    return data
+
+
+def blobs(s3, bucket):
+    listed = s3.list_objects_v2(Bucket=bucket, Prefix=f"{PREFIX}blobs/")
+    return sorted(o["Key"] for o in listed.get("Contents", []))
+
+
+def test_manifest_key_replaces_the_bundle_suffix(source):
+    assert source.manifest_key("bundles/exp-1.qs") == "bundles/exp-1.chunks.json"
+    assert source.manifest_key("bundles/exp-1.chunks.json") == "bundles/exp-1.chunks.json"
+
+
+def test_blobs_already_written_are_not_written_again(s3, source):
+    first = source.store(s3, ["tbkt"], PREFIX, bundle(a="A", b="B", c="A"), "bundles/exp-1.chunks.json")
+    assert first["members"] == 3 and first["blobs_written"] == 2
+    before = blobs(s3, "tbkt")
+
+    second = source.store(s3, ["tbkt"], PREFIX, bundle(a="A", b="B2"), "bundles/exp-2.chunks.json")
+    assert second["blobs_written"] == 1
+    assert len(blobs(s3, "tbkt")) == len(before) + 1
+
+
+def test_each_bucket_gets_the_blobs_it_is_missing(s3, source):
+    source.store(s3, ["tbkt"], PREFIX, bundle(a="A"), "bundles/exp-1.chunks.json")
+    result = source.store(s3, ["tbkt", "tbkt-dr"], PREFIX, bundle(a="A", b="B"), "bundles/exp-2.chunks.json")
+    assert result["blobs_written"] == 3
+    assert blobs(s3, "tbkt") == blobs(s3, "tbkt-dr")
+    assert set(result["objects"]) == {"tbkt", "tbkt-dr"}
+
+
+def test_forgotten_blobs_are_written_again(s3, source):
+    source.store(s3, ["tbkt"], PREFIX, bundle(a="A"), "bundles/exp-1.chunks.json")
+    for key in blobs(s3, "tbkt"):
+        source.state.delete(f"blob#tbkt#{key.rsplit('/', 1)[1]}")  # the index entry expired
+    assert source.store(s3, ["tbkt"], PREFIX, bundle(a="A"), "bundles/exp-2.chunks.json")["blobs_written"] == 1
+
+
+def test_target_rebuilds_the_bundle(s3, source):
+    source.store(s3, ["tbkt"], PREFIX, bundle(a="A", b="B", c="A"), "bundles/exp-1.chunks.json")
+    target = load_module(WORKER_DIR, "chunks")
+    key = target.rebuild(s3, "tbkt", "bundles/exp-1.chunks.json")
+    body = s3.get_object(Bucket="tbkt", Key=key)["Body"].read()
+    with zipfile.ZipFile(io.BytesIO(body)) as zf:
+        assert [(n, zf.read(n)) for n in zf.namelist()] == [("a.json", b"A"), ("b.json", b"B"), ("c.json", b"A")]
+
+
+def test_target_rejects_a_corrupt_blob(s3, source):
+    source.store(s3, ["tbkt"], PREFIX, bundle(a="A"), "bundles/exp-1.chunks.json")
+    s3.put_object(Bucket="tbkt", Key=blobs(s3, "tbkt")[0], Body=gzip.compress(b"tampered"))
+    target = load_module(WORKER_DIR, "chunks")
+    with pytest.raises(RuntimeError, match="corrupt"):
+        target.rebuild(s3, "tbkt", "bundles/exp-1.chunks.json")
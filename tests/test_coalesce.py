@@ -0,0 +1,69 @@
+"""Folder claims of buffered events survive an async export that fails later."""
+import json
+
+import pytest
+
+from conftest import HANDLER_DIR, load_module
+
+ACCOUNT = "111111111111"
+
+
+@pytest.fixture
+def handler(state_table, monkeypatch):
+    module = load_module(HANDLER_DIR, "index")
+    started = []
+
+    def plan_folder(account, folder_id, force=False):
+        return {"arns": ["arn:a"], "ctx": {"accountId": account, "folderId": folder_id,
+                                           "resourceCount": 1}, "force": force}, None
+
+    def execute_plan(plan, context, job_slots=None):
+        started.append(plan["ctx"])
+        return {"status": "STARTED", "folderId": plan["ctx"]["folderId"]}
+
+    monkeypatch.setattr(module, "plan_folder", plan_folder)
+    monkeypatch.setattr(module, "execute_plan", execute_plan)
+    module.started = started
+    return module
+
+
+def events(folder_id, at="2026-01-01T00:00:00Z"):
+    body = {"detail-type": "QuickSight Folder Updated", "account": ACCOUNT, "time": at,
+            "detail": {"folderId": folder_id}}
+    return {"Records": [{"eventSource": "aws:sqs", "messageId": "m1", "body": json.dumps(body)}]}
+
+
+def test_redelivered_events_are_debounced_while_the_export_runs(handler):
+    handler.handle_event_batch(events("f1"), None)
+    handler.handle_event_batch(events("f1"), None)
+    assert len(handler.started) == 1
+
+
+def test_event_in_the_same_second_as_a_claim_is_not_debounced(handler, monkeypatch):
+    monkeypatch.setattr(handler.time, "time", lambda: 1767225600.4)  # 2026-01-01T00:00:00.4Z
+    handler.handle_event_batch(events("f1"), None)
+    # Stamped 00:00:00 like the first, but it may have happened after that listing.
+    monkeypatch.setattr(handler.time, "time", lambda: 1767225601.5)
+    handler.handle_event_batch(events("f1"), None)
+    assert len(handler.started) == 2
+    # The second listing came after the whole second: a late copy is debounced.
+    monkeypatch.setattr(handler.time, "time", lambda: 1767225602.0)
+    handler.handle_event_batch(events("f1"), None)
+    assert len(handler.started) == 2
+
+
+def test_async_failure_releases_the_folder_claim(handler):
+    handler.handle_event_batch(events("f1"), None)
+    ctx = handler.started[-1]
+    assert ctx["claim"]["previous"] is None
+    handler.on_export_failed({"jobId": "exp-1", "context": ctx}, {"error": "timed out"})
+    handler.handle_event_batch(events("f1"), None)
+    assert len(handler.started) == 2
+
+
+def test_failed_export_job_releases_the_folder_claim(handler):
+    handler.handle_event_batch(events("f1"), None)
+    job = {"jobId": "exp-1", "context": handler.started[-1]}
+    handler.on_export_done(job, {"JobStatus": "FAILED", "Errors": [{"Message": "boom"}]})
+    handler.handle_event_batch(events("f1"), None)
+    assert len(handler.started) == 2
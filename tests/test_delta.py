@@ -0,0 +1,43 @@
+"""Delta exports: membership snapshots, diffs and deletion manifests."""
+import json
+
+import pytest
+
+from qs_common import clients
+
+from conftest import HANDLER_DIR, load_module
+
+ACCOUNT = "111111111111"
+
+
+@pytest.fixture
+def delta(state_table):
+    return load_module(HANDLER_DIR, "delta")
+
+
+def test_diff_reports_new_changed_unknown_and_removed_members(delta):
+    previous = {"arn:a": "2024-01-01", "arn:b": "2024-01-01", "arn:c": "2024-01-01", "arn:gone": "2024-01-01"}
+    current = {"arn:a": "2024-01-01", "arn:b": "2024-02-01", "arn:c": None, "arn:new": "2024-01-01"}
+    assert delta.diff(previous, current) == (["arn:b", "arn:c", "arn:new"], ["arn:gone"])
+
+
+def test_unchanged_membership_has_an_empty_diff(delta):
+    members = {"arn:a": "2024-01-01"}
+    assert delta.diff(members, dict(members)) == ([], [])
+
+
+def test_snapshots_round_trip_and_first_exports_have_none(delta):
+    assert delta.load(ACCOUNT, "f1") is None
+    delta.save(ACCOUNT, "f1", {})
+    assert delta.load(ACCOUNT, "f1") == {}
+    delta.save(ACCOUNT, "f1", {"arn:a": "2024-01-01", "arn:b": None})
+    assert delta.load(ACCOUNT, "f1") == {"arn:a": "2024-01-01", "arn:b": None}
+    assert delta.load(ACCOUNT, "f2") is None
+
+
+def test_deletion_manifest_lists_removed_members(delta):
+    s3 = clients.client("s3")
+    s3.create_bucket(Bucket="tbkt")
+    key = delta.write_deletion_manifest(s3, "tbkt", "bundles/j1.deletions.json", ACCOUNT, "f1", ["arn:gone"])
+    body = json.loads(s3.get_object(Bucket="tbkt", Key=key)["Body"].read())
+    assert body["sourceAccount"] == ACCOUNT and body["folderId"] == "f1" and body["removed"] == ["arn:gone"]
@@ -0,0 +1,60 @@
+"""Fingerprint cache: unchanged scopes are skipped, changes to members or their dependencies export."""
+import pytest
+
+from conftest import HANDLER_DIR, load_module
+
+ACCOUNT = "111111111111"
+DASHBOARD = f"arn:aws:quicksight:us-east-1:{ACCOUNT}:dashboard/d1"
+DATASET = f"arn:aws:quicksight:us-east-1:{ACCOUNT}:dataset/ds1"
+
+
+class FakeQuickSight:
+    def __init__(self):
+        self.updated = {"d1": "2026-01-01T00:00:00", "ds1": "2026-01-01T00:00:00"}
+
+    def describe_dashboard(self, AwsAccountId, DashboardId):
+        return {"Dashboard": {"Arn": DASHBOARD, "LastUpdatedTime": self.updated[DashboardId],
+                              "Version": {"DataSetArns": [DATASET]}}}
+
+    def describe_data_set(self, AwsAccountId, DataSetId):
+        return {"DataSet": {"Arn": DATASET, "LastUpdatedTime": self.updated[DataSetId]}}
+
+
+@pytest.fixture
+def handler(state_table, monkeypatch):
+    module = load_module(HANDLER_DIR, "index")
+    monkeypatch.setattr(module.fingerprint, "FINGERPRINT_CACHE", True)
+    monkeypatch.setattr(module, "qs", FakeQuickSight())
+    return module
+
+
+def export(handler):
+    """Plan the scope; a planned export is recorded as done, like finish_export does."""
+    plan, skipped = handler.plan_export(ACCOUNT, "f1", [DASHBOARD])
+    if plan:
+        handler.record_export(plan["ctx"], "exp-1")
+    return plan, skipped
+
+
+def test_unchanged_scope_is_skipped(handler):
+    assert export(handler)[0]
+    plan, skipped = export(handler)
+    assert plan is None and skipped["reason"] == "Unchanged since last export"
+
+
+def test_changed_member_is_exported(handler):
+    export(handler)
+    handler.qs.updated["d1"] = "2026-02-01T00:00:00"
+    assert export(handler)[0]
+
+
+def test_changed_dependency_under_an_unchanged_dashboard_is_exported(handler):
+    export(handler)
+    handler.qs.updated["ds1"] = "2026-02-01T00:00:00"
+    assert export(handler)[0]
+    assert export(handler)[0] is None
+
+
+def test_force_exports_an_unchanged_scope(handler):
+    export(handler)
+    assert handler.plan_export(ACCOUNT, "f1", [DASHBOARD], force=True)[0]
@@ -0,0 +1,113 @@
+"""Conflict-aware import scheduling: ordering, Busy, leases and record size."""
+import threading
+import time
+
+import pytest
+
+from conftest import WORKER_DIR, load_module
+
+ACCOUNT = "222222222222"
+
+
+@pytest.fixture
+def locks(state_table, monkeypatch):
+    module = load_module(WORKER_DIR, "import_locks")
+    monkeypatch.setattr(module, "IMPORT_SCHEDULING", True)
+    return module
+
+
+def clock(module, monkeypatch, offset):
+    real = module.time.time
+    monkeypatch.setattr(module.time, "time", lambda: real() + offset)
+
+
+def test_disjoint_imports_run_side_by_side(locks):
+    locks.acquire(ACCOUNT, "s3://b/one.qs", ["a1", "a2"], run_lease=600, max_wait=0)
+    locks.acquire(ACCOUNT, "s3://b/two.qs", ["b1"], run_lease=600, max_wait=0)
+
+
+def test_overlapping_import_waits_and_is_dropped_on_busy(locks):
+    locks.acquire(ACCOUNT, "s3://b/one.qs", ["a1", "a2"], run_lease=600, max_wait=0)
+    with pytest.raises(locks.Busy, match="s3://b/one.qs"):
+        locks.acquire(ACCOUNT, "s3://b/two.qs", ["a2", "a3"], run_lease=600, max_wait=0)
+    # The dropped ticket holds nothing up: once one.qs is done a third import
+    # overlapping only two.qs starts at once.
+    locks.release(ACCOUNT, "s3://b/one.qs")
+    locks.acquire(ACCOUNT, "s3://b/three.qs", ["a3"], run_lease=600, max_wait=0)
+    assert locks.state.get(f"importlock#{ACCOUNT}#{locks._ticket_id('s3://b/two.qs')}") is None
+
+
+def test_queued_ticket_keeps_its_place_until_its_wait_lease_ends(locks, monkeypatch):
+    locks.acquire(ACCOUNT, "s3://b/one.qs", ["a1"], run_lease=60, max_wait=0)
+    with pytest.raises(locks.Busy):
+        locks.acquire(ACCOUNT, "s3://b/two.qs", ["a1", "a2"], run_lease=60, max_wait=0, keep_place=True)
+    locks.release(ACCOUNT, "s3://b/one.qs")
+    # two.qs arrived first and still waits for its redelivery
+    with pytest.raises(locks.Busy, match="s3://b/two.qs"):
+        locks.acquire(ACCOUNT, "s3://b/three.qs", ["a2"], run_lease=60, max_wait=0)
+    # ... but only for WAIT_LEASE
+    clock(locks, monkeypatch, locks.WAIT_LEASE + 1)
+    locks.acquire(ACCOUNT, "s3://b/three.qs", ["a2"], run_lease=60, max_wait=0)
+
+
+def test_redelivered_ticket_starts_in_its_place(locks):
+    locks.acquire(ACCOUNT, "s3://b/one.qs", ["a1"], run_lease=60, max_wait=0)
+    with pytest.raises(locks.Busy):
+        locks.acquire(ACCOUNT, "s3://b/two.qs", ["a1"], run_lease=60, max_wait=0, keep_place=True)
+    locks.release(ACCOUNT, "s3://b/one.qs")
+    locks.acquire(ACCOUNT, "s3://b/two.qs", ["a1"], run_lease=60, max_wait=0, keep_place=True)
+
+
+def test_uninspectable_bundle_blocks_everything_only_while_it_runs(locks):
+    locks.acquire(ACCOUNT, "s3://b/huge.qs", locks.asset_set(), run_lease=60, max_wait=0)
+    with pytest.raises(locks.Busy):
+        locks.acquire(ACCOUNT, "s3://b/small.qs", ["x"], run_lease=60, max_wait=0)
+    locks.release(ACCOUNT, "s3://b/huge.qs")
+    locks.acquire(ACCOUNT, "s3://b/small.qs", ["x"], run_lease=60, max_wait=0)
+
+
+def test_crashed_running_ticket_expires(locks, monkeypatch):
+    locks.acquire(ACCOUNT, "s3://b/one.qs", ["a1"], run_lease=60, max_wait=0)
+    clock(locks, monkeypatch, 61)
+    locks.acquire(ACCOUNT, "s3://b/two.qs", ["a1"], run_lease=60, max_wait=0)
+
+
+def test_queue_record_does_not_grow_with_asset_sets(locks):
+    many = [f"{i:012x}" for i in range(2000)]
+    for n in range(10):
+        locks.acquire(ACCOUNT, f"s3://b/bundle-{n}.qs", [f"{n}-{a}" for a in many], run_lease=3600, max_wait=0)
+    record = locks.state.get(f"importlock#{ACCOUNT}")
+    assert len(record["tickets"]) == 10
+    assert all("assets" not in t for t in record["tickets"].values())
+
+
+def test_concurrent_deliveries_of_one_key_are_serialized(state_table, monkeypatch):
+    worker = load_module(WORKER_DIR, "index")
+    locks = worker.import_locks
+    monkeypatch.setattr(locks, "IMPORT_SCHEDULING", True)
+    monkeypatch.setattr(locks, "POLL_INTERVAL", 0.05)
+    running, overlapped = [], []
+
+    def deliver(message_id):
+        ticket, assets, keep_place = worker.import_lock("s3://b/one.qs", None, ["dashboard/d1"], message_id)
+        locks.acquire(ACCOUNT, ticket, assets, run_lease=600, max_wait=30, keep_place=keep_place)
+        running.append(ticket)
+        overlapped.append(len(running) > 1)
+        time.sleep(0.3)
+        running.remove(ticket)
+        locks.release(ACCOUNT, ticket)
+
+    threads = [threading.Thread(target=deliver, args=(m,)) for m in ("m1", None)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert overlapped == [False, False]
+
+
+def test_duplicate_of_a_running_ticket_waits_and_leaves_it_held(locks):
+    locks.acquire(ACCOUNT, "s3://b/one.qs#m1", ["a1"], run_lease=600, max_wait=0)
+    with pytest.raises(locks.Busy):
+        locks.acquire(ACCOUNT, "s3://b/one.qs#m1", ["a1"], run_lease=600, max_wait=0)
+    with pytest.raises(locks.Busy):
+        locks.acquire(ACCOUNT, "s3://b/two.qs", ["a1"], run_lease=600, max_wait=0)
@@ -0,0 +1,19 @@
+"""Cold-start init: handlers import within budget and build no AWS client or session."""
+import importlib.util
+import os
+
+import pytest
+
+from conftest import ROOT
+
+spec = importlib.util.spec_from_file_location(
+    "check_init_budget", os.path.join(ROOT, "scripts", "check_init_budget.py"))
+check_init_budget = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(check_init_budget)
+
+
+@pytest.mark.parametrize("handler", sorted(check_init_budget.HANDLERS))
+def test_handler_import_is_lazy_and_within_budget(handler):
+    report = check_init_budget.check(handler, runs=3)
+    assert report["clients"] == [] and not report["session"]
+    assert report["median"] <= check_init_budget.BUDGET_MS, report
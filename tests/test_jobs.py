@@ -0,0 +1,139 @@
+"""The async job-check protocol: claims, duplicate deliveries, lease takeover, retries."""
+import json
+
+import pytest
+
+from qs_common import jobs
+
+
+class FakeQueue:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds):
+        self.sent.append(MessageBody)
+
+
+@pytest.fixture
+def queue(state_table, monkeypatch):
+    q = FakeQueue()
+    monkeypatch.setattr(jobs, "JOB_CHECK_QUEUE_URL", "https://sqs.test/checks")
+    monkeypatch.setattr(jobs, "_queue", lambda: q)
+    return q
+
+
+def batch(*bodies):
+    return {"Records": [{"eventSource": "aws:sqs", "messageId": f"m{i}", "body": body}
+                        for i, body in enumerate(bodies)]}
+
+
+class Job:
+    """describe/on_terminal callbacks with a scripted status sequence."""
+
+    def __init__(self, *statuses, fail_terminal=0):
+        self.statuses = list(statuses)
+        self.finished = []
+        self.failed = []
+        self.fail_terminal = fail_terminal
+
+    def describe(self, job):
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return {"JobStatus": status}
+
+    def on_terminal(self, job, resp):
+        if self.fail_terminal:
+            self.fail_terminal -= 1
+            raise RuntimeError("transfer failed")
+        self.finished.append(job["jobId"])
+        return {"status": "OK"}
+
+    def on_failed(self, job, result):
+        self.failed.append(job["jobId"])
+
+    def check(self, *bodies):
+        return jobs.handle_checks(batch(*bodies), self.describe, ("SUCCESSFUL", "FAILED"),
+                                  self.on_terminal, self.on_failed)
+
+
+def record(job_id):
+    return jobs.state.get(f"job#{job_id}")
+
+
+def test_terminal_check_finishes_the_job_once(queue):
+    job = Job("SUCCESSFUL")
+    jobs.submit("export", "j1", "111", {})
+    first = queue.sent[-1]
+    job.check(first, first)  # duplicate delivery in the same batch
+    assert job.finished == ["j1"]
+    assert record("j1")["status"] == "SUCCESSFUL"
+
+
+def test_running_job_is_rescheduled_with_a_new_token(queue):
+    job = Job("RUNNING", "SUCCESSFUL")
+    jobs.submit("export", "j1", "111", {})
+    first = queue.sent[-1]
+    job.check(first)
+    second = queue.sent[-1]
+    assert json.loads(second)["token"] != json.loads(first)["token"]
+    job.check(first)  # late duplicate of the old message
+    assert job.finished == []
+    job.check(second)
+    assert job.finished == ["j1"]
+
+
+def test_redelivery_takes_over_after_the_lease_expires(queue, monkeypatch):
+    job = Job("SUCCESSFUL")
+    jobs.submit("export", "j1", "111", {})
+    message = queue.sent[-1]
+    # The first delivery claims the job, then its invocation dies.
+    assert jobs._claim(message) is not None
+
+    job.check(message)  # redelivered while the claim is still leased
+    assert job.finished == [] and record("j1")["status"] == "RUNNING"
+
+    monkeypatch.setattr(jobs.time, "time", lambda real=jobs.time.time: real() + jobs.CHECK_LEASE + 1)
+    job.check(message)
+    assert job.finished == ["j1"]
+    assert record("j1")["status"] == "SUCCESSFUL"
+
+
+def test_lease_takeover_does_not_fork_a_handed_over_chain(queue, monkeypatch):
+    job = Job("RUNNING", "SUCCESSFUL")
+    jobs.submit("export", "j1", "111", {})
+    first = queue.sent[-1]
+    job.check(first)  # not terminal: the chain moves on to the next message
+    monkeypatch.setattr(jobs.time, "time", lambda real=jobs.time.time: real() + jobs.CHECK_LEASE + 1)
+    job.check(first)
+    assert job.finished == []
+    assert record("j1")["status"] == "RUNNING"
+
+
+def test_failing_terminal_work_is_retried_then_failed(queue):
+    job = Job("SUCCESSFUL", fail_terminal=jobs.MAX_CHECK_ERRORS)
+    jobs.submit("export", "j1", "111", {})
+    for _ in range(jobs.MAX_CHECK_ERRORS):
+        job.check(queue.sent[-1])
+    assert job.finished == []
+    assert job.failed == ["j1"]
+    assert record("j1")["status"] == "FAILED"
+    sent = len(queue.sent)
+    job.check(queue.sent[-1])
+    assert len(queue.sent) == sent  # a finished job schedules nothing more
+
+
+def test_retry_recovers_after_a_transient_error(queue):
+    job = Job("SUCCESSFUL", fail_terminal=1)
+    jobs.submit("export", "j1", "111", {})
+    job.check(queue.sent[-1])
+    assert record("j1")["errors"] == 1
+    job.check(queue.sent[-1])
+    assert job.finished == ["j1"]
+
+
+def test_timed_out_job_runs_the_failure_hook(queue, monkeypatch):
+    job = Job("RUNNING")
+    jobs.submit("export", "j1", "111", {})
+    monkeypatch.setattr(jobs, "ASYNC_MAX_WAIT", 0)
+    job.check(queue.sent[-1])
+    assert job.failed == ["j1"]
+    assert record("j1")["status"] == "TIMED_OUT"
@@ -0,0 +1,86 @@
+"""Layered runs: idempotent layer completion, and releasing the run, ledger and locks on failure."""
+import pytest
+
+from conftest import HANDLER_DIR, WORKER_DIR, load_module
+
+ACCOUNT = "111111111111"
+
+
+@pytest.fixture
+def handler(state_table):
+    return load_module(HANDLER_DIR, "index")
+
+
+@pytest.fixture
+def worker(state_table):
+    return load_module(WORKER_DIR, "index")
+
+
+def start_run(handler, layers=2):
+    handler.coalesce.claim_folder(ACCOUNT, "f1", latest_event=100.0, now=200.0)
+    ctx = {"accountId": ACCOUNT, "folderId": "f1", "claim": {"previous": None, "claimedAt": 200.0}}
+    handler.state.put("run#r1", {"ctx": ctx, "versions": {}, "layers": [
+        {"layer": n, "arns": [f"arn:{n}"], "key": f"bundles/r1/{n}.layer.qs"} for n in range(layers)
+    ]})
+    return [{"jobId": f"e{n}", "progress": {},
+             "context": {"accountId": ACCOUNT, "folderId": "f1", "runId": "r1", "layer": n}}
+            for n in range(layers)]
+
+
+def test_failed_layer_fails_the_run_and_releases_the_folder(handler):
+    first, second = start_run(handler)
+    handler.on_export_done(first, {"JobStatus": "FAILED", "Errors": [{"Message": "boom"}]})
+    run = handler.state.get("run#r1")
+    assert run["status"] == "FAILED" and "layer 0" in run["error"]
+    claimed, _ = handler.coalesce.claim_folder(ACCOUNT, "f1", latest_event=100.0, now=300.0)
+    assert claimed
+
+    # A second failing layer does not undo the claim taken since.
+    handler.on_export_failed(second, {"error": "timed out"})
+    claimed, _ = handler.coalesce.claim_folder(ACCOUNT, "f1", latest_event=100.0, now=400.0)
+    assert not claimed
+
+
+def test_abandoned_import_releases_its_ledger_entry_and_lock(worker):
+    token, _ = worker.ledger.acquire(worker.TARGET_ACCOUNT, "h1", "s3://b/run.layers.json", 3600)
+    assets = worker.import_locks.asset_set(keys=["dataset/d1"])
+    worker.import_locks.acquire(worker.TARGET_ACCOUNT, "s3://b/run/1.layer.qs", assets, 3600, max_wait=0)
+    job = {"jobId": "imp-1", "context": {"bundleHash": "h1", "ledgerToken": token,
+                                         "importLock": "s3://b/run/1.layer.qs"}}
+
+    worker.on_import_failed(job, {"error": "Import s3://b/run/1.layer.qs is waiting"})
+
+    assert worker.ledger.acquire(worker.TARGET_ACCOUNT, "h1", "s3://b/run.layers.json", 3600)[0]
+    worker.import_locks.acquire(worker.TARGET_ACCOUNT, "s3://b/other.qs", assets, 3600, max_wait=0)
+
+
+def test_retried_layer_finish_counts_once_and_still_writes_the_manifest(handler, monkeypatch):
+    handler.s3.create_bucket(Bucket=handler.TARGET_BUCKET)
+    start_run(handler, layers=2)
+    assert handler.layer_done("r1", 0) is None
+    assert handler.layer_done("r1", 0) is None  # a retry of the same layer
+
+    def fail(ctx, job_id):
+        raise RuntimeError("snapshot write failed")
+
+    real = handler.record_export
+    monkeypatch.setattr(handler, "record_export", fail)
+    with pytest.raises(RuntimeError):
+        handler.layer_done("r1", 1)
+    monkeypatch.setattr(handler, "record_export", real)
+
+    # The job-check chain retries the last layer: the bookkeeping runs again.
+    assert handler.layer_done("r1", 1) == f"s3://{handler.TARGET_BUCKET}/bundles/r1.layers.json"
+    handler.s3.head_object(Bucket=handler.TARGET_BUCKET, Key="bundles/r1.layers.json")
+    assert handler.state.get("run#r1")["status"] == "SUCCEEDED"
+
+
+def test_finishing_a_missing_or_failed_run_raises(handler):
+    with pytest.raises(RuntimeError, match="missing"):
+        handler.layer_done("r1", 0)
+    assert handler.state.get("run#r1") is None
+
+    start_run(handler)
+    handler.run_failed("r1", 1, "boom")
+    with pytest.raises(RuntimeError, match="already failed"):
+        handler.layer_done("r1", 0)
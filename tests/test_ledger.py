@@ -0,0 +1,66 @@
+"""Import ledger: content identity, duplicate suppression, leases and stale completions."""
+import pytest
+
+from qs_common import clients
+
+from conftest import WORKER_DIR, load_module
+
+ACCOUNT = "222222222222"
+
+
+@pytest.fixture
+def ledger(state_table):
+    return load_module(WORKER_DIR, "ledger")
+
+
+def clock(ledger, monkeypatch, offset):
+    real = ledger.time.time
+    monkeypatch.setattr(ledger.time, "time", lambda: real() + offset)
+
+
+def test_hash_covers_content_and_overrides(ledger):
+    s3 = clients.client("s3")
+    s3.create_bucket(Bucket="tbkt")
+    s3.put_object(Bucket="tbkt", Key="a.qs", Body=b"bundle")
+    s3.put_object(Bucket="tbkt", Key="b.qs", Body=b"bundle")
+    same = ledger.bundle_hash(s3, "tbkt", "a.qs", {}) == ledger.bundle_hash(s3, "tbkt", "b.qs", None)
+    assert same
+    assert ledger.bundle_hash(s3, "tbkt", "a.qs", {"DataSources": [{"x": 1}]}) != \
+        ledger.bundle_hash(s3, "tbkt", "a.qs", {})
+
+
+def test_duplicate_backs_off_while_the_first_import_runs(ledger):
+    token, _ = ledger.acquire(ACCOUNT, "h1", "s3://b/a.qs", 600)
+    assert token
+    again, record = ledger.acquire(ACCOUNT, "h1", "s3://b/copy.qs", 600)
+    assert again is None and record["status"] == "IN_PROGRESS" and record["s3Uri"] == "s3://b/a.qs"
+
+
+def test_succeeded_content_is_skipped_unless_forced(ledger):
+    token, _ = ledger.acquire(ACCOUNT, "h1", "s3://b/a.qs", 600)
+    assert ledger.complete(ACCOUNT, "h1", token, True, {"import_job": "imp-1"})
+    again, record = ledger.acquire(ACCOUNT, "h1", "s3://b/a.qs", 600)
+    assert again is None and record["status"] == "SUCCEEDED"
+    forced, _ = ledger.acquire(ACCOUNT, "h1", "s3://b/reimport-1-a.qs", 600, force=True)
+    assert forced
+
+
+def test_failed_import_can_be_retried(ledger):
+    token, _ = ledger.acquire(ACCOUNT, "h1", "s3://b/a.qs", 600)
+    ledger.complete(ACCOUNT, "h1", token, False, {"error": "rollback"})
+    assert ledger.acquire(ACCOUNT, "h1", "s3://b/a.qs", 600)[0]
+
+
+def test_expired_lease_is_taken_over_and_the_stale_owner_cannot_complete(ledger, monkeypatch):
+    stale, _ = ledger.acquire(ACCOUNT, "h1", "s3://b/a.qs", 60)
+    clock(ledger, monkeypatch, 61)
+    fresh, _ = ledger.acquire(ACCOUNT, "h1", "s3://b/a.qs", 60)
+    assert fresh and fresh != stale
+    assert not ledger.complete(ACCOUNT, "h1", stale, False, {"error": "timed out"})
+    assert ledger.complete(ACCOUNT, "h1", fresh, True, {})
+    assert ledger.state.get("import#%s#h1" % ACCOUNT)["status"] == "SUCCEEDED"
+
+
+def test_reimport_copies_are_recognized(ledger):
+    assert ledger.is_reimport("bundles/reimport-abc-exp-1.qs")
+    assert not ledger.is_reimport("bundles/exp-1.qs")
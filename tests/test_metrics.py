@@ -0,0 +1,47 @@
+"""EMF metric records: namespace, dimension sets, units and phase timing."""
+import json
+
+import pytest
+
+from qs_common import metrics
+
+
+@pytest.fixture
+def records(monkeypatch, capsys):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "NAMESPACE", "Test/Migrations")
+    monkeypatch.setattr(metrics, "STAGE", "prod")
+    monkeypatch.setattr(metrics, "TARGET", "euw1")
+    return lambda: [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_phase_record_has_the_emf_shape(records):
+    with metrics.phase("Transfer", folder="f1", jobId="exp-1") as m:
+        m["BundleBytes"] = 1024
+    [record] = records()
+    [directive] = record["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == "Test/Migrations"
+    assert directive["Dimensions"] == [["Stage", "Target", "Phase"], ["Stage", "Target", "Phase", "FolderId"]]
+    units = {m["Name"]: m["Unit"] for m in directive["Metrics"]}
+    assert units == {"BundleBytes": "Bytes", "Duration": "Milliseconds", "Throughput": "Bytes/Second"}
+    assert record["Stage"] == "prod" and record["Target"] == "euw1" and record["Phase"] == "Transfer"
+    assert record["FolderId"] == "f1" and record["jobId"] == "exp-1"
+    assert all(name in record for name in units)
+
+
+def test_failed_phase_counts_an_error(records):
+    with pytest.raises(RuntimeError):
+        with metrics.phase("Validate"):
+            raise RuntimeError("bad bundle")
+    [record] = records()
+    assert record["Errors"] == 1
+    assert record["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Stage", "Target", "Phase"]]
+    assert {"Name": "Errors", "Unit": "Count"} in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]
+
+
+def test_disabled_metrics_print_nothing(records, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    with metrics.phase("Transfer"):
+        pass
+    metrics.job("export", 12.0, polls=3, throttles=0)
+    assert records() == []
@@ -0,0 +1,64 @@
+"""Overrides cache: fresh hits, conditional revalidation, changes and missing objects."""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from qs_common import clients
+
+from conftest import WORKER_DIR, load_module
+
+KEY = "overrides/params.json"
+
+
+@pytest.fixture
+def overrides(state_table):
+    module = load_module(WORKER_DIR, "overrides")
+    s3 = clients.client("s3")
+    s3.create_bucket(Bucket="tbkt")
+    return module
+
+
+def put(params):
+    clients.client("s3").put_object(Bucket="tbkt", Key=KEY,
+                                    Body=json.dumps({"OverrideParameters": params}).encode())
+
+
+def load(overrides, ttl):
+    return overrides.load(clients.client("s3"), "tbkt", KEY, ttl=ttl)
+
+
+def test_fresh_entries_are_served_from_the_cache(overrides):
+    put({"DataSources": [{"DataSourceId": "ds1"}]})
+    assert load(overrides, 60) == ({"DataSources": [{"DataSourceId": "ds1"}]}, "miss")
+    put({"DataSources": []})
+    assert load(overrides, 60)[1] == "hit"
+    assert overrides.stats == {"hit": 1, "revalidated": 0, "miss": 1}
+
+
+def test_stale_entries_are_revalidated_then_refetched_when_changed(overrides):
+    put({"DataSources": []})
+    load(overrides, 0)
+    assert load(overrides, 0) == ({"DataSources": []}, "revalidated")
+    put({"DataSources": [{"DataSourceId": "ds2"}]})
+    assert load(overrides, 0) == ({"DataSources": [{"DataSourceId": "ds2"}]}, "miss")
+
+
+def test_missing_object_means_no_overrides(overrides):
+    assert load(overrides, 0) == ({}, "miss")
+    put({"DataSources": []})
+    assert load(overrides, 0) == ({"DataSources": []}, "miss")
+
+
+def test_invalid_json_raises(overrides):
+    clients.client("s3").put_object(Bucket="tbkt", Key=KEY, Body=b"{not json")
+    with pytest.raises(ValueError, match="Invalid overrides JSON"):
+        load(overrides, 0)
+
+
+def test_concurrent_lookups_share_one_fetch_and_count_every_call(overrides):
+    put({"DataSources": []})
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        outcomes = list(executor.map(lambda _: load(overrides, 60)[1], range(32)))
+    assert outcomes.count("miss") == 1
+    assert overrides.stats == {"hit": 31, "revalidated": 0, "miss": 1}
@@ -0,0 +1,98 @@
+"""Adaptive job polling: delay schedule, throttle backoff, time budget and reported stats."""
+import pytest
+from botocore.exceptions import ClientError
+
+from qs_common import poller
+
+
+class Clock:
+    """Stands in for the ``time`` module; sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(poller, "time", c)
+    monkeypatch.setattr(poller.random, "uniform", lambda low, high: (low + high) / 2)
+    monkeypatch.setitem(poller._expected, "export", 40.0)
+    return c
+
+
+def throttled():
+    return ClientError({"Error": {"Code": "ThrottlingException"}}, "DescribeAssetBundleExportJob")
+
+
+def test_delay_halves_the_gap_then_backs_off_up_to_the_cap(clock):
+    assert poller.next_delay("export", 0, 0, min_delay=1, max_delay=30) == 20
+    assert poller.next_delay("export", 30, 0, min_delay=1, max_delay=30) == 5
+    overdue = [poller.next_delay("export", 50, n, min_delay=1, max_delay=30) for n in range(10)]
+    assert overdue[:3] == [1, 1.6, pytest.approx(2.56)]
+    assert overdue == sorted(overdue) and overdue[-1] == 30
+
+
+def test_throttle_backoff_grows_and_is_capped(clock, monkeypatch):
+    monkeypatch.setattr(poller.random, "uniform", lambda low, high: high)
+    assert [poller.throttle_delay(n, min_delay=1, max_delay=10) for n in range(6)] == [1, 2, 4, 8, 10, 10]
+
+
+def test_poll_returns_the_terminal_response_with_its_stats(clock):
+    statuses = iter(["QUEUED", "IN_PROGRESS", "SUCCESSFUL"])
+    resp, stats = poller.poll_job(lambda: {"JobStatus": next(statuses)}, ("SUCCESSFUL",), "export", "j1",
+                                  max_wait=600, sleep=clock.sleep)
+    assert resp["JobStatus"] == "SUCCESSFUL"
+    assert stats.polls == 3 and stats.throttles == 0
+    assert stats.slept == sum(clock.slept) == stats.elapsed
+    # The job may have finished right after the previous poll.
+    assert stats.as_dict()["addedLatencySeconds"] == clock.slept[-1]
+
+
+def test_throttled_describes_are_retried_without_counting_as_polls(clock):
+    calls = iter([throttled(), throttled(), {"JobStatus": "SUCCESSFUL"}])
+
+    def describe():
+        result = next(calls)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    _, stats = poller.poll_job(describe, ("SUCCESSFUL",), "export", "j1", max_wait=600, sleep=clock.sleep)
+    assert stats.polls == 1 and stats.throttles == 2
+
+
+def test_persistent_throttling_raises(clock):
+    def describe():
+        raise throttled()
+
+    with pytest.raises(ClientError):
+        poller.poll_job(describe, ("SUCCESSFUL",), "export", "j1", max_wait=600,
+                        max_throttle_retries=3, sleep=clock.sleep)
+
+
+def test_poll_gives_up_at_the_time_budget(clock):
+    with pytest.raises(TimeoutError, match="timed out"):
+        poller.poll_job(lambda: {"JobStatus": "IN_PROGRESS"}, ("SUCCESSFUL",), "export", "j1",
+                        max_wait=100, sleep=clock.sleep)
+    # No sleep runs past the budget, and no zero-delay polls pile up at its end.
+    assert sum(clock.slept) == pytest.approx(100) and all(s > 0 for s in clock.slept)
+
+
+def test_time_budget_leaves_a_reserve_before_the_lambda_timeout():
+    class Context:
+        def get_remaining_time_in_millis(self):
+            return 120_000
+
+    assert poller.time_budget(Context(), 600) == 90
+    assert poller.time_budget(Context(), 60) == 60
+    assert poller.time_budget(Context(), 600, reserve=200) == 0
+    assert poller.time_budget(None, 600) == 600
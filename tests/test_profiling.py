@@ -0,0 +1,53 @@
+"""Opt-in profiling: a no-op unless enabled, then pstats and report artifacts in S3."""
+import gzip
+
+import pytest
+
+from qs_common import clients, profiling
+
+
+class Context:
+    aws_request_id = "req-1"
+
+
+def handler(event, context):
+    return sum(range(event["n"]))
+
+
+@pytest.fixture
+def bucket(state_table, monkeypatch):
+    clients.client("s3").create_bucket(Bucket="profiles-bkt")
+    monkeypatch.setattr(profiling, "PROFILING_BUCKET", "profiles-bkt")
+    return "profiles-bkt"
+
+
+def written(bucket):
+    listed = clients.client("s3").list_objects_v2(Bucket=bucket)
+    return sorted(o["Key"] for o in listed.get("Contents", []))
+
+
+def test_disabled_profiling_is_a_no_op(bucket, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    monkeypatch.setattr(profiling, "SAMPLE_RATE", 0)
+    monkeypatch.setattr(profiling, "_run_profiled", lambda *a: pytest.fail("profiled"))
+    assert profiling.profiled("export")(handler)({"n": 10}, Context()) == 45
+    assert written(bucket) == []
+
+
+def test_enabled_profiling_writes_both_artifacts(bucket, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    assert profiling.profiled("export")(handler)({"n": 10}, Context()) == 45
+    keys = written(bucket)
+    assert [k.split("-req-1", 1)[1] for k in keys] == [".pstats.gz", ".txt.gz"]
+    assert all(k.startswith("profiles/export/") for k in keys)
+    report = gzip.decompress(clients.client("s3").get_object(Bucket=bucket, Key=keys[1])["Body"].read())
+    assert report.startswith(b"export invocation req-1") and b"top" in report
+
+
+def test_a_raising_handler_is_still_profiled(bucket, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    with pytest.raises(KeyError):
+        profiling.profiled("export")(handler)({}, Context())
+    report = gzip.decompress(clients.client("s3").get_object(
+        Bucket=bucket, Key=written(bucket)[1])["Body"].read())
+    assert b"raised KeyError" in report
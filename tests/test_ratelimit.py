@@ -0,0 +1,85 @@
+"""Shared token-bucket rate limiting: leasing, contention between containers, local fallback."""
+import pytest
+
+from qs_common import ratelimit
+
+BUDGETS = {"DescribeDashboard": {"rate": 2.0, "burst": 4.0}}
+
+
+class Clock:
+    """Stands in for the ``time`` module; sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(state_table, monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(ratelimit, "time", c)
+    return c
+
+
+def test_unbudgeted_operations_are_not_limited(clock):
+    limiter = ratelimit.RateLimiter(BUDGETS, "us-east-1")
+    assert limiter.acquire("ListDashboards") == 0.0
+    assert ratelimit.state.get("rate#us-east-1#ListDashboards") is None
+
+
+def test_leased_tokens_are_spent_locally(clock, monkeypatch):
+    limiter = ratelimit.RateLimiter(BUDGETS, "us-east-1")
+    limiter.acquire("DescribeDashboard")
+    calls = []
+    monkeypatch.setattr(ratelimit.state, "update", lambda *a, **k: calls.append(a) or True)
+    limiter.acquire("DescribeDashboard")  # the second token of the lease
+    assert calls == []
+
+
+def test_containers_share_one_bucket(clock):
+    first = ratelimit.RateLimiter(BUDGETS, "us-east-1")
+    second = ratelimit.RateLimiter(BUDGETS, "us-east-1")
+    for _ in range(4):
+        assert first.acquire("DescribeDashboard") == 0.0
+    started = clock.now
+    second.acquire("DescribeDashboard")
+    # The burst is spent by the first container: the second waits for a refill.
+    assert clock.now - started >= 0.5
+    assert second.waited > 0
+
+
+def test_lost_update_races_are_retried(clock, monkeypatch):
+    limiter = ratelimit.RateLimiter(BUDGETS, "us-east-1")
+    real = ratelimit.state.update
+    lost = []
+
+    def racing_update(pk, updates, expect=None):
+        if not lost:
+            lost.append(pk)
+            return False  # another container wrote the bucket first
+        return real(pk, updates, expect=expect)
+
+    monkeypatch.setattr(ratelimit.state, "update", racing_update)
+    assert limiter.acquire("DescribeDashboard") == 0.0
+    assert lost and ratelimit.state.get("rate#us-east-1#DescribeDashboard")["tokens"] == 2
+
+
+def test_state_errors_fall_back_to_a_local_bucket(clock, monkeypatch):
+    def unavailable(pk):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(ratelimit.state, "get", unavailable)
+    limiter = ratelimit.RateLimiter(BUDGETS, "us-east-1")
+    for _ in range(4):
+        assert limiter.acquire("DescribeDashboard") == 0.0
+    assert limiter.acquire("DescribeDashboard") > 0
+
+
+def test_budgets_default_burst_to_the_rate():
+    budgets = ratelimit.parse_budgets('{"default": {"rate": 0.5}, "ListUsers": {"rate": 3, "burst": 6}}')
+    assert budgets == {"default": {"rate": 0.5, "burst": 1}, "ListUsers": {"rate": 3.0, "burst": 6.0}}
@@ -0,0 +1,42 @@
+"""Bounded folder scheduler: the export job limit holds and failures stay per unit."""
+import threading
+import time
+
+from conftest import HANDLER_DIR, load_module
+
+scheduler = load_module(HANDLER_DIR, "scheduler")
+
+
+def test_never_more_than_max_jobs_in_flight():
+    lock = threading.Lock()
+    in_flight, peak = [0], [0]
+
+    def pipeline(item, job_slots):
+        time.sleep(0.01)  # listing, outside the slot
+        with job_slots:
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+        return {"status": "OK", "folderId": item}
+
+    results = scheduler.run_all([f"f{i}" for i in range(12)], pipeline, max_jobs=3, max_workers=8)
+    assert peak[0] == 3
+    assert all(r["status"] == "OK" for r in results.values()) and len(results) == 12
+
+
+def test_a_failing_unit_does_not_stop_the_others():
+    def pipeline(item, job_slots):
+        if item == "bad":
+            raise RuntimeError("export job failed")
+        return {"status": "OK"}
+
+    results = scheduler.run_all(["a", "bad", "b"], pipeline, max_jobs=1, max_workers=3)
+    assert results == {"a": {"status": "OK"}, "bad": {"status": "FAILED", "error": "export job failed"},
+                       "b": {"status": "OK"}}
+
+
+def test_no_items_runs_nothing():
+    assert scheduler.run_all([], lambda item, slots: {"status": "OK"}) == {}
@@ -0,0 +1,155 @@
+"""The streaming bundle copy: bounded buffers, content hash, failure handling."""
+import hashlib
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import HANDLER_DIR, load_module
+
+transfer = load_module(HANDLER_DIR, "transfer")
+
+
+def test_buffer_pool_never_allocates_more_than_its_count():
+    pool = transfer._BufferPool(16, 3)
+    seen, start = set(), threading.Barrier(12)
+
+    def worker():
+        start.wait()
+        for _ in range(20):
+            buf = pool.acquire()
+            seen.add(id(buf))
+            time.sleep(0.001)
+            pool.release(buf)
+
+    threads = [threading.Thread(target=worker) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert pool._allocated == 3
+    assert len(seen) == 3
+
+
+class FakeResponse:
+    def __init__(self, data, start, end, ranged):
+        self.status = 206 if ranged else 200
+        self.headers = {"Content-Range": f"bytes {start}-{end}/{len(data)}"} if ranged else {}
+        self._body = io.BytesIO(data[start:end + 1] if ranged else data)
+
+    def readinto(self, b):
+        return self._body.readinto(b)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects, self.parts, self.aborted = {}, {}, set()
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body.read()
+        return {"ETag": '"single"'}
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.parts[(Bucket, Key)] = {}
+        return {"UploadId": "u1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.parts[(Bucket, Key)][PartNumber] = Body.read()
+        return {"ETag": f'"p{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.parts.pop((Bucket, Key))
+        self.objects[(Bucket, Key)] = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+        return {"ETag": '"multi-3"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.parts.pop((Bucket, Key), None)
+        self.aborted.add(Bucket)
+
+
+class FailingBucketS3(FakeS3):
+    """Rejects every part written to one bucket."""
+
+    def __init__(self, bucket):
+        super().__init__()
+        self.failing = bucket
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if Bucket == self.failing and PartNumber > 1:
+            raise RuntimeError("AccessDenied")
+        return super().upload_part(Bucket, Key, UploadId, PartNumber, Body)
+
+
+def serve(monkeypatch, data, ranged=True, fail_from=None):
+    """Serve ``data`` as the download URL; returns the list of byte ranges requested."""
+    requested = []
+
+    def fake_open(url, start=None, end=None, timeout=60):
+        if fail_from is not None and start is not None and start >= fail_from:
+            raise transfer.DownloadError("HTTP Error 500: boom")
+        requested.append((start or 0, len(data) - 1 if end is None else end))
+        return FakeResponse(data, start or 0, len(data) - 1 if end is None else end, ranged)
+    monkeypatch.setattr(transfer, "_open", fake_open)
+    monkeypatch.setattr(transfer.time, "sleep", lambda s: None)
+    return requested
+
+
+@pytest.mark.parametrize("ranged", [True, False])
+def test_multipart_copy_reports_the_content_hash(monkeypatch, ranged):
+    data = os.urandom(4 * transfer.MIN_PART_SIZE + 123)
+    serve(monkeypatch, data, ranged)
+    s3 = FakeS3()
+    result = transfer.stream_url_to_buckets(s3, "https://dl", ["b1", "b2"], "k.qs",
+                                            part_size=transfer.MIN_PART_SIZE, concurrency=3)
+    for bucket in ("b1", "b2"):
+        assert s3.objects[(bucket, "k.qs")] == data
+        assert result[bucket]["parts"] == 5
+        assert result[bucket]["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+def test_single_part_copy_reports_the_content_hash(monkeypatch):
+    serve(monkeypatch, b"small bundle")
+    result = transfer.stream_url_to_buckets(FakeS3(), "https://dl", ["b1"], "k.qs")
+    assert result["b1"]["sha256"] == hashlib.sha256(b"small bundle").hexdigest()
+
+
+def test_failed_part_aborts_without_stalling_later_parts(monkeypatch):
+    data = os.urandom(4 * transfer.MIN_PART_SIZE)
+    serve(monkeypatch, data, fail_from=transfer.MIN_PART_SIZE)
+    s3 = FakeS3()
+    with pytest.raises(transfer.DownloadError):
+        transfer.stream_url_to_buckets(s3, "https://dl", ["b1"], "k.qs",
+                                       part_size=transfer.MIN_PART_SIZE, concurrency=2)
+    assert s3.parts == {} and s3.objects == {}
+
+
+def test_one_download_is_written_to_every_bucket(monkeypatch):
+    data = os.urandom(3 * transfer.MIN_PART_SIZE + 7)
+    requested = serve(monkeypatch, data)
+    s3 = FakeS3()
+    result = transfer.stream_url_to_buckets(s3, "https://dl", ["b1", "b2", "b3"], "k.qs",
+                                            part_size=transfer.MIN_PART_SIZE, concurrency=2)
+    assert sum(end - start + 1 for start, end in requested) == len(data)
+    assert set(result) == {"b1", "b2", "b3"}
+    assert all(s3.objects[(b, "k.qs")] == data for b in result)
+
+
+def test_a_failing_bucket_aborts_the_upload_in_every_bucket(monkeypatch):
+    serve(monkeypatch, os.urandom(3 * transfer.MIN_PART_SIZE))
+    s3 = FailingBucketS3("b2")
+    with pytest.raises(RuntimeError, match="AccessDenied"):
+        transfer.stream_url_to_buckets(s3, "https://dl", ["b1", "b2", "b3"], "k.qs",
+                                       part_size=transfer.MIN_PART_SIZE, concurrency=2)
+    assert s3.aborted == {"b1", "b2", "b3"}
+    assert s3.parts == {} and s3.objects == {}
@@ -0,0 +1,68 @@
+"""Pre-import validation: references resolved in the bundle or the target, missing ones rejected."""
+import io
+import json
+import zipfile
+
+import pytest
+from botocore.exceptions import ClientError
+
+from conftest import WORKER_DIR, load_module
+
+DATASET_ARN = "arn:aws:quicksight:us-east-1:111111111111:dataset/{}"
+
+
+class FakeQuickSight:
+    """The target account holds only the datasets in ``existing``."""
+
+    def __init__(self, *existing):
+        self.existing = set(existing)
+
+    def describe_data_set(self, AwsAccountId, DataSetId):
+        if DataSetId not in self.existing:
+            raise ClientError({"Error": {"Code": "ResourceNotFoundException"}}, "DescribeDataSet")
+        return {"DataSet": {"DataSetId": DataSetId}}
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    module = load_module(WORKER_DIR, "index")
+    monkeypatch.setattr(module.validate, "REQUIRE_DATASOURCE_OVERRIDES", False)
+    return module
+
+
+def bundle(*dataset_ids):
+    dashboard = {"dashboardId": "d1", "definition": {
+        "dataSetIdentifierDeclarations": [{"dataSetArn": DATASET_ARN.format(i)} for i in dataset_ids]}}
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as zf:
+        zf.writestr("dashboard/d1.json", json.dumps(dashboard))
+    return data.getvalue()
+
+
+def test_reference_found_in_the_target_passes(worker, monkeypatch):
+    monkeypatch.setattr(worker, "qs", FakeQuickSight("sales"))
+    docs = worker.check_bundle("tbkt", "exp-1.qs", bundle("sales"), {})
+    assert list(docs) == ["dashboard/d1"]
+
+
+def test_reference_missing_everywhere_raises(worker, monkeypatch):
+    monkeypatch.setattr(worker, "qs", FakeQuickSight("sales"))
+    with pytest.raises(ValueError, match="MISSING_DEPENDENCY.*dataset/orders"):
+        worker.check_bundle("tbkt", "exp-1.qs", bundle("sales", "orders"), {})
+
+
+def test_reference_resolved_under_the_id_prefix(worker):
+    exists = worker.validate.target_lookup(FakeQuickSight("prod-sales"), "222222222222")
+    overrides = {"ResourceIdOverrideConfiguration": {"PrefixForAllResources": "prod-"}}
+    report, _ = worker.validate.validate(bundle("sales"), overrides, exists)
+    assert report["ok"]
+
+
+def test_bundle_without_references_passes_without_lookups(worker):
+    report, docs = worker.validate.validate(bundle(), {}, exists=lambda key: pytest.fail(key))
+    assert report["ok"] and report["warnings"] == [] and report["assets"] == 1
+
+
+def test_unreadable_bundle_is_rejected(worker):
+    report, _ = worker.validate.validate(b"not a zip", {})
+    assert [e["code"] for e in report["errors"]] == ["BAD_ZIP"]
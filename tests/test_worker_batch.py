@@ -0,0 +1,55 @@
+"""Concurrent batch imports: a failing record is reported alone in batchItemFailures."""
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import WORKER_DIR, load_module
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    module = load_module(WORKER_DIR, "index")
+    seen, lock = [], threading.Lock()
+
+    def process_bundle(bucket, key, context, queued=None):
+        time.sleep(0.2)
+        with lock:
+            seen.append(key)
+        if "bad" in key:
+            raise RuntimeError("import failed")
+        return {"status": "OK", "s3_uri": f"s3://{bucket}/{key}"}
+
+    monkeypatch.setattr(module, "process_bundle", process_bundle)
+    module.seen = seen
+    return module
+
+
+def s3_record(key):
+    return {"s3": {"bucket": {"name": "tbkt"}, "object": {"key": key}}}
+
+
+def sqs_batch(*keys):
+    return {"Records": [{"eventSource": "aws:sqs", "messageId": f"m-{key}",
+                         "body": json.dumps({"Records": [s3_record(key)]})} for key in keys]}
+
+
+def test_only_the_failing_message_is_redelivered(worker):
+    result = worker.lambda_handler(sqs_batch("a.qs", "bad.qs", "c.qs", "d.qs"), None)
+    assert result["status"] == "PARTIAL"
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m-bad.qs"}]
+    assert sorted(worker.seen) == ["a.qs", "bad.qs", "c.qs", "d.qs"]
+    assert [r["status"] for r in result["results"]] == ["OK", "FAILED", "OK", "OK"]
+
+
+def test_records_are_imported_concurrently(worker, monkeypatch):
+    monkeypatch.setattr(worker, "MAX_CONCURRENT_IMPORTS", 4)
+    started = time.perf_counter()
+    worker.lambda_handler(sqs_batch("a.qs", "b.qs", "c.qs", "d.qs"), None)
+    assert time.perf_counter() - started < 0.6  # one at a time takes 0.8s
+
+
+def test_direct_s3_notification_failure_fails_the_invocation(worker):
+    with pytest.raises(RuntimeError, match="bad.qs"):
+        worker.lambda_handler({"Records": [s3_record("a.qs"), s3_record("bad.qs")]}, None)